@@ -6,197 +6,45 @@
 
 from typing import Any, Text, Dict, List
 from rasa_sdk import Action, Tracker, FormValidationAction
+from rasa_sdk.events import SlotSet
 from rasa_sdk.executor import CollectingDispatcher
-from rasa_sdk.types import DomainDict
-import logging
 import random
-import requests
-import json
-from datetime import datetime
-import re
-
-
-logger = logging.getLogger(__name__)
-
-# API Configuration
-API_BASE_URL = "http://localhost:8080"
-API_PREDICT_ENDPOINT = f"{API_BASE_URL}/predict"
-API_REPORT_ENDPOINT = f"{API_BASE_URL}/predict_with_report"
-API_DOWNLOAD_ENDPOINT = f"{API_BASE_URL}/download_report"
 
+from .admission import Overloaded, get_prediction_gate
+from .analytics import SOURCE_API, SOURCE_CACHE, SOURCE_LOCAL, assessment_event, get_analytics
+from .circuit_breaker import CircuitOpenError
+from .http_client import APIConnectionError, APIStatusError
+from .llm_cache import get_llm_cache
+from .live_updates import live_messages, token_publisher
+from .llm_client import LLM_LATENCY_BUDGET, get_llm_client
+from .local_model import LOCAL_MODEL_SERVE_BELOW, describe_feature, get_local_model
+from .metrics import instrument_action, record_fallback
+from .patient_record import PatientRecord
+from .micro_batcher import get_micro_batcher
+from .prediction_api import API_PREDICT_ENDPOINT
+from .prediction_cache import get_prediction_cache, payload_cache_key
+from .rate_limit import rate_limited
+from .report_jobs import DONE, ReportJob, ReportQueueFull, get_report_queue
+from .risk import classify_risk
+from .slot_validation import add_slot_validators
+from .structured_logging import LOG_SAMPLE_RATE, get_logger
+
+
+logger = get_logger(__name__)
+
+# Slot holding the last prediction shown in the chat, reused by the PDF report
+PREDICTION_SLOT = "prediction_result"
+
+
+@instrument_action
+@add_slot_validators
 class ValidateMedicalInfoForm(FormValidationAction):
+    """Validates every medical_info_form slot with the rules in slot_validation.SLOT_SCHEMA."""
+
     def name(self) -> Text:
         return "validate_medical_info_form"
 
-    def validate_age(
-        self,
-        slot_value: Any,
-        dispatcher: CollectingDispatcher,
-        tracker: Tracker,
-        domain: DomainDict,
-    ) -> Dict[Text, Any]:
-        """Validate age input and convert to age bracket with conversational feedback."""
-        
-        # Age bracket mapping dictionary
-        age_brackets = {
-            (0, 10): "[0-10)",
-            (10, 20): "[10-20)", 
-            (20, 30): "[20-30)",
-            (30, 40): "[30-40)",
-            (40, 50): "[40-50)",
-            (50, 60): "[50-60)",
-            (60, 70): "[60-70)",
-            (70, 80): "[70-80)",
-            (80, 90): "[80-90)",
-            (90, 100): "[90-100)"
-        }
-        
-        # Conversational age responses
-        age_responses = {
-            (0, 18): ["Great! Youth is on your side for health recovery!", "Young and resilient - that's a positive factor!"],
-            (18, 30): ["Perfect! You're in a great age range for health management!", "Your age works in your favor for diabetes management!"],
-            (30, 50): ["Excellent! Prime time for taking control of your health!", "This is a perfect age to focus on long-term health strategies!"],
-            (50, 70): ["Wise and experienced! Your maturity helps with consistent health management!", "At this stage, your health awareness really pays off!"],
-            (70, 100): ["Admirable! Your longevity shows you know how to take care of yourself!", "Age brings wisdom, especially in health management!"]
-        }
-        
-        try:
-            # Convert input to integer
-            age = int(slot_value)
-            
-            # Handle invalid ages with humor
-            if age < 0:
-                funny_responses = [
-                    "Time travel isn't covered by our health assessment! Please enter a valid age.",
-                    "I appreciate the creativity, but negative ages aren't in my database! What's your real age?",
-                    "Unless you're Benjamin Button, I'll need a positive number for your age!"
-                ]
-                dispatcher.utter_message(text=random.choice(funny_responses))
-                return {"age": None}
-            elif age > 120:
-                superhuman_responses = [
-                    "That's quite an age! Please double-check and enter a realistic age.",
-                    "If you've really lived that long, I'd love to know your secrets! But for now, please enter a realistic age.",
-                    "That would make you superhuman! I need a more typical human age for accurate assessment."
-                ]
-                dispatcher.utter_message(text=random.choice(superhuman_responses))
-                return {"age": None}
-            
-            # Find the appropriate age bracket and give encouraging feedback
-            for (min_age, max_age), bracket in age_brackets.items():
-                if min_age <= age < max_age:
-                    # Find appropriate encouraging response
-                    for (response_min, response_max), responses in age_responses.items():
-                        if response_min <= age < response_max:
-                            encouragement = random.choice(responses)
-                            dispatcher.utter_message(text=f"Perfect! You're {age} years old, which puts you in the {bracket} age bracket. {encouragement}")
-                            return {"age": bracket}
-                    
-                    # Fallback response
-                    dispatcher.utter_message(text=f"Perfect! You're in the {bracket} age bracket. Got it!")
-                    return {"age": bracket}
-            
-            # Handle ages 100 and above
-            if age >= 100:
-                centennial_responses = [
-                    f"Wow, {age} years young! You're in the 90+ category. Impressive longevity!",
-                    f"Amazing! At {age}, you're a true inspiration! You're in our highest age bracket.",
-                    f"Incredible! {age} years of life experience - you're in the 90+ category."
-                ]
-                dispatcher.utter_message(text=random.choice(centennial_responses))
-                return {"age": "[90-100)+"}
-            
-        except (ValueError, TypeError):
-            number_help_responses = [
-                "I need a number for your age! Try something like 25, 45, or 67.",
-                "Oops! I need your age as a number. For example: 35 or 62.",
-                "Let me get a numerical age from you - just type a number like 28 or 54!"
-            ]
-            dispatcher.utter_message(text=random.choice(number_help_responses))
-            return {"age": None}
-        
-        return {"age": slot_value}
-    
-    def validate_gender(
-        self,
-        slot_value: Any,
-        dispatcher: CollectingDispatcher,
-        tracker: Tracker,
-        domain: DomainDict,
-    ) -> Dict[Text, Any]:
-        """Validate gender input with inclusive and encouraging responses"""
-        
-        if slot_value:
-            gender_lower = slot_value.lower().strip()
-            
-            # Male variants
-            if gender_lower in ['male', 'm', 'man', 'boy', 'guy', 'gentleman']:
-                confirmations = [
-                    "Got it - Male! Thanks for that info.",
-                    "Perfect! Male recorded. Moving forward!",
-                    "Excellent! I've noted Male for your demographic info."
-                ]
-                dispatcher.utter_message(text=random.choice(confirmations))
-                return {"gender": "Male"}
-            
-            # Female variants    
-            elif gender_lower in ['female', 'f', 'woman', 'girl', 'lady']:
-                confirmations = [
-                    "Got it - Female! Thanks for sharing that.",
-                    "Perfect! Female recorded. Continuing on!",
-                    "Excellent! I've noted Female for your demographic data."
-                ]
-                dispatcher.utter_message(text=random.choice(confirmations))
-                return {"gender": "Female"}
-            else:
-                help_responses = [
-                    "I need either 'Male' or 'Female' for this assessment. Could you clarify?",
-                    "Please specify Male or Female for the demographic analysis.",
-                    "For this medical assessment, I need Male or Female. Which applies to you?"
-                ]
-                dispatcher.utter_message(text=random.choice(help_responses))
-                return {"gender": None}
-        
-        return {"gender": None}
-    
-    def validate_diabetesMed(
-        self,
-        slot_value: Any,
-        dispatcher: CollectingDispatcher,
-        tracker: Tracker,
-        domain: DomainDict,
-    ) -> Dict[Text, Any]:
-        """Validate diabetes medication input"""
-        
-        if slot_value:
-            med_lower = slot_value.lower().strip()
-            if med_lower in ['yes', 'y', 'true', '1']:
-                confirmations = [
-                    "Noted - you are taking diabetes medication. That's important for management!",
-                    "Great! Diabetes medication usage recorded. Good job staying on top of treatment!",
-                    "Perfect! I've noted that you're on diabetes medication. Consistency is key!"
-                ]
-                dispatcher.utter_message(text=random.choice(confirmations))
-                return {"diabetesMed": "Yes"}
-            elif med_lower in ['no', 'n', 'false', '0']:
-                responses = [
-                    "Noted - you are not taking diabetes medication. We'll factor this into the assessment.",
-                    "Got it! No diabetes medication currently. This is important information for the analysis.",
-                    "Understood - no diabetes medication at this time. Thanks for the clarification!"
-                ]
-                dispatcher.utter_message(text=random.choice(responses))
-                return {"diabetesMed": "No"}
-            else:
-                help_responses = [
-                    "Please answer Yes or No for diabetes medication. Are you currently taking any?",
-                    "I need a Yes or No answer about diabetes medication. Currently taking any?",
-                    "Simple Yes or No - are you taking diabetes medication right now?"
-                ]
-                dispatcher.utter_message(text=random.choice(help_responses))
-                return {"diabetesMed": None}
-        
-        return {"diabetesMed": None}
-
+@instrument_action
 class ActionProcessMedicalData(Action):
     def name(self) -> Text:
         return "action_process_medical_data"
@@ -206,31 +54,10 @@ class ActionProcessMedicalData(Action):
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get all the collected medical information
-        medical_data = {
-            'age': tracker.get_slot('age'),
-            'gender': tracker.get_slot('gender'),
-            'race': tracker.get_slot('race'),
-            'time_in_hospital': tracker.get_slot('time_in_hospital'),
-            'admission_type_id': tracker.get_slot('admission_type_id'),
-            'discharge_disposition_id': tracker.get_slot('discharge_disposition_id'),
-            'admission_source_id': tracker.get_slot('admission_source_id'),
-            'num_medications': tracker.get_slot('num_medications'),
-            'num_lab_procedures': tracker.get_slot('num_lab_procedures'),
-            'num_procedures': tracker.get_slot('num_procedures'),
-            'number_diagnoses': tracker.get_slot('number_diagnoses'),
-            'number_inpatient': tracker.get_slot('number_inpatient'),
-            'number_outpatient': tracker.get_slot('number_outpatient'),
-            'number_emergency': tracker.get_slot('number_emergency'),
-            'diabetesMed': tracker.get_slot('diabetesMed'),
-            'change': tracker.get_slot('change'),
-            'A1Cresult': tracker.get_slot('A1Cresult'),
-            'max_glu_serum': tracker.get_slot('max_glu_serum'),
-            'insulin': tracker.get_slot('insulin'),
-            'metformin': tracker.get_slot('metformin')
-        }
+        record = PatientRecord.from_tracker(tracker)
         
         # Count how many fields are populated
-        filled_fields = sum(1 for value in medical_data.values() if value is not None)
+        filled_fields = record.filled_count()
         
         completion_messages = [
             f"Excellent! I've collected {filled_fields} pieces of medical information. Now I'm ready to run your diabetes readmission risk analysis!",
@@ -240,107 +67,23 @@ class ActionProcessMedicalData(Action):
         
         dispatcher.utter_message(text=random.choice(completion_messages))
         
-        # Log the collected data for debugging
-        logger.info(f"Medical data collected: {filled_fields} fields populated")
+        logger.info("medical_data_collected", filled_fields=filled_fields)
         
         return []
 
+@instrument_action
+@live_messages
+@rate_limited("prediction")
 class ActionPredictDiabetesReadmission(Action):
     def name(self) -> Text:
         return "action_predict_diabetes_readmission"
 
-    def _prepare_api_payload(self, medical_data: Dict[Text, Any]) -> Dict[Text, Any]:
-        """Prepare the payload for the API request"""
-        
-        # Convert slot values to API-expected format
-        def safe_float_convert(value, default=0):
-            try:
-                return float(value) if value is not None else default
-            except (ValueError, TypeError):
-                return default
-        
-        def safe_int_convert(value, default=1):
-            try:
-                return int(value) if value is not None else default
-            except (ValueError, TypeError):
-                return default
-        
-        # Map admission types
-        admission_type_map = {
-            "Emergency": 1,
-            "Urgent": 2, 
-            "Elective": 3
-        }
-        
-        # Map discharge dispositions
-        discharge_map = {
-            "Home": 1,
-            "Skilled Nursing Facility": 2,
-            "Rehabilitation": 3,
-            "Long-term Care": 4,
-            "Home Health Care": 5
-        }
-        
-        # Map admission sources
-        admission_source_map = {
-            "Emergency Room": 1,
-            "Physician Referral": 2,
-            "Clinic Referral": 3,
-            "Transfer from Hospital": 4
-        }
-        
-        payload = {
-            "age": medical_data.get("age", "[30-40)"),
-            "gender": medical_data.get("gender", "Female"),
-            "time_in_hospital": safe_float_convert(medical_data.get("time_in_hospital"), 3),
-            "admission_type": admission_type_map.get(medical_data.get("admission_type_id"), 1),
-            "discharge_disposition": discharge_map.get(medical_data.get("discharge_disposition_id"), 1),
-            "admission_source": admission_source_map.get(medical_data.get("admission_source_id"), 1),
-            "num_medications": safe_float_convert(medical_data.get("num_medications"), 5),
-            "num_lab_procedures": safe_float_convert(medical_data.get("num_lab_procedures"), 10),
-            "num_procedures": safe_float_convert(medical_data.get("num_procedures"), 1),
-            "number_diagnoses": safe_float_convert(medical_data.get("number_diagnoses"), 2),
-            "number_inpatient": safe_float_convert(medical_data.get("number_inpatient"), 0),
-            "number_outpatient": safe_float_convert(medical_data.get("number_outpatient"), 1),
-            "number_emergency": safe_float_convert(medical_data.get("number_emergency"), 0),
-            "diabetesMed": medical_data.get("diabetesMed", "No"),
-            "change": medical_data.get("change", "No"),
-            "A1Cresult": medical_data.get("A1Cresult", "None"),
-            "max_glu_serum": medical_data.get("max_glu_serum", "None"),
-            "insulin": medical_data.get("insulin", "No"),
-            "metformin": medical_data.get("metformin", "No"),
-            "diagnosis_1": "250.00"  # Default diabetes diagnosis code
-        }
-        
-        return payload
-
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get all medical data from slots
-        medical_data = {
-            "age": tracker.get_slot("age"),
-            "gender": tracker.get_slot("gender"),
-            "race": tracker.get_slot("race"),
-            "time_in_hospital": tracker.get_slot("time_in_hospital"),
-            "admission_type_id": tracker.get_slot("admission_type_id"),
-            "discharge_disposition_id": tracker.get_slot("discharge_disposition_id"),
-            "admission_source_id": tracker.get_slot("admission_source_id"),
-            "num_medications": tracker.get_slot("num_medications"),
-            "num_lab_procedures": tracker.get_slot("num_lab_procedures"),
-            "num_procedures": tracker.get_slot("num_procedures"),
-            "number_diagnoses": tracker.get_slot("number_diagnoses"),
-            "number_inpatient": tracker.get_slot("number_inpatient"),
-            "number_outpatient": tracker.get_slot("number_outpatient"),
-            "number_emergency": tracker.get_slot("number_emergency"),
-            "diabetesMed": tracker.get_slot("diabetesMed"),
-            "change": tracker.get_slot("change"),
-            "A1Cresult": tracker.get_slot("A1Cresult"),
-            "max_glu_serum": tracker.get_slot("max_glu_serum"),
-            "insulin": tracker.get_slot("insulin"),
-            "metformin": tracker.get_slot("metformin")
-        }
+        record = PatientRecord.from_tracker(tracker)
         
         analysis_intros = [
             "Connecting to our advanced AI prediction engine... This is exciting!",
@@ -349,45 +92,55 @@ class ActionPredictDiabetesReadmission(Action):
         ]
         dispatcher.utter_message(text=random.choice(analysis_intros))
         
+        events: List[Dict[Text, Any]] = []
         try:
             # Prepare API payload
-            api_payload = self._prepare_api_payload(medical_data)
+            api_payload = record.api_payload()
             
-            logger.info(f"Sending prediction request to API: {API_PREDICT_ENDPOINT}")
-            logger.info(f"Payload: {json.dumps(api_payload, indent=2)}")
+            # Clearly low-risk profiles can be answered by the local model alone
+            if LOCAL_MODEL_SERVE_BELOW > 0 and get_local_model().predict_proba(api_payload) < LOCAL_MODEL_SERVE_BELOW:
+                logger.info("low_risk_served_locally")
+                record_fallback(self.name(), "local_low_risk")
+                return self._provide_fallback_analysis(
+                    dispatcher, tracker, record, "local_low_risk",
+                    note="Your profile falls well within the low-risk range, so this assessment was computed instantly on our side. Please discuss it with your healthcare provider."
+                )
             
-            # Make API request for prediction
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(
-                API_PREDICT_ENDPOINT,
-                json=api_payload,
-                headers=headers,
-                timeout=30
-            )
+            cache_key = payload_cache_key(api_payload)
+            prediction_cache = get_prediction_cache()
             
-            if response.status_code == 200:
-                api_result = response.json()
-                
-                # Extract AI insights from API response
-                confidence_score = api_result.get("confidence_score", 0.5)
-                ai_remedy = api_result.get("remedy", "No specific insights available")
-                status = api_result.get("status", "unknown")
-                
-                # Convert confidence to risk level
-                if confidence_score < 0.3:
-                    risk_level = "LOW"
-                    risk_color = "🟢"
-                elif confidence_score < 0.7:
-                    risk_level = "MODERATE" 
-                    risk_color = "🟡"
-                else:
-                    risk_level = "HIGH"
-                    risk_color = "🟠"
-                
-                risk_percentage = round(confidence_score * 100, 1)
+            # Reuse an earlier prediction for the same answers if we have one
+            api_result = await prediction_cache.get("predict", cache_key)
+            
+            source = SOURCE_CACHE if api_result is not None else SOURCE_API
+            if api_result is not None:
+                logger.info("prediction_cache_hit", sample=LOG_SAMPLE_RATE)
+            else:
+                logger.info("prediction_request", endpoint=API_PREDICT_ENDPOINT, sample=LOG_SAMPLE_RATE)
+                # Medical fields are redacted when the event is rendered (LOG_REDACT)
+                logger.debug("prediction_payload", payload=api_payload)
                 
-                # Create comprehensive AI-powered assessment
-                assessment_message = f"""
+                # Concurrent assessments are sent to the model API together as one batch;
+                # when the API is saturated the wait for a turn is bounded
+                async with get_prediction_gate():
+                    api_result = await get_micro_batcher().submit(api_payload)
+                await prediction_cache.set("predict", cache_key, api_result)
+            
+            # Extract AI insights from API response
+            confidence_score = api_result.get("confidence_score", 0.5)
+            ai_remedy = api_result.get("remedy", "No specific insights available")
+            
+            # Convert confidence to risk level
+            risk_level, risk_color = classify_risk(confidence_score)
+            
+            risk_percentage = round(confidence_score * 100, 1)
+            if source == SOURCE_CACHE:
+                processing = "Reused from an earlier assessment with identical answers"
+            else:
+                processing = "Real-time processing via secure API endpoint"
+            
+            # Create comprehensive AI-powered assessment
+            assessment_message = f"""
 AI-POWERED DIABETES READMISSION RISK ASSESSMENT
 
 {risk_color} **RISK LEVEL: {risk_level}
@@ -410,88 +163,123 @@ This AI-powered assessment uses advanced machine learning algorithms and is for
 
 **Technical Details:**
 - Prediction generated using state-of-the-art ML models
-- Analysis based on {len([k for k, v in medical_data.items() if v is not None])} medical parameters
-- Real-time processing via secure API endpoint
-                """
-                
-                dispatcher.utter_message(text=assessment_message)
-                
-                # Ask if user wants a detailed PDF report
-                report_offer_messages = [
-                    "�📄 Would you like me to generate a comprehensive PDF report of your assessment? Just say 'yes' and I'll create a detailed medical report for you!",
-                    "I can create a professional PDF report with all your assessment details. Would you like me to generate that for you?",
-                    "🎯 Want a detailed PDF report for your records? I can generate a comprehensive medical assessment document!"
-                ]
-                dispatcher.utter_message(text=random.choice(report_offer_messages))
-                
-                logger.info(f"AI Prediction completed successfully: {risk_level} risk, confidence: {confidence_score}")
-                
-            else:
-                # Fallback to local analysis if API fails
-                logger.error(f"API request failed with status {response.status_code}: {response.text}")
-                dispatcher.utter_message(text="🔄 Our AI service is temporarily busy, but I'll provide you with a comprehensive local analysis...")
-                
-                # Use fallback local analysis
-                self._provide_fallback_analysis(dispatcher, medical_data)
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API connection error: {str(e)}")
+- Analysis based on {record.filled_count()} medical parameters
+- {processing}
+            """
+            
+            dispatcher.utter_message(text=assessment_message)
+            
+            # Ask if user wants a detailed PDF report
+            report_offer_messages = [
+                "�📄 Would you like me to generate a comprehensive PDF report of your assessment? Just say 'yes' and I'll create a detailed medical report for you!",
+                "I can create a professional PDF report with all your assessment details. Would you like me to generate that for you?",
+                "🎯 Want a detailed PDF report for your records? I can generate a comprehensive medical assessment document!"
+            ]
+            dispatcher.utter_message(text=random.choice(report_offer_messages))
+            
+            logger.info("prediction_completed", source=source, risk_level=risk_level, confidence=confidence_score)
+            get_analytics().publish(
+                assessment_event(tracker.sender_id, record, source, confidence_score, risk_level, model_version=api_result.get("model_version"))
+            )
+            events = self._prediction_events(
+                api_payload, confidence_score, risk_level, ai_remedy, api_result.get("model_version"), source
+            )
+            
+        except APIStatusError as e:
+            # Fallback to local analysis if API fails
+            logger.error("prediction_api_status_error", error=str(e))
+            record_fallback(self.name(), "api_status")
+            dispatcher.utter_message(text="🔄 Our AI service is temporarily busy, but I'll provide you with a comprehensive local analysis...")
+            
+            # Use fallback local analysis
+            events = self._provide_fallback_analysis(dispatcher, tracker, record, "api_status")
+            
+        except Overloaded as e:
+            logger.warning("prediction_api_overloaded", error=str(e))
+            record_fallback(self.name(), "overloaded")
+            dispatcher.utter_message(text="🔄 Our AI service is very busy right now, so I'll analyze your data locally...")
+            
+            # Answer now rather than queueing behind everyone else
+            events = self._provide_fallback_analysis(dispatcher, tracker, record, "overloaded")
+            
+        except CircuitOpenError as e:
+            logger.warning("prediction_api_circuit_open", error=str(e))
+            record_fallback(self.name(), "circuit_open")
+            dispatcher.utter_message(text="🔄 Our AI service is recovering right now, so I'll analyze your data locally...")
+            
+            # Serve the local analysis immediately instead of waiting on the API
+            events = self._provide_fallback_analysis(dispatcher, tracker, record, "circuit_open")
+        
+        except APIConnectionError as e:
+            logger.error("prediction_api_connection_error", error=str(e))
+            record_fallback(self.name(), "api_error")
             dispatcher.utter_message(text="🔄 I'm having trouble connecting to our AI service, but don't worry - I'll analyze your data locally...")
             
             # Use fallback local analysis
-            self._provide_fallback_analysis(dispatcher, medical_data)
+            events = self._provide_fallback_analysis(dispatcher, tracker, record, "api_error")
         
         except Exception as e:
-            logger.error(f"Unexpected error in prediction: {str(e)}")
+            logger.error("prediction_failed", error_type=type(e).__name__)
+            record_fallback(self.name(), "unexpected_error")
             dispatcher.utter_message(text="WARNING: Something unexpected happened, but I'll still provide you with a basic assessment...")
             
             # Use fallback local analysis
-            self._provide_fallback_analysis(dispatcher, medical_data)
+            events = self._provide_fallback_analysis(dispatcher, tracker, record, "unexpected_error")
         
-        return []
+        return events
     
-    def _provide_fallback_analysis(self, dispatcher: CollectingDispatcher, medical_data: Dict[Text, Any]):
+    @staticmethod
+    def _prediction_events(payload: Dict[Text, Any], score: float, risk_level: Text, remedy: Text = None,
+                           model_version: Text = None, source: Text = SOURCE_API) -> List[Dict[Text, Any]]:
+        """Keep the prediction shown in the chat so the PDF report can reuse it"""
+        return [SlotSet(PREDICTION_SLOT, {
+            "payload_key": payload_cache_key(payload),
+            "confidence_score": score,
+            "risk_level": risk_level,
+            "remedy": remedy,
+            "model_version": model_version,
+            "source": source,
+        })]
+
+    def _provide_fallback_analysis(self, dispatcher: CollectingDispatcher, tracker: Tracker, record: PatientRecord,
+                                   reason: Text, note: Text = None) -> List[Dict[Text, Any]]:
         """Provide local analysis when API is unavailable"""
         
-        # Simple local risk assessment
-        risk_factors = 0
-        
-        try:
-            time_in_hospital = float(medical_data.get("time_in_hospital", 0))
-            if time_in_hospital > 7:
-                risk_factors += 1
-        except:
-            pass
-        
         try:
-            inpatient_visits = float(medical_data.get("number_inpatient", 0))
-            if inpatient_visits > 2:
-                risk_factors += 1
-        except:
-            pass
-        
-        if medical_data.get("diabetesMed") == "No":
-            risk_factors += 1
-        
-        if medical_data.get("A1Cresult") in [">7", ">8"]:
-            risk_factors += 1
-        
-        # Determine risk level
-        if risk_factors <= 1:
-            risk_level = "LOW"
-            risk_color = "🟢"
-        elif risk_factors <= 2:
-            risk_level = "MODERATE"
-            risk_color = "🟡"
+            # Score the same payload the API would have received with the local model
+            local_model = get_local_model()
+            api_payload = record.api_payload()
+            probability = local_model.predict_proba(api_payload)
+            top_factors = local_model.top_factors(api_payload)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("local_model_unavailable", error_type=type(e).__name__)
+            dispatcher.utter_message(text="❌ I couldn't complete the local analysis right now. Please try again in a few moments.")
+            return []
+        
+        risk_level, risk_color = classify_risk(probability)
+        if note is None:
+            note = "This assessment was computed locally. For detailed AI insights, please try again later when our advanced service is available."
+        if local_model.trained:
+            probability_line = f"📊 **Estimated Risk Probability: {round(probability * 100, 1)}%**"
         else:
-            risk_level = "HIGH"
-            risk_color = "🟠"
+            # The baseline model is hand-calibrated, not fitted to outcomes: no false precision
+            probability_line = f"📊 **Rough Risk Estimate: about {int(round(probability * 20)) * 5}%**"
+            note += (
+                " This figure is a rough estimate from a simplified model that has not been trained on patient outcomes."
+            )
+        if top_factors:
+            factors_text = "\n".join(f"• {describe_feature(feature)}" for feature, _ in top_factors)
+        else:
+            factors_text = "• No individual factor stands out"
         
         fallback_message = f"""
 🏥 **LOCAL DIABETES READMISSION RISK ASSESSMENT**
 
 {risk_color} **RISK LEVEL: {risk_level}**
-📊 **Risk Factors Identified: {risk_factors}**
+{probability_line}
+
+🔎 **MAIN CONTRIBUTING FACTORS:**
+{factors_text}
 
 💡 **GENERAL RECOMMENDATIONS:**
 • Continue regular medical follow-ups
@@ -499,136 +287,98 @@ This AI-powered assessment uses advanced machine learning algorithms and is for
 • Monitor blood glucose regularly
 • Focus on healthy lifestyle choices
 
-**NOTE:** This is a basic assessment. For detailed AI insights, please try again later when our advanced service is available.
+**NOTE:** {note}
         """
         
         dispatcher.utter_message(text=fallback_message)
-
+        logger.info(
+            "local_prediction_completed", reason=reason, risk_level=risk_level,
+            probability=round(probability, 3), model=local_model.version,
+        )
+        get_analytics().publish(
+            assessment_event(tracker.sender_id, record, SOURCE_LOCAL, probability, risk_level, reason, local_model.version)
+        )
+        return self._prediction_events(api_payload, probability, risk_level, model_version=local_model.version, source=SOURCE_LOCAL)
+
+@instrument_action
+@live_messages
+@rate_limited("report")
 class ActionGeneratePDFReport(Action):
     def name(self) -> Text:
         return "action_generate_pdf_report"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get all medical data from slots
-        medical_data = {
-            "age": tracker.get_slot("age"),
-            "gender": tracker.get_slot("gender"),
-            "race": tracker.get_slot("race"),
-            "time_in_hospital": tracker.get_slot("time_in_hospital"),
-            "admission_type_id": tracker.get_slot("admission_type_id"),
-            "discharge_disposition_id": tracker.get_slot("discharge_disposition_id"),
-            "admission_source_id": tracker.get_slot("admission_source_id"),
-            "num_medications": tracker.get_slot("num_medications"),
-            "num_lab_procedures": tracker.get_slot("num_lab_procedures"),
-            "num_procedures": tracker.get_slot("num_procedures"),
-            "number_diagnoses": tracker.get_slot("number_diagnoses"),
-            "number_inpatient": tracker.get_slot("number_inpatient"),
-            "number_outpatient": tracker.get_slot("number_outpatient"),
-            "number_emergency": tracker.get_slot("number_emergency"),
-            "diabetesMed": tracker.get_slot("diabetesMed"),
-            "change": tracker.get_slot("change"),
-            "A1Cresult": tracker.get_slot("A1Cresult"),
-            "max_glu_serum": tracker.get_slot("max_glu_serum"),
-            "insulin": tracker.get_slot("insulin"),
-            "metformin": tracker.get_slot("metformin")
-        }
-        
-        dispatcher.utter_message(text="📄 Generating your comprehensive PDF medical report... This may take a moment!")
+        record = PatientRecord.from_tracker(tracker)
         
         try:
-            # Prepare API payload (reuse the method from prediction action)
-            prediction_action = ActionPredictDiabetesReadmission()
-            api_payload = prediction_action._prepare_api_payload(medical_data)
-            logger.info(f"Sending report generation request to API: {API_REPORT_ENDPOINT}")
-            # Make API request for PDF report generation
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(
-                API_REPORT_ENDPOINT,
-                json=api_payload,
-                headers=headers,
-                timeout=60  # Longer timeout for report generation
-            )
-            if response.status_code == 200:
-                # Check content type to determine response format
-                content_type = response.headers.get("Content-Type", "")
-                
-                if "application/pdf" in content_type:
-                    # Backend returned PDF file directly
-                    logger.info("Received PDF file directly from backend")
-                    
-                    # Extract filename from Content-Disposition header or create one
-                    content_disposition = response.headers.get("Content-Disposition", "")
-                    match = re.search(r'filename="?([^";]+)"?', content_disposition)
-                    
-                    if match:
-                        report_filename = match.group(1)
-                    else:
-                        # Generate a filename if not provided
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        report_filename = f"medical_report_{timestamp}.pdf"
-                    
-                    logger.info(f"PDF report generated successfully: {report_filename}")
-                    
-                    # Create proper download URL
-                    download_url = f"{API_DOWNLOAD_ENDPOINT}/{report_filename}"
-                    
-                    # For direct PDF response, we'll provide a generic download message
-                    success_messages = [
-                        "Your PDF report has been generated successfully!",
-                        "Excellent! Your comprehensive medical report is ready!",
-                        "Perfect! Your detailed assessment report has been created!"
-                    ]
-                    dispatcher.utter_message(text=random.choice(success_messages))
-                    
-                    dispatcher.utter_message(
-                        text=f"""
-📄 **YOUR MEDICAL REPORT IS READY!**
+            # Prepare API payload
+            api_payload = record.api_payload()
+            
+            # The report shows the prediction already given in the chat, unless the
+            # answers changed since; then the backend has to predict again
+            stored = tracker.get_slot(PREDICTION_SLOT) or {}
+            prediction = None
+            if stored.get("payload_key") == payload_cache_key(api_payload):
+                prediction = {key: value for key, value in stored.items() if key != "payload_key"}
+            
+            # Rendering runs in the background; the chat gets the job's link right away.
+            # An identical assessment reuses the report already in the report store.
+            job = get_report_queue().submit(api_payload, prediction)
+            logger.info("report_requested", job_id=job.job_id, status=job.status)
+            if job.status == DONE:
+                self._send_report_ready(dispatcher, job.download_url)
+            else:
+                self._send_report_queued(dispatcher, job)
+        except ReportQueueFull as e:
+            logger.warning("report_queue_full", error=str(e))
+            dispatcher.utter_message(text="⏳ Our report service is very busy right now. Please ask for your report again in a few minutes.")
+
+        except Exception as e:
+            logger.error("report_request_failed", error_type=type(e).__name__)
+            dispatcher.utter_message(text="⚠️ Something went wrong while generating your report. Please try again.")
+
+        return []
+
+    def _send_report_queued(self, dispatcher: CollectingDispatcher, job: ReportJob):
+        """Give the user the link of a report that is still being generated"""
+        dispatcher.utter_message(
+            text=f"""
+📄 **YOUR MEDICAL REPORT IS BEING GENERATED!**
 
-� **Download Link:** {API_REPORT_ENDPOINT}
+🔗 **Download Link:** {job.download_url}
 
-�📊 **Report Contains:**
+⚙️ Your comprehensive PDF report is being prepared in the background (job `{job.job_id}`). The link opens your report as soon as it is ready, usually within a minute, so you can keep chatting in the meantime.
+
+📊 **Report Contains:**
 • Complete risk assessment analysis
-• AI-generated medical insights  
+• AI-generated medical insights
 • Personalized recommendations
 • Detailed data summary
 • Professional medical formatting
 
-📥 **Download Information:**
-Your report "{report_filename}" has been generated and is ready for download.
-
 💡 **To download your report:**
-Click the download button above to open your PDF in a new window, or use this curl command:
-`curl -o report.pdf {download_url}`
+Use the link above, or save it using:
+`curl -L -o report.pdf {job.download_url}`
 
-⏰ **Report Availability:** Your report will be available for the next 24 hours.
-
-🔒 **Privacy Note:** Your report is securely generated and contains your personalized health assessment.
-                        """
-                    )
-                    
-                elif "application/json" in content_type:
-                    # Backend returned JSON with filename
-                    try:
-                        report_data = response.json()
-                        
-                        if report_data.get("status") == "success":
-                            report_filename = report_data.get("pdf_filename")
-                            
-                            if report_filename:
-                                download_url = f"{API_DOWNLOAD_ENDPOINT}/{report_filename}"
-                                
-                                success_messages = [
-                                    "Your PDF report has been generated successfully!",
-                                    "Excellent! Your comprehensive medical report is ready!",
-                                    "Perfect! Your detailed assessment report has been created!"
-                                ]
-                                dispatcher.utter_message(text=random.choice(success_messages))
-                                
-                                dispatcher.utter_message(
-                                    text=f"""
+⏰ **Report Availability:** Your report will be available for download for the next 24 hours.
+            """
+        )
+
+    def _send_report_ready(self, dispatcher: CollectingDispatcher, download_url: Text):
+        """Tell the user where to download a generated report"""
+        success_messages = [
+            "Your PDF report has been generated successfully!",
+            "Excellent! Your comprehensive medical report is ready!",
+            "Perfect! Your detailed assessment report has been created!"
+        ]
+        dispatcher.utter_message(text=random.choice(success_messages))
+        
+        dispatcher.utter_message(
+            text=f"""
 📄 **YOUR MEDICAL REPORT IS READY!**
 
 🔗 **Download Link:** {download_url}
@@ -642,98 +392,23 @@ Click the download button above to open your PDF in a new window, or use this cu
 
 💡 **To download your report:**
 You can access your report using the link above, or save it using:
-`curl -o report.pdf {download_url}`
+`curl -L -o report.pdf {download_url}`
 
 ⏰ **Report Availability:** Your report will be available for download for the next 24 hours.
 
 🔒 **Privacy Note:** Your report is securely generated and contains your personalized health assessment.
-                                    """
-                                )
-                                logger.info(f"PDF report generated successfully: {report_filename}")
-                            else:
-                                dispatcher.utter_message(text="❌ Report was generated but download link is not available. Please try again.")
-                        else:
-                            error_msg = report_data.get("error", "Unknown error occurred")
-                            dispatcher.utter_message(text=f"❌ Report generation failed: {error_msg}")
-                    except json.JSONDecodeError:
-                        dispatcher.utter_message(text="❌ Received invalid response from report service.")
-                else:
-                    dispatcher.utter_message(text="❌ Unexpected response format from report service.")
-            else:
-                logger.error(f"Report generation API failed with status {response.status_code}: {response.text}")
-                dispatcher.utter_message(text="❌ I'm having trouble generating your PDF report right now. Please try again in a few moments.")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Report generation API connection error: {str(e)}")
-            dispatcher.utter_message(text="🔄 I'm unable to connect to the report generation service at the moment. Please try again later.")
-
-        except Exception as e:
-            logger.error(f"Unexpected error in report generation: {str(e)}")
-            dispatcher.utter_message(text="⚠️ Something went wrong while generating your report. Please try again.")
-
-        return []
+            """
+        )
 
-#                 # Extract the report filename from response
-#                 report_data = response.json()
-
-#                 report_filename = report_data.get("pdf_filename")
-                
-#                 if report_filename:
-#                     download_url = f"{API_DOWNLOAD_ENDPOINT}/download_report/{report_filename}"
-
-#                     success_messages = [
-#                         f"Your PDF report has been generated successfully!",
-#                         f"Excellent! Your comprehensive medical report is ready!",
-#                         f"Perfect! Your detailed assessment report has been created!"
-#                     ]
-                    
-#                     dispatcher.utter_message(text=random.choice(success_messages))
-                    
-#                     dispatcher.utter_message(
-#                         text=f"""
-# 📄 **YOUR MEDICAL REPORT IS READY!**
-
-# 🔗 **Download Link:** {download_url}
-
-# 📊 **Report Contains:**
-# • Complete risk assessment analysis
-# • AI-generated medical insights
-# • Personalized recommendations
-# • Detailed data summary
-# • Professional medical formatting
-
-# 💡 **To download your report:**
-# You can access your report using the link above, or save it using:
-# `curl -o medical_report.pdf {download_url}`
-
-# ⏰ **Report Availability:** Your report will be available for download for the next 24 hours.
-
-# 🔒 **Privacy Note:** Your report is securely generated and contains your personalized health assessment.
-#                         """
-#                     )
-                    
-#                     logger.info(f"PDF report generated successfully: {report_filename}")
-#                 else:
-#                     dispatcher.utter_message(text="WARNING: Report was generated but download link is not available. Please try again.")
-                    
-#             else:
-#                 logger.error(f"Report generation API failed with status {response.status_code}: {response.text}")
-#                 dispatcher.utter_message(text="❌ I'm having trouble generating your PDF report right now. Please try again in a few moments.")
-                
-#         except requests.exceptions.RequestException as e:
-#             logger.error(f"Report generation API connection error: {str(e)}")
-#             dispatcher.utter_message(text="🔄 I'm unable to connect to the report generation service at the moment. Please try again later.")
-            
-#         except Exception as e:
-#             logger.error(f"Unexpected error in report generation: {str(e)}")
-#             dispatcher.utter_message(text="⚠️ Something went wrong while generating your report. Please try again.")
-        
-#         return []
 
+@instrument_action
+@live_messages
+@rate_limited("llm")
 class ActionLLMFallback(Action):
     def name(self) -> Text:
         return "action_llm_fallback"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
@@ -741,32 +416,39 @@ class ActionLLMFallback(Action):
         
         # Try to use local LLM (Ollama) as fallback
         try:
-            import ollama
-            
-            # Prepare context for the LLM
-            context_prompt = f"""You are a friendly AI health assistant specializing in diabetes care. 
-            The user said: "{user_message}"
-            
-            Please respond in a conversational, helpful manner. If the question is health-related, 
-            provide general information but remind them to consult healthcare professionals for 
-            medical advice. If it's casual conversation, be friendly and try to gently steer 
-            back to health topics when appropriate.
+            # Near-identical chit-chat is answered from the response cache
+            llm_cache = get_llm_cache()
+            llm_response = llm_cache.get(user_message) if llm_cache else None
+            if llm_response is None:
+                # Prepare context for the LLM
+                context_prompt = f"""You are a friendly AI health assistant specializing in diabetes care. 
+                The user said: "{user_message}"
             
-            Keep responses concise (1-2 sentences) and engaging."""
+                Please respond in a conversational, helpful manner. If the question is health-related, 
+                provide general information but remind them to consult healthcare professionals for 
+                medical advice. If it's casual conversation, be friendly and try to gently steer 
+                back to health topics when appropriate.
             
-            # Call local Ollama model (using llama3.2:1b for faster responses)
-            response = ollama.chat(model='llama3.2:1b', messages=[
-                {
-                    'role': 'system',
-                    'content': context_prompt
-                },
-                {
-                    'role': 'user', 
-                    'content': user_message
-                }
-            ])
+                Keep responses concise (1-2 sentences) and engaging."""
             
-            llm_response = response['message']['content']
+                # Stream the reply from the local Ollama model within the latency budget,
+                # and on to a streaming client as it arrives
+                reply = await get_llm_client().complete([
+                    {
+                        'role': 'system',
+                        'content': context_prompt
+                    },
+                    {
+                        'role': 'user', 
+                        'content': user_message
+                    }
+                ], on_token=token_publisher(tracker.sender_id))
+                llm_response = reply.text
+                if not llm_response:
+                    raise APIConnectionError(f"no reply within {LLM_LATENCY_BUDGET}s")
+                # A reply cut short by the latency budget is sent, but not reused
+                if llm_cache and reply.finished:
+                    llm_cache.set(user_message, llm_response)
             
             # Add a small indicator that this was AI-generated
             fallback_responses = [
@@ -776,20 +458,31 @@ class ActionLLMFallback(Action):
             ]
             
             dispatcher.utter_message(text=random.choice(fallback_responses))
-            logger.info(f"LLM fallback used for: {user_message}")
+            logger.info("llm_fallback_used", message_length=len(user_message))
             
         except Exception as e:
-            logger.error(f"LLM fallback failed: {str(e)}")
+            logger.error("llm_fallback_failed", error_type=type(e).__name__)
+            record_fallback(self.name(), "canned_response")
             
             # Fallback to hardcoded responses if LLM fails
-            generic_responses = [
-                "I'm not sure I understand that completely, but I'm here to help with your health questions! Would you like to know about diabetes risk assessment?",
-                "That's interesting! While I specialize in diabetes health analytics, I'm always happy to chat. Is there anything health-related I can help you with?",
-                "I might not have the perfect answer for that, but I'm excellent at health assessments! Want to explore your diabetes risk factors?",
-                "Hmm, that's outside my main expertise area, but I love helping with health questions! How about we check your diabetes readmission risk?",
-                "I'm still learning about topics outside of health analytics! Speaking of health, have you considered getting a diabetes risk assessment?"
-            ]
-            
-            dispatcher.utter_message(text=random.choice(generic_responses))
+            self._send_canned_response(dispatcher)
         
         return []
+
+    def on_rate_limited(self, dispatcher: CollectingDispatcher, tracker: Tracker, wait: float) -> List[Dict[Text, Any]]:
+        """Chit-chat over the sender's LLM limit gets a canned reply instead of a generation"""
+        record_fallback(self.name(), "rate_limited")
+        self._send_canned_response(dispatcher)
+        return []
+
+    @staticmethod
+    def _send_canned_response(dispatcher: CollectingDispatcher):
+        generic_responses = [
+            "I'm not sure I understand that completely, but I'm here to help with your health questions! Would you like to know about diabetes risk assessment?",
+            "That's interesting! While I specialize in diabetes health analytics, I'm always happy to chat. Is there anything health-related I can help you with?",
+            "I might not have the perfect answer for that, but I'm excellent at health assessments! Want to explore your diabetes risk factors?",
+            "Hmm, that's outside my main expertise area, but I love helping with health questions! How about we check your diabetes readmission risk?",
+            "I'm still learning about topics outside of health analytics! Speaking of health, have you considered getting a diabetes risk assessment?"
+        ]
+        
+        dispatcher.utter_message(text=random.choice(generic_responses))
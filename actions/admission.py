@@ -0,0 +1,112 @@
+# Admission control for the backends behind the actions.
+#
+# An AdmissionGate lets at most `max_concurrency` calls to one backend run at
+# a time. Further calls queue, but only up to `max_queue` of them and for at
+# most `max_wait` seconds; anything beyond that is shed with Overloaded right
+# away, and the caller answers from its fallback (the local model for the
+# prediction, the canned replies for the LLM). When the prediction API or
+# Ollama saturates, turns therefore wait a bounded time instead of piling up
+# behind a growing backlog, and p99 latency stays bounded for everyone.
+#
+# Gates are per action server process; with actions.cluster the limits apply
+# per worker.
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional, Text
+
+
+# Prediction API admission (overridable through the environment)
+PREDICT_MAX_CONCURRENCY = int(os.getenv("PREDICT_MAX_CONCURRENCY", "16"))
+PREDICT_MAX_QUEUE = int(os.getenv("PREDICT_MAX_QUEUE", "64"))
+PREDICT_MAX_WAIT = float(os.getenv("PREDICT_MAX_WAIT", "2"))
+
+
+class Overloaded(Exception):
+    """Raised when a call is shed because its backend is saturated."""
+
+
+class AdmissionGate:
+    """Caps the calls in flight to one backend, with a bounded wait for the rest.
+
+    A `max_concurrency` of 0 admits everything.
+    """
+
+    def __init__(self, name: Text, max_concurrency: int, max_queue: int, max_wait: Optional[float] = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self.in_flight = 0
+        self.waiting = 0
+
+        self.admitted = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        _gates[name] = self
+
+    async def acquire(self) -> None:
+        """Wait for a slot; raises Overloaded if the call is shed instead."""
+        if self.max_concurrency <= 0:
+            self.admitted += 1
+            return
+        if self._slots.locked():
+            await self._queue()
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+
+    async def _queue(self) -> None:
+        if self.waiting >= self.max_queue:
+            self.shed += 1
+            raise Overloaded(f"{self.in_flight} {self.name} calls running and {self.waiting} waiting")
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise Overloaded(f"no {self.name} slot free within {self.max_wait:g}s")
+        finally:
+            self.waiting -= 1
+        self.total_wait += time.monotonic() - started
+
+    def release(self) -> None:
+        if self.max_concurrency > 0:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def __aenter__(self) -> "AdmissionGate":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.release()
+
+    def stats(self) -> Dict[Text, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "mean_wait_ms": 1000.0 * self.total_wait / self.admitted if self.admitted else 0.0,
+        }
+
+
+_gates: Dict[Text, AdmissionGate] = {}
+
+
+def get_prediction_gate() -> AdmissionGate:
+    """Return the gate in front of the prediction API, creating it on first use."""
+    gate = _gates.get("predict")
+    if gate is None:
+        gate = AdmissionGate("predict", PREDICT_MAX_CONCURRENCY, PREDICT_MAX_QUEUE, PREDICT_MAX_WAIT)
+    return gate
+
+
+def admission_gates() -> Dict[Text, AdmissionGate]:
+    return dict(_gates)
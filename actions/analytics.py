@@ -0,0 +1,284 @@
+# Analytics pipeline for completed risk assessments.
+#
+# The prediction action publishes one event per assessment it answers: the
+# patient record as sent to the model, the risk score and level, and where the
+# answer came from (the prediction API, the prediction cache, or the local
+# model and why). publish() only appends to a bounded in-memory buffer and
+# never waits; when the buffer is full the event is dropped and counted, so a
+# slow or unavailable sink can never hold up a chat turn. A background task
+# writes the buffer out in batches, from a thread, to one of two sinks:
+#   parquet  - one Parquet file per batch and day under ANALYTICS_DIR,
+#              partitioned by day (needs pyarrow)
+#   postgres - an `assessments` table, created on first use (psycopg2)
+# The events hold the patient's answers, so nothing is recorded until a sink
+# is chosen with ANALYTICS_SINK. Conversations are identified by a hash of
+# the sender id only.
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Text
+
+from .patient_record import PatientRecord
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Analytics configuration (overridable through the environment)
+ANALYTICS_SINK = os.getenv("ANALYTICS_SINK", "none").lower()  # none, parquet or postgres
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "analytics")
+ANALYTICS_POSTGRES_DSN = os.getenv("ANALYTICS_POSTGRES_DSN", "postgresql://localhost:5432/analytics")
+ANALYTICS_BUFFER_MAX = int(os.getenv("ANALYTICS_BUFFER_MAX", "10000"))
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "500"))
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "10"))
+
+# Attempts to write one batch before it is given up
+WRITE_ATTEMPTS = 3
+
+# Sources of an assessment
+SOURCE_API = "api"
+SOURCE_CACHE = "cache"
+SOURCE_LOCAL = "local"
+
+
+def assessment_event(
+    sender_id: Optional[Text],
+    record: PatientRecord,
+    source: Text,
+    risk_score: float,
+    risk_level: Text,
+    reason: Optional[Text] = None,
+    model_version: Optional[Text] = None,
+) -> Dict[Text, Any]:
+    """One analytics row: the assessment, flattened with the fields of the model payload."""
+    event = {
+        "assessment_id": uuid.uuid4().hex,
+        "created_at": datetime.now(timezone.utc),
+        "conversation": hashlib.sha256((sender_id or "").encode("utf-8")).hexdigest()[:16],
+        "source": source,
+        "reason": reason,
+        "risk_score": float(risk_score),
+        "risk_level": risk_level,
+        "model_version": model_version,
+        "filled_fields": record.filled_count(),
+    }
+    for field, value in record.api_payload().items():
+        event[f"record_{field}"] = value
+    return event
+
+
+# Arrow types of the columns that are not always filled
+COLUMN_TYPES = {"reason": "string", "model_version": "string", "risk_score": "float64"}
+
+
+class ParquetSink:
+    """Writes each batch as Parquet files under directory/date=YYYY-MM-DD/, one per day it spans."""
+
+    def __init__(self, directory: Text = ANALYTICS_DIR):
+        import pyarrow  # noqa: F401 - fail at start-up rather than on the first flush
+
+        self.directory = directory
+
+    def write(self, events: List[Dict[Text, Any]]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # A batch written around midnight spans two days
+        days: Dict[Text, List[Dict[Text, Any]]] = {}
+        for event in events:
+            days.setdefault(event["created_at"].strftime("%Y-%m-%d"), []).append(event)
+
+        paths = []
+        for day, rows in days.items():
+            partition = os.path.join(self.directory, f"date={day}")
+            os.makedirs(partition, exist_ok=True)
+            path = os.path.join(partition, f"part-{int(time.time() * 1000)}-{os.getpid()}-{uuid.uuid4().hex[:8]}.parquet")
+            table = pa.Table.from_pylist(rows)
+            # Columns that are empty in a batch would otherwise be written with the null type
+            for name, type_name in COLUMN_TYPES.items():
+                index = table.schema.get_field_index(name)
+                if index >= 0 and table.schema.field(index).type != getattr(pa, type_name)():
+                    table = table.set_column(index, name, table.column(index).cast(getattr(pa, type_name)()))
+            pq.write_table(table, path + ".tmp")
+            paths.append(path)
+        # Published together, so a retried batch is not written twice
+        for path in paths:
+            os.replace(path + ".tmp", path)
+
+    def close(self) -> None:
+        pass
+
+
+class PostgresSink:
+    """Inserts each batch into the `assessments` table in one statement."""
+
+    COLUMNS = ("assessment_id", "created_at", "conversation", "source", "reason",
+               "risk_score", "risk_level", "model_version", "filled_fields", "record")
+
+    def __init__(self, dsn: Text = ANALYTICS_POSTGRES_DSN):
+        self.dsn = dsn
+        self._connection = None
+
+    def _connect(self):
+        import psycopg2
+
+        if self._connection is None or self._connection.closed:
+            self._connection = psycopg2.connect(self.dsn)
+            with self._connection, self._connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS assessments (
+                        assessment_id TEXT PRIMARY KEY,
+                        created_at TIMESTAMPTZ NOT NULL,
+                        conversation TEXT,
+                        source TEXT NOT NULL,
+                        reason TEXT,
+                        risk_score DOUBLE PRECISION,
+                        risk_level TEXT,
+                        model_version TEXT,
+                        filled_fields INTEGER,
+                        record JSONB
+                    )
+                    """
+                )
+        return self._connection
+
+    def write(self, events: List[Dict[Text, Any]]) -> None:
+        from psycopg2.extras import execute_values
+
+        rows = []
+        for event in events:
+            record = {key[len("record_"):]: value for key, value in event.items() if key.startswith("record_")}
+            rows.append(tuple(event.get(column) for column in self.COLUMNS[:-1]) + (json.dumps(record),))
+        connection = self._connect()
+        try:
+            with connection, connection.cursor() as cursor:
+                execute_values(
+                    cursor,
+                    f"INSERT INTO assessments ({', '.join(self.COLUMNS)}) VALUES %s ON CONFLICT DO NOTHING",
+                    rows,
+                )
+        except Exception:
+            connection.close()  # reconnect on the next attempt
+            raise
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+
+
+def create_sink(kind: Text = ANALYTICS_SINK):
+    if kind == "parquet":
+        return ParquetSink()
+    if kind == "postgres":
+        return PostgresSink()
+    return None
+
+
+class AnalyticsPipeline:
+    """Bounded buffer of events, written to the sink in batches by a background task."""
+
+    def __init__(self, sink: Any, max_buffered: int = ANALYTICS_BUFFER_MAX,
+                 batch_size: int = ANALYTICS_BATCH_SIZE, flush_interval: float = ANALYTICS_FLUSH_INTERVAL):
+        self.sink = sink
+        self.max_buffered = max_buffered
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._buffer: Deque[Dict[Text, Any]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.published = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def publish(self, event: Dict[Text, Any]) -> bool:
+        """Buffer `event` for the sink without waiting; False if the buffer is full and it was dropped."""
+        if self.sink is None:
+            return False
+        if len(self._buffer) >= self.max_buffered:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("analytics_buffer_full", dropped=self.dropped)
+            return False
+        self._buffer.append(event)
+        self.published += 1
+        self._start()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write everything buffered so far, one batch at a time."""
+        loop = asyncio.get_running_loop()
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            for attempt in range(1, WRITE_ATTEMPTS + 1):
+                try:
+                    await loop.run_in_executor(None, self.sink.write, batch)
+                    self.written += len(batch)
+                    break
+                except Exception as e:
+                    logger.error("analytics_write_failed", events=len(batch), attempt=attempt, error=str(e))
+                    if attempt == WRITE_ATTEMPTS:
+                        self.failed += len(batch)
+                        return
+                    await asyncio.sleep(2 ** attempt)
+
+    async def close(self) -> None:
+        """Let the background task finish its batch, then write out what is still buffered."""
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.sink is not None:
+            await self.flush()
+            self.sink.close()
+
+    def stats(self) -> Dict[Text, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "published": self.published,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+_pipeline: Optional[AnalyticsPipeline] = None
+
+
+def get_analytics() -> AnalyticsPipeline:
+    """Return the process-wide analytics pipeline; it discards events if the sink cannot be set up."""
+    global _pipeline
+    if _pipeline is None:
+        try:
+            sink = create_sink()
+        except ImportError as e:
+            logger.warning("analytics_sink_unavailable", sink=ANALYTICS_SINK, error=str(e))
+            sink = None
+        _pipeline = AnalyticsPipeline(sink)
+    return _pipeline
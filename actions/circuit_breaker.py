@@ -0,0 +1,175 @@
+# Circuit breakers and adaptive timeouts for the prediction API endpoints.
+#
+# Each backend endpoint (predict, predict_with_report, download, ...) gets its own
+# breaker. After repeated failures or latency spikes the breaker opens and
+# calls fail immediately with CircuitOpenError, so the actions can serve the
+# local fallback without waiting out a timeout. Once the reset period has
+# passed a single half-open probe is let through to check for recovery.
+
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Text
+
+from .http_client import APIConnectionError, APIResponse
+from .metrics import observe_http
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Breaker configuration (overridable through the environment)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", "3"))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", "2"))
+SLOW_CALL_FACTOR = float(os.getenv("CIRCUIT_SLOW_CALL_FACTOR", "2"))
+LATENCY_WINDOW_SIZE = 200
+LATENCY_MIN_SAMPLES = 20
+
+# Upper bound on the timeout of each endpoint (the previous fixed timeouts)
+ENDPOINT_MAX_TIMEOUTS = {
+    "predict": 30.0,
+    "predict_with_report": 60.0,
+    "render_report": 60.0,
+    "download": 30.0,
+    "predict_batch": 120.0,
+    # Micro-batches of chat turns: a turn waits no longer than for /predict
+    "predict_micro_batch": 30.0,
+}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(APIConnectionError):
+    """Raised instead of calling an endpoint whose breaker is open."""
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies used to size timeouts."""
+
+    def __init__(self, max_timeout: float, window_size: int = LATENCY_WINDOW_SIZE):
+        self.max_timeout = max_timeout
+        self._samples: Deque[float] = deque(maxlen=window_size)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self) -> float:
+        """Timeout for the next call: a multiple of observed p99, capped at the endpoint maximum."""
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return self.max_timeout
+        return max(ADAPTIVE_TIMEOUT_MIN, min(self.max_timeout, p99 * ADAPTIVE_TIMEOUT_MULTIPLIER))
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: Text,
+        max_timeout: float,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency = LatencyTracker(max_timeout)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probe_in_flight = False
+
+    def _before_call(self) -> None:
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit for '{self.name}' is open")
+            self.state = HALF_OPEN
+            logger.info("circuit_half_open", circuit=self.name)
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError(f"Circuit for '{self.name}' is half-open and already probing")
+            self._probe_in_flight = True
+
+    def _record_success(self, seconds: float) -> None:
+        p99 = self.latency.percentile(0.99)
+        self.latency.record(seconds)
+        if p99 is not None and seconds > p99 * SLOW_CALL_FACTOR:
+            # A latency spike counts towards tripping even though the call succeeded
+            logger.warning("slow_call", circuit=self.name, seconds=round(seconds, 2), p99=round(p99, 2))
+            self._record_failure()
+            return
+        if self.state != CLOSED:
+            logger.info("circuit_closed", circuit=self.name)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def _record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+                logger.error("circuit_opened", circuit=self.name, failures=self.consecutive_failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    async def call(self, request: Callable[[float], Awaitable[APIResponse]]) -> APIResponse:
+        """Run `request(timeout)` under the breaker.
+
+        Transport errors, timeouts and 5xx responses count as failures; any
+        other response counts as a success and is returned as-is.
+        """
+        self._before_call()
+        started = time.monotonic()
+        try:
+            response = await request(self.latency.timeout())
+        except APIConnectionError:
+            observe_http(self.name, "error", time.monotonic() - started)
+            self._record_failure()
+            raise
+        except BaseException:
+            # Cancellation or a bug in the caller says nothing about the endpoint
+            self._probe_in_flight = False
+            raise
+        observe_http(self.name, str(response.status_code), time.monotonic() - started)
+        if response.status_code >= 500:
+            self._record_failure()
+        else:
+            self._record_success(time.monotonic() - started)
+        return response
+
+    def snapshot(self) -> Dict[Text, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "timeout": self.latency.timeout(),
+            "p99": self.latency.percentile(0.99),
+        }
+
+
+_breakers: Dict[Text, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(name: Text) -> CircuitBreaker:
+    """Return the process-wide breaker for an endpoint, creating it on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(name, ENDPOINT_MAX_TIMEOUTS.get(name, 30.0))
+        _breakers[name] = breaker
+    return breaker
+
+
+def circuit_breakers() -> Dict[Text, CircuitBreaker]:
+    return dict(_breakers)
@@ -0,0 +1,412 @@
+# Multi-worker action server.
+#
+# Starts N action server processes (actions.server) on consecutive ports and
+# a small balancer on the public action port. Action calls from Rasa are
+# routed by sender ID with rendezvous hashing, so a conversation keeps
+# hitting the same worker (and its in-process prediction and LLM caches)
+# and only the conversations of a worker that leaves are moved elsewhere.
+# Workers that fail their health checks are taken out of rotation until they
+# answer again, and workers that exit are restarted. Request bodies other than
+# action calls, such as a CSV posted to /batch/score, are streamed through to
+# the worker rather than read into the balancer's memory.
+#
+# SIGHUP restarts the workers one at a time: a worker stops receiving new
+# calls, finishes the ones in flight, and is replaced by a fresh process.
+# SIGTERM/SIGINT drain all workers and stop.
+#
+# Usage:
+#   python -m actions.cluster --workers 4 --port 5055
+#   kill -HUP <pid>   # rolling restart, e.g. after deploying new action code
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Text
+
+import aiohttp
+from aiohttp import web
+
+from .live_updates import LIVE_KEEPALIVE_INTERVAL
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Cluster configuration (overridable through the environment)
+ACTIONS_WORKERS = int(os.getenv("ACTIONS_WORKERS", str(os.cpu_count() or 1)))
+ACTIONS_HEALTH_INTERVAL = float(os.getenv("ACTIONS_HEALTH_INTERVAL", "2"))
+ACTIONS_EJECT_AFTER = int(os.getenv("ACTIONS_EJECT_AFTER", "2"))
+ACTIONS_DRAIN_TIMEOUT = float(os.getenv("ACTIONS_DRAIN_TIMEOUT", "30"))
+ACTIONS_START_TIMEOUT = float(os.getenv("ACTIONS_START_TIMEOUT", "60"))
+ACTIONS_PROXY_TIMEOUT = float(os.getenv("ACTIONS_PROXY_TIMEOUT", "180"))
+# Largest action call (POST /webhook) read whole to find its sender
+ACTIONS_PROXY_MAX_BODY = int(os.getenv("ACTIONS_PROXY_MAX_BODY", str(32 * 1024 ** 2)))
+
+# Rasa puts sender_id right after next_action, so it is found without parsing the tracker
+_SENDER_ID = re.compile(rb'"sender_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_SENDER_ID_SCAN_BYTES = 2048
+# Report job ids name the worker that renders them (see report_jobs.py). Only
+# that worker knows a job still rendering; a finished one any worker serves
+# from the shared report store, so the others are tried after it.
+_REPORT_JOB_OWNER = re.compile(r"^/download_report/w(\d+)-")
+# Live update streams go to the worker that runs the sender's actions
+_LIVE_SENDER = re.compile(r"^/live/(.+)$")
+# A live stream stays open between turns, so it has no overall limit; the
+# worker's keep-alive comments bound how long it may go quiet
+_LIVE_STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_read=2 * LIVE_KEEPALIVE_INTERVAL)
+_HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length", "content-encoding", "host"}
+_BODY_CHUNK_SIZE = 64 * 1024
+
+
+def sender_id_of(body: bytes) -> Optional[Text]:
+    """The sender_id of an action call body, if it has one."""
+    match = _SENDER_ID.search(body, 0, _SENDER_ID_SCAN_BYTES)
+    if match:
+        return json.loads(b'"' + match.group(1) + b'"')
+    try:
+        return json.loads(body).get("sender_id")
+    except (ValueError, AttributeError):
+        return None
+
+
+class Worker:
+    """One action server process and its routing state."""
+
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.process: Optional[subprocess.Popen] = None
+        self.healthy = False
+        self.draining = False
+        self.failures = 0
+        self.in_flight = 0
+        self.restarts = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.draining
+
+    def start(self, args: List[Text]) -> None:
+        env = dict(os.environ, ACTIONS_WORKER_ID=str(self.index))
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "actions.server", "--port", str(self.port), *args], env=env
+        )
+        self.healthy = False
+        self.failures = 0
+        logger.info("worker_started", worker=self.index, pid=self.process.pid, port=self.port)
+
+    def exited(self) -> bool:
+        return self.process is None or self.process.poll() is not None
+
+    def acquire(self) -> None:
+        self.in_flight += 1
+        self._idle.clear()
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def rank(self, sender_id: Text) -> bytes:
+        return hashlib.md5(f"{self.index}:{sender_id}".encode("utf-8")).digest()
+
+    def snapshot(self) -> Dict[Text, object]:
+        return {
+            "worker": self.index,
+            "port": self.port,
+            "pid": self.process.pid if self.process else None,
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "in_flight": self.in_flight,
+            "restarts": self.restarts,
+        }
+
+
+def merge_metrics(texts: Dict[int, Text]) -> Text:
+    """Combine the Prometheus text of several workers, adding a `worker` label to every sample."""
+    families: Dict[Text, List[Text]] = {}
+    for worker, text in texts.items():
+        label = f'worker="{worker}"'
+        lines: List[Text] = []
+        new_family = True
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                name = line.split(" ", 3)[2]
+                new_family = name not in families
+                lines = families.setdefault(name, [line])
+            elif line.startswith("#"):
+                if new_family:
+                    lines.append(line)
+            elif line:
+                name, _, rest = line.partition(" ")
+                if "{" in name:
+                    lines.append(f"{name.replace('{', '{' + label + ',', 1)} {rest}")
+                else:
+                    lines.append(f"{name}{{{label}}} {rest}")
+    return "\n".join(line for lines in families.values() for line in lines) + "\n"
+
+
+class ActionCluster:
+    """Supervises the worker processes and balances requests across them."""
+
+    def __init__(self, workers: int, base_port: int, server_args: List[Text]):
+        self.workers = [Worker(index, base_port + index) for index in range(workers)]
+        self.server_args = server_args
+        self.stopping = False
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._restart_lock = asyncio.Lock()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=ACTIONS_PROXY_TIMEOUT),
+                connector=aiohttp.TCPConnector(limit=0, keepalive_timeout=30),
+            )
+        return self._session
+
+    async def start(self) -> None:
+        for worker in self.workers:
+            worker.start(self.server_args)
+        await asyncio.gather(*(self._wait_healthy(worker) for worker in self.workers))
+
+    def candidates(self, sender_id: Optional[Text], owner: Optional[int] = None) -> List[Worker]:
+        """Available workers in the order a request should try them."""
+        available = [worker for worker in self.workers if worker.available]
+        if owner is not None:
+            first = [worker for worker in self.workers if worker.index == owner and worker.healthy]
+            return first + sorted((worker for worker in available if worker.index != owner), key=lambda worker: worker.in_flight)
+        if sender_id is None:
+            return sorted(available, key=lambda worker: worker.in_flight)
+        return sorted(available, key=lambda worker: worker.rank(sender_id), reverse=True)
+
+    # -- health and supervision -------------------------------------------
+
+    async def _check(self, worker: Worker) -> bool:
+        try:
+            async with self.session.get(f"{worker.url}/health", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def _wait_healthy(self, worker: Worker) -> bool:
+        deadline = time.monotonic() + ACTIONS_START_TIMEOUT
+        while time.monotonic() < deadline and not worker.exited():
+            if await self._check(worker):
+                worker.healthy = True
+                worker.failures = 0
+                return True
+            await asyncio.sleep(0.25)
+        logger.error("worker_unhealthy", worker=worker.index)
+        return False
+
+    async def monitor(self) -> None:
+        """Eject workers that fail health checks and restart workers that exited."""
+        while not self.stopping:
+            await asyncio.sleep(ACTIONS_HEALTH_INTERVAL)
+            for worker in self.workers:
+                if worker.draining or self.stopping:
+                    continue
+                if worker.exited():
+                    logger.warning("worker_exited", worker=worker.index)
+                    worker.healthy = False
+                    worker.restarts += 1
+                    worker.start(self.server_args)
+                    continue
+                if await self._check(worker):
+                    if not worker.healthy:
+                        logger.info("worker_recovered", worker=worker.index)
+                    worker.healthy = True
+                    worker.failures = 0
+                else:
+                    worker.failures += 1
+                    if worker.healthy and worker.failures >= ACTIONS_EJECT_AFTER:
+                        logger.warning("worker_ejected", worker=worker.index, failed_checks=worker.failures)
+                        worker.healthy = False
+
+    async def _drain(self, worker: Worker) -> None:
+        worker.draining = True
+        if not await worker.wait_idle(ACTIONS_DRAIN_TIMEOUT):
+            logger.warning("worker_drain_timeout", worker=worker.index, in_flight=worker.in_flight, timeout=ACTIONS_DRAIN_TIMEOUT)
+        if not worker.exited():
+            worker.process.terminate()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, worker.process.wait, ACTIONS_DRAIN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+        worker.healthy = False
+
+    async def rolling_restart(self) -> None:
+        """Replace the workers one at a time without dropping calls."""
+        async with self._restart_lock:
+            logger.info("cluster_rolling_restart")
+            for worker in self.workers:
+                if self.stopping:
+                    return
+                await self._drain(worker)
+                worker.restarts += 1
+                worker.start(self.server_args)
+                await self._wait_healthy(worker)
+                worker.draining = False
+
+    async def stop(self) -> None:
+        self.stopping = True
+        await asyncio.gather(*(self._drain(worker) for worker in self.workers))
+        if self._session is not None:
+            await self._session.close()
+
+    # -- request handling -------------------------------------------------
+
+    async def proxy(self, request: web.Request) -> web.StreamResponse:
+        body: Optional[bytes] = None
+        sender_id = None
+        if request.path == "/webhook":
+            # Action calls are small JSON documents, read whole to route them by sender
+            body = await request.read()
+            sender_id = sender_id_of(body)
+        live = _LIVE_SENDER.match(request.path)
+        if live:
+            sender_id = live.group(1)
+        timeout = _LIVE_STREAM_TIMEOUT if live else self.session.timeout
+        job_owner = _REPORT_JOB_OWNER.match(request.path)
+        headers = {key: value for key, value in request.headers.items() if key.lower() not in _HOP_BY_HOP_HEADERS}
+
+        for worker in self.candidates(sender_id, int(job_owner.group(1)) if job_owner else None):
+            # A subscribed stream is not work in flight: it would skew balancing and hold up draining
+            if not live:
+                worker.acquire()
+            response: Optional[web.StreamResponse] = None
+            if body is None and request.body_exists:
+                # Nothing is read before the connection is made, so a refusing worker can pass the body on
+                data: Any = request.content.iter_chunked(_BODY_CHUNK_SIZE)
+            else:
+                data = body
+            try:
+                async with self.session.request(
+                    request.method, f"{worker.url}{request.rel_url}", data=data, headers=headers,
+                    allow_redirects=False, timeout=timeout,
+                ) as upstream:
+                    response = web.StreamResponse(
+                        status=upstream.status,
+                        headers={k: v for k, v in upstream.headers.items() if k.lower() not in _HOP_BY_HOP_HEADERS},
+                    )
+                    await response.prepare(request)
+                    try:
+                        async for chunk in upstream.content.iter_any():
+                            await response.write(chunk)
+                        await response.write_eof()
+                    except ConnectionResetError:
+                        pass  # the client left; every live stream ends this way
+                    return response
+            except aiohttp.ClientConnectorError:
+                # Nothing was delivered, so the next worker can take the call
+                logger.warning("worker_refused_connection", worker=worker.index)
+                worker.failures += 1
+                worker.healthy = False
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # The call may have run, so it is not repeated on another worker
+                logger.warning("worker_request_failed", worker=worker.index, path=request.path, error=str(e) or type(e).__name__)
+                if response is not None and response.prepared:
+                    # Part of the answer is out: cut the connection so it is not taken as complete
+                    if request.transport is not None:
+                        request.transport.close()
+                    return response
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                return web.json_response(
+                    {"error": "The action worker did not answer in time" if timed_out else "The action worker failed"},
+                    status=504 if timed_out else 502,
+                )
+            finally:
+                if not live:
+                    worker.release()
+        return web.json_response({"error": "No action worker available"}, status=503)
+
+    async def health(self, request: web.Request) -> web.Response:
+        workers = [worker.snapshot() for worker in self.workers]
+        status = 200 if any(worker.available for worker in self.workers) else 503
+        return web.json_response({"status": "ok" if status == 200 else "unavailable", "workers": workers}, status=status)
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        async def scrape(worker: Worker) -> Optional[Text]:
+            try:
+                async with self.session.get(f"{worker.url}/metrics", timeout=aiohttp.ClientTimeout(total=5)) as response:
+                    return await response.text() if response.status == 200 else None
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return None
+
+        workers = [worker for worker in self.workers if worker.healthy]
+        texts = await asyncio.gather(*(scrape(worker) for worker in workers))
+        scraped = {worker.index: text for worker, text in zip(workers, texts) if text is not None}
+        if not scraped:
+            return web.Response(text="No worker metrics available", status=503)
+        return web.Response(text=merge_metrics(scraped), content_type="text/plain", charset="utf-8")
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=ACTIONS_PROXY_MAX_BODY)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_route("*", "/{tail:.*}", self.proxy)
+        return app
+
+
+async def serve(args: argparse.Namespace, server_args: List[Text]) -> None:
+    cluster = ActionCluster(args.workers, args.worker_base_port or args.port + 1, server_args)
+    await cluster.start()
+
+    runner = web.AppRunner(cluster.create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    logger.info("cluster_started", workers=args.workers, url=f"http://{args.host}:{args.port}")
+
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(cluster.rolling_restart()))
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopped.set)
+
+    monitor = asyncio.ensure_future(cluster.monitor())
+    await stopped.wait()
+    logger.info("cluster_draining")
+    monitor.cancel()
+    await runner.cleanup()  # stops accepting calls and waits for the ones in flight
+    await cluster.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run several SweatHog action servers behind a sticky balancer")
+    parser.add_argument("--workers", type=int, default=ACTIONS_WORKERS, help="Action server processes to run")
+    parser.add_argument("--port", type=int, default=int(os.getenv("ACTIONS_PORT", "5055")))
+    parser.add_argument("--host", default=os.getenv("SANIC_HOST", "0.0.0.0"))
+    parser.add_argument("--worker-base-port", type=int, help="Port of the first worker (default: --port + 1)")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    args, server_args = parser.parse_known_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s - %(message)s",
+    )
+    if args.debug:
+        server_args.append("--debug")
+    asyncio.run(serve(args, server_args))
+
+
+if __name__ == "__main__":
+    main()
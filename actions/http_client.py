@@ -0,0 +1,201 @@
+# Shared asynchronous HTTP client used by the custom actions.
+#
+# Every action that talks to the prediction API goes through the single
+# pooled client returned by get_api_client(), so connections to
+# API_BASE_URL are kept alive and reused across turns instead of being
+# opened and torn down on every request.
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Dict, Optional, Text
+
+import aiohttp
+from multidict import CIMultiDict
+
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Connection pool configuration (overridable through the environment)
+HTTP_POOL_SIZE = int(os.getenv("ACTIONS_HTTP_POOL_SIZE", "100"))
+HTTP_POOL_PER_HOST = int(os.getenv("ACTIONS_HTTP_POOL_PER_HOST", "32"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("ACTIONS_HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("ACTIONS_HTTP_CONNECT_TIMEOUT", "5"))
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+class APIConnectionError(Exception):
+    """Raised when an API endpoint cannot be reached or does not answer in time."""
+
+
+class APIStatusError(APIConnectionError):
+    """Raised when an API endpoint answers with an unexpected status code."""
+
+    def __init__(self, status_code: int, body: Text = ""):
+        super().__init__(f"API request failed with status {status_code}: {body[:500]}")
+        self.status_code = status_code
+        self.body = body
+
+
+class APIResponse:
+    """Fully read HTTP response, shaped like the parts of `requests.Response` the actions use."""
+
+    __slots__ = ("status_code", "headers", "content")
+
+    def __init__(self, status_code: int, headers: CIMultiDict, content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self) -> Text:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class APIClient:
+    """Keep-alive connection pool shared by all actions in this process.
+
+    The underlying `aiohttp.ClientSession` is created lazily on first use so
+    that it is bound to the event loop of the action server, and re-created if
+    the loop changes (e.g. in a new worker process).
+    """
+
+    def __init__(
+        self,
+        pool_size: int = HTTP_POOL_SIZE,
+        per_host_limit: int = HTTP_POOL_PER_HOST,
+        keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+    ):
+        self.pool_size = pool_size
+        self.per_host_limit = per_host_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.per_host_limit,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._loop = loop
+            logger.info("http_pool_created", size=self.pool_size, per_host=self.per_host_limit)
+        return self._session
+
+    async def request(
+        self,
+        method: Text,
+        url: Text,
+        timeout: float,
+        json_body: Optional[Any] = None,
+        headers: Optional[Dict[Text, Text]] = None,
+    ) -> APIResponse:
+        """Send a request and read the whole body, raising APIConnectionError on transport failures."""
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout, connect=min(self.connect_timeout, timeout))
+        try:
+            async with session.request(
+                method, url, json=json_body, headers=headers, timeout=client_timeout
+            ) as response:
+                content = await response.read()
+                return APIResponse(response.status, CIMultiDict(response.headers), content)
+        except asyncio.TimeoutError as e:
+            raise APIConnectionError(f"{method} {url} timed out after {timeout}s") from e
+        except aiohttp.ClientError as e:
+            raise APIConnectionError(f"{method} {url} failed: {e}") from e
+
+    async def request_to_file(
+        self,
+        method: Text,
+        url: Text,
+        path: Text,
+        timeout: float,
+        json_body: Optional[Any] = None,
+        content_type: Text = "application/pdf",
+    ) -> APIResponse:
+        """Send a request and write a successful `content_type` body to `path` as it arrives.
+
+        The returned response has an empty `content` when the body went to the
+        file; any other response (errors, JSON) is read into memory as usual.
+        """
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout, connect=min(self.connect_timeout, timeout))
+        loop = asyncio.get_running_loop()
+        try:
+            async with session.request(method, url, json=json_body, timeout=client_timeout) as response:
+                headers = CIMultiDict(response.headers)
+                if response.status != 200 or content_type not in headers.get("Content-Type", ""):
+                    return APIResponse(response.status, headers, await response.read())
+                with open(path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(FILE_CHUNK_SIZE):
+                        await loop.run_in_executor(None, f.write, chunk)
+                return APIResponse(response.status, headers, b"")
+        except asyncio.TimeoutError as e:
+            raise APIConnectionError(f"{method} {url} timed out after {timeout}s") from e
+        except aiohttp.ClientError as e:
+            raise APIConnectionError(f"{method} {url} failed: {e}") from e
+
+    async def stream_lines(
+        self, url: Text, payload: Any, timeout: Optional[float] = None
+    ) -> AsyncIterator[bytes]:
+        """POST `payload` and yield the response body line by line as it arrives.
+
+        Only connecting is bounded by the pool's connect timeout unless `timeout`
+        is given; callers streaming long responses enforce their own deadline.
+        """
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout, connect=self.connect_timeout)
+        try:
+            async with session.post(url, json=payload, timeout=client_timeout) as response:
+                if response.status != 200:
+                    body = await response.read()
+                    raise APIStatusError(response.status, body.decode("utf-8", errors="replace"))
+                async for line in response.content:
+                    if line.strip():
+                        yield line
+        except asyncio.TimeoutError as e:
+            raise APIConnectionError(f"POST {url} timed out after {timeout}s") from e
+        except aiohttp.ClientError as e:
+            raise APIConnectionError(f"POST {url} failed: {e}") from e
+
+    async def post_json(self, url: Text, payload: Any, timeout: float) -> APIResponse:
+        return await self.request(
+            "POST", url, timeout, json_body=payload, headers={"Content-Type": "application/json"}
+        )
+
+    async def get(self, url: Text, timeout: float) -> APIResponse:
+        return await self.request("GET", url, timeout)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+_api_client: Optional[APIClient] = None
+
+
+def get_api_client() -> APIClient:
+    """Return the process-wide API client, creating it on first use."""
+    global _api_client
+    if _api_client is None:
+        _api_client = APIClient()
+    return _api_client
+
+
+async def close_api_client() -> None:
+    """Close the shared client's connection pool (call on server shutdown)."""
+    if _api_client is not None:
+        await _api_client.close()
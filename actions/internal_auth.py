@@ -0,0 +1,47 @@
+# Authentication of the action server's internal routes.
+#
+# The action server has to be reachable by browsers for report downloads, so
+# routes meant for the project's own services (batch scoring, the live
+# updates the Rasa server subscribes to) require a shared secret:
+#
+#   Authorization: Bearer <ACTIONS_INTERNAL_TOKEN>
+#
+# Without ACTIONS_INTERNAL_TOKEN these routes are disabled (403).
+
+import functools
+import hmac
+import os
+from typing import Any, Awaitable, Callable, Dict, Text
+
+from sanic import response
+from sanic.request import Request
+
+
+# Internal route configuration (overridable through the environment)
+ACTIONS_INTERNAL_TOKEN = os.getenv("ACTIONS_INTERNAL_TOKEN", "")
+
+
+def internal_headers() -> Dict[Text, Text]:
+    """Headers that authenticate a call to an internal route."""
+    return {"Authorization": f"Bearer {ACTIONS_INTERNAL_TOKEN}"} if ACTIONS_INTERNAL_TOKEN else {}
+
+
+def is_authorized(request: Request) -> bool:
+    if not ACTIONS_INTERNAL_TOKEN:
+        return False
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(credentials.encode(), ACTIONS_INTERNAL_TOKEN.encode())
+
+
+def internal_only(handler: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Route decorator rejecting calls without the internal token."""
+
+    @functools.wraps(handler)
+    async def guarded(request: Request, *args: Any, **kwargs: Any) -> Any:
+        if not ACTIONS_INTERNAL_TOKEN:
+            return response.json({"error": "This route is disabled; set ACTIONS_INTERNAL_TOKEN to enable it"}, status=403)
+        if not is_authorized(request):
+            return response.json({"error": "Unauthorized"}, status=401, headers={"WWW-Authenticate": "Bearer"})
+        return await handler(request, *args, **kwargs)
+
+    return guarded
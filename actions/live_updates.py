@@ -0,0 +1,129 @@
+# Live updates of a running action, for streaming chat clients.
+#
+# Rasa only receives an action's messages when the action returns, so a
+# turn that calls the prediction API or the LLM shows nothing until it is
+# over. While a client is subscribed to its sender ID (GET /live/<sender_id>
+# on the action server, which the streaming REST channel in
+# addons/live_stream.py does for the duration of a turn), actions decorated
+# with @live_messages publish every dispatcher.utter_message the moment it is
+# called, and the LLM fallback publishes its reply token by token. Rasa
+# still delivers the same messages at the end of the turn; the channel
+# drops those it has already sent.
+#
+# Without a subscriber, publishing is a dictionary lookup. A subscriber that
+# does not keep up loses events (counted) rather than slowing the action.
+
+import asyncio
+import functools
+import json
+import os
+import uuid
+from typing import Any, Callable, Dict, Optional, Set, Text, Type
+
+
+# Live update configuration (overridable through the environment)
+LIVE_QUEUE_MAX = int(os.getenv("LIVE_QUEUE_MAX", "256"))
+LIVE_KEEPALIVE_INTERVAL = float(os.getenv("LIVE_KEEPALIVE_INTERVAL", "15"))
+
+# Fields of a dispatcher message that make up a bot message in a REST response
+MESSAGE_FIELDS = ("text", "image", "attachment", "buttons", "custom")
+
+
+class LiveUpdates:
+    """Per-sender fan-out of events to the subscribed streams."""
+
+    def __init__(self, queue_max: int = LIVE_QUEUE_MAX):
+        self.queue_max = queue_max
+        self._subscribers: Dict[Text, Set[asyncio.Queue]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, sender_id: Text) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_max)
+        self._subscribers.setdefault(sender_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, sender_id: Text, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(sender_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[sender_id]
+
+    def has_subscribers(self, sender_id: Optional[Text]) -> bool:
+        return sender_id in self._subscribers
+
+    def publish(self, sender_id: Optional[Text], event: Dict[Text, Any]) -> None:
+        for queue in self._subscribers.get(sender_id, ()):
+            try:
+                queue.put_nowait(event)
+                self.published += 1
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def stats(self) -> Dict[Text, Any]:
+        return {
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+_live_updates: Optional[LiveUpdates] = None
+
+
+def get_live_updates() -> LiveUpdates:
+    """Return the process-wide live update hub, creating it on first use."""
+    global _live_updates
+    if _live_updates is None:
+        _live_updates = LiveUpdates()
+    return _live_updates
+
+
+def message_event(message: Dict[Text, Any]) -> Optional[Dict[Text, Any]]:
+    """The live event of a dispatcher message; None for messages only Rasa can render (responses)."""
+    if message.get("response") or message.get("template"):
+        return None
+    fields = {field: message[field] for field in MESSAGE_FIELDS if message.get(field)}
+    return {"event": "message", **fields} if fields else None
+
+
+def token_publisher(sender_id: Optional[Text]) -> Optional[Callable[[Text], None]]:
+    """A callback publishing LLM reply pieces for `sender_id`, or None if nobody is listening."""
+    live_updates = get_live_updates()
+    if not live_updates.has_subscribers(sender_id):
+        return None
+    stream_id = uuid.uuid4().hex[:12]
+
+    def publish(text: Text) -> None:
+        live_updates.publish(sender_id, {"event": "token", "stream_id": stream_id, "text": text})
+
+    return publish
+
+
+def live_messages(cls: Type) -> Type:
+    """Class decorator publishing a custom action's messages as they are uttered."""
+    run = vars(cls)["run"]
+
+    @functools.wraps(run)
+    async def live_run(self, dispatcher, tracker, domain):
+        live_updates = get_live_updates()
+        sender_id = tracker.sender_id
+        if live_updates.has_subscribers(sender_id):
+            utter_message = dispatcher.utter_message
+
+            def publishing_utter_message(*args, **kwargs):
+                utter_message(*args, **kwargs)
+                event = message_event(dispatcher.messages[-1])
+                if event is not None:
+                    live_updates.publish(sender_id, event)
+
+            dispatcher.utter_message = publishing_utter_message
+        return await run(self, dispatcher, tracker, domain)
+
+    cls.run = live_run
+    return cls
+
+
+def sse_event(event: Dict[Text, Any]) -> Text:
+    return f"data: {json.dumps(event)}\n\n"
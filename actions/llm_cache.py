@@ -0,0 +1,228 @@
+# Response cache for the LLM fallback.
+#
+# Out-of-scope messages are mostly the same handful of chit-chat questions.
+# Replies are stored under the normalized user text and found again either
+# by exact match or, when the spaCy word vectors are available, by cosine
+# similarity to a previously answered question. Averaged word vectors barely
+# move when one word changes ("can I take insulin" / "can I stop insulin"),
+# so a similar question must also share its content words with the cached
+# one. Lookups are in-process and take well under a millisecond, so repeated
+# questions skip generation.
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Text
+
+import numpy as np
+
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Cache configuration (overridable through the environment)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0.95"))
+LLM_CACHE_MIN_OVERLAP = float(os.getenv("LLM_CACHE_MIN_OVERLAP", "0.8"))
+LLM_CACHE_SPACY_MODEL = os.getenv("LLM_CACHE_SPACY_MODEL", "en_core_web_md")
+
+_NON_WORD = re.compile(r"[^\w\s']+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: Text) -> Text:
+    """Lower-case `text` and drop punctuation and repeated whitespace."""
+    return _WHITESPACE.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+
+class _Entry(NamedTuple):
+    reply: Text
+    expires_at: float
+    row: Optional[int]  # row in the vector matrix, None if the text has no vector
+    words: FrozenSet[Text]  # content words of the question
+
+
+class LLMResponseCache:
+    """LRU cache of LLM replies with exact and vector-similarity lookup.
+
+    Word vectors come from the spaCy model named by LLM_CACHE_SPACY_MODEL,
+    which is loaded in the background on first use; until it is ready, or if
+    spaCy is not installed, only exact matches are served.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl: float = LLM_CACHE_TTL,
+        similarity_threshold: float = LLM_CACHE_SIMILARITY,
+        min_overlap: float = LLM_CACHE_MIN_OVERLAP,
+        spacy_model: Text = LLM_CACHE_SPACY_MODEL,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.min_overlap = min_overlap
+        self.spacy_model = spacy_model
+        self._entries: "OrderedDict[Text, _Entry]" = OrderedDict()
+
+        self._nlp: Any = None
+        self._vectors_unavailable = False
+        self._loading: Optional[asyncio.Future] = None
+        self._matrix: Optional[np.ndarray] = None  # unit vectors, one row per cached text
+        self._row_keys: List[Optional[Text]] = []
+        self._free_rows: List[int] = []
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+
+    @staticmethod
+    def _key(normalized: Text) -> Text:
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def _ensure_vectors(self) -> bool:
+        """Return True if word vectors are loaded, starting the load if needed."""
+        if self._nlp is not None:
+            return True
+        if self._vectors_unavailable or self._loading is not None:
+            return False
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._loading = loop.run_in_executor(None, self._load_vectors)
+        return False
+
+    def warm_up(self) -> None:
+        """Start loading the word vectors in the background."""
+        self._ensure_vectors()
+
+    def _load_vectors(self) -> None:
+        try:
+            import spacy
+
+            # Only the tokenizer and static vectors are needed
+            nlp = spacy.load(self.spacy_model, exclude=["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner", "senter"])
+            if not nlp.vocab.vectors.shape[0]:
+                raise ValueError(f"{self.spacy_model} has no word vectors")
+        except (ImportError, OSError, ValueError) as e:
+            logger.warning("llm_cache_similarity_disabled", error=str(e))
+            self._vectors_unavailable = True
+            return
+        self._matrix = np.zeros((self.max_entries, nlp.vocab.vectors.shape[1]), dtype=np.float32)
+        self._row_keys = [None] * self.max_entries
+        self._free_rows = list(range(self.max_entries - 1, -1, -1))
+        self._nlp = nlp
+        logger.info("llm_cache_vectors_loaded", model=self.spacy_model)
+
+    def _content_words(self, normalized: Text) -> FrozenSet[Text]:
+        stop_words = self._nlp.Defaults.stop_words if self._nlp is not None else ()
+        return frozenset(word for word in normalized.split() if word not in stop_words)
+
+    def _overlap(self, words: FrozenSet[Text], other: FrozenSet[Text]) -> float:
+        """Jaccard overlap of two sets of content words (1.0 when both are empty)."""
+        union = words | other
+        return len(words & other) / len(union) if union else 1.0
+
+    def _vector(self, normalized: Text) -> Optional[np.ndarray]:
+        vector = self._nlp.make_doc(normalized).vector
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def get(self, text: Text) -> Optional[Text]:
+        """Return a cached reply for `text` or a sufficiently similar question."""
+        started = time.perf_counter()
+        try:
+            normalized = normalize_text(text)
+            key = self._key(normalized)
+            entry = self._live_entry(key)
+            if entry is not None:
+                self.exact_hits += 1
+                return entry.reply
+
+            if normalized and self._ensure_vectors():
+                vector = self._vector(normalized)
+                if vector is not None:
+                    similarities = self._matrix @ vector
+                    row = int(np.argmax(similarities))
+                    similar_key = self._row_keys[row]
+                    if similarities[row] >= self.similarity_threshold and similar_key is not None:
+                        entry = self._live_entry(similar_key)
+                        if entry is not None and self._overlap(
+                            self._content_words(normalized), entry.words
+                        ) >= self.min_overlap:
+                            self.semantic_hits += 1
+                            return entry.reply
+
+            self.misses += 1
+            return None
+        finally:
+            self.lookup_seconds += time.perf_counter() - started
+
+    def set(self, text: Text, reply: Text) -> None:
+        normalized = normalize_text(text)
+        if not normalized:
+            return
+        key = self._key(normalized)
+        self._remove(key)
+        while len(self._entries) >= self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+        row = None
+        words: FrozenSet[Text] = frozenset()
+        if self._ensure_vectors():
+            words = self._content_words(normalized)
+            vector = self._vector(normalized)
+            if vector is not None:
+                row = self._free_rows.pop()
+                self._matrix[row] = vector
+                self._row_keys[row] = key
+        self._entries[key] = _Entry(reply, time.monotonic() + self.ttl, row, words)
+
+    def _live_entry(self, key: Text) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: Text) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.row is not None:
+            self._matrix[entry.row] = 0.0
+            self._row_keys[entry.row] = None
+            self._free_rows.append(entry.row)
+
+    def stats(self) -> Dict[Text, Any]:
+        """Hit rate and lookup cost since start-up."""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "vectors_loaded": self._nlp is not None,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "mean_lookup_ms": 1000.0 * self.lookup_seconds / lookups if lookups else 0.0,
+        }
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Return the process-wide LLM response cache, or None if it is disabled."""
+    global _llm_cache
+    if _llm_cache is None and LLM_CACHE_ENABLED and LLM_CACHE_MAX_ENTRIES > 0:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
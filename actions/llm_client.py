@@ -0,0 +1,179 @@
+# Streaming client for the local Ollama server used by the LLM fallback.
+#
+# Talks to Ollama's HTTP chat API through the shared connection pool instead
+# of the blocking `ollama` package. Generation is streamed token by token,
+# the number of concurrent generations is capped by an admission gate (extra
+# requests wait in a bounded queue) and every reply is held to a latency
+# budget, so a slow or overloaded model degrades to a shorter answer or the
+# canned responses instead of stalling the action server.
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Text
+
+from .admission import AdmissionGate, Overloaded
+from .http_client import APIConnectionError, get_api_client
+from .metrics import observe_llm
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Ollama configuration (overridable through the environment)
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:1b")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "96"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "8"))
+LLM_LATENCY_BUDGET = float(os.getenv("LLM_LATENCY_BUDGET", "8"))
+
+_SENTENCE_END = re.compile(r"[.!?](?=\s|$)")
+
+
+class LLMBusyError(Overloaded):
+    """Raised when the generation queue is full."""
+
+
+class LLMReply(NamedTuple):
+    text: Optional[Text]  # None if nothing usable arrived in time
+    finished: bool  # False if the latency budget cut the reply short
+
+
+def _base_url(host: Text) -> Text:
+    # OLLAMA_HOST is often set without a scheme (e.g. "0.0.0.0:11434")
+    if not host.startswith(("http://", "https://")):
+        host = f"http://{host}"
+    return host.rstrip("/")
+
+
+def truncate_to_sentence(text: Text) -> Text:
+    """Cut a partial reply back to its last complete sentence ("" if there is none)."""
+    ends = [match.end() for match in _SENTENCE_END.finditer(text)]
+    return text[:ends[-1]].strip() if ends else ""
+
+
+class OllamaClient:
+    """Long-lived client for Ollama's /api/chat endpoint.
+
+    At most `max_concurrency` generations run at once; up to `max_queue`
+    further requests wait for a slot and anything beyond that is rejected
+    with LLMBusyError.
+    """
+
+    def __init__(
+        self,
+        host: Text = OLLAMA_HOST,
+        model: Text = OLLAMA_MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+    ):
+        self.base_url = _base_url(host)
+        self.model = model
+        # Waiting for a slot counts against the latency budget of complete()
+        self._gate = AdmissionGate("llm", max_concurrency, max_queue)
+
+    def _chat_request(self, messages: List[Dict[Text, Text]]) -> Dict[Text, Any]:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {"num_predict": OLLAMA_NUM_PREDICT},
+        }
+
+    async def stream_chat(self, messages: List[Dict[Text, Text]]) -> AsyncIterator[Text]:
+        """Yield the reply to `messages` piece by piece as the model generates it."""
+        try:
+            await self._gate.acquire()
+        except Overloaded as e:
+            raise LLMBusyError(str(e))
+
+        try:
+            lines = get_api_client().stream_lines(f"{self.base_url}/api/chat", self._chat_request(messages))
+            async for line in lines:
+                try:
+                    chunk = json.loads(line)
+                except ValueError:
+                    raise APIConnectionError(f"Unexpected line from Ollama: {line[:200]!r}")
+                if "error" in chunk:
+                    raise APIConnectionError(f"Ollama error: {chunk['error']}")
+                content = chunk.get("message", {}).get("content", "")
+                if content:
+                    yield content
+                if chunk.get("done"):
+                    break
+        finally:
+            self._gate.release()
+
+    async def complete(
+        self,
+        messages: List[Dict[Text, Text]],
+        budget: float = LLM_LATENCY_BUDGET,
+        on_token: Optional[Callable[[Text], None]] = None,
+    ) -> LLMReply:
+        """Return the reply to `messages`, or as much of it as fits in `budget` seconds.
+
+        Time spent waiting for a generation slot counts against the budget. A
+        reply cut off by the budget is trimmed to its last complete sentence
+        and returned with `finished` False; its text is None if nothing usable
+        arrived in time. `on_token` is called with every piece of the reply
+        as it arrives.
+        """
+        parts: List[Text] = []
+        started = time.monotonic()
+        first_token: Optional[float] = None
+
+        async def consume() -> None:
+            nonlocal first_token
+            async for content in self.stream_chat(messages):
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                parts.append(content)
+                if on_token is not None:
+                    on_token(content)
+
+        try:
+            await asyncio.wait_for(consume(), timeout=budget)
+        except asyncio.TimeoutError:
+            partial = truncate_to_sentence("".join(parts))
+            observe_llm("partial" if partial else "timeout", time.monotonic() - started, first_token)
+            logger.warning("llm_budget_exceeded", budget=budget, chunks=len(parts), partial=bool(partial))
+            return LLMReply(partial or None, False)
+        except LLMBusyError:
+            observe_llm("busy", time.monotonic() - started)
+            raise
+        except APIConnectionError:
+            observe_llm("error", time.monotonic() - started, first_token)
+            raise
+        observe_llm("complete", time.monotonic() - started, first_token)
+        return LLMReply("".join(parts).strip() or None, True)
+
+    async def warm_up(self) -> None:
+        """Ask Ollama to load the model so the first fallback does not pay the load time."""
+        try:
+            response = await get_api_client().post_json(
+                f"{self.base_url}/api/generate",
+                {"model": self.model, "keep_alive": OLLAMA_KEEP_ALIVE},
+                timeout=120,
+            )
+            if response.status_code == 200:
+                logger.info("llm_warm_up_completed", model=self.model)
+            else:
+                logger.warning("llm_warm_up_failed", model=self.model, status=response.status_code, body=response.text[:200])
+        except APIConnectionError as e:
+            logger.warning("llm_unreachable", model=self.model, error=str(e))
+
+
+_llm_client: Optional[OllamaClient] = None
+
+
+def get_llm_client() -> OllamaClient:
+    """Return the process-wide Ollama client, creating it on first use."""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = OllamaClient()
+    return _llm_client
@@ -0,0 +1,211 @@
+# Local readmission risk model.
+#
+# A compact logistic regression that scores the same payload the prediction
+# API receives (see PatientRecord.api_payload).
+# The model is loaded once from a JSON artifact and scores single payloads or
+# whole batches with NumPy, so it can back the fallback analysis and serve
+# low-risk traffic without a round trip to the remote API.
+
+import json
+import math
+import os
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Text, Tuple
+
+import numpy as np
+
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+LOCAL_MODEL_PATH = os.getenv(
+    "LOCAL_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "local_risk_model.json"),
+)
+# Predictions below this probability are answered locally without calling the
+# remote API (0 disables the shortcut)
+LOCAL_MODEL_SERVE_BELOW = float(os.getenv("LOCAL_MODEL_SERVE_BELOW", "0"))
+
+# Human readable names for the payload fields, used when explaining a score
+FEATURE_LABELS = {
+    "age": "Age group",
+    "gender": "Gender",
+    "time_in_hospital": "Length of hospital stay",
+    "admission_type": "Admission type",
+    "discharge_disposition": "Discharge destination",
+    "admission_source": "Admission source",
+    "num_medications": "Number of medications",
+    "num_lab_procedures": "Number of lab procedures",
+    "num_procedures": "Number of procedures",
+    "number_diagnoses": "Number of diagnoses",
+    "number_inpatient": "Previous inpatient visits",
+    "number_outpatient": "Previous outpatient visits",
+    "number_emergency": "Previous emergency visits",
+    "diabetesMed": "Diabetes medication",
+    "change": "Recent medication change",
+    "A1Cresult": "A1C test result",
+    "max_glu_serum": "Glucose serum test result",
+    "insulin": "Insulin dosage",
+    "metformin": "Metformin dosage",
+}
+
+# Names of the coded payload fields (inverse of the code maps in patient_record)
+CATEGORY_LABELS = {
+    "admission_type": {"1": "Emergency", "2": "Urgent", "3": "Elective"},
+    "discharge_disposition": {
+        "1": "Home", "2": "Skilled Nursing Facility", "3": "Rehabilitation",
+        "4": "Long-term Care", "5": "Home Health Care",
+    },
+    "admission_source": {
+        "1": "Emergency Room", "2": "Physician Referral", "3": "Clinic Referral",
+        "4": "Transfer from Hospital",
+    },
+}
+
+
+class FeatureEncoder:
+    """Turns API payloads into a dense feature matrix.
+
+    Numeric fields are standardized with the artifact's mean/std; categorical
+    fields are one-hot encoded against the categories listed in the artifact
+    (anything else is treated as the reference category).
+    """
+
+    def __init__(self, numeric_features: Mapping[Text, Mapping[Text, float]], categorical_features: Mapping[Text, Sequence[Text]]):
+        self.feature_names: List[Text] = []
+        self._numeric: List[Tuple[Text, int, float, float]] = []
+        self._categorical: Dict[Text, Dict[Text, int]] = {}
+
+        for field, stats in numeric_features.items():
+            self._numeric.append((field, len(self.feature_names), float(stats["mean"]), float(stats["std"]) or 1.0))
+            self.feature_names.append(field)
+        for field, categories in categorical_features.items():
+            columns = {}
+            for category in categories:
+                columns[str(category)] = len(self.feature_names)
+                self.feature_names.append(f"{field}={category}")
+            self._categorical[field] = columns
+
+    @property
+    def fields(self) -> List[Text]:
+        return [field for field, _, _, _ in self._numeric] + list(self._categorical)
+
+    def encode_columns(self, columns: Mapping[Text, Sequence[Any]], n_rows: int) -> np.ndarray:
+        """Encode column-oriented data (e.g. a DataFrame chunk) into an (n_rows, n_features) matrix."""
+        X = np.zeros((n_rows, len(self.feature_names)), dtype=np.float64)
+        for field, column, mean, std in self._numeric:
+            values = columns.get(field)
+            if values is None:
+                continue  # missing field encodes as the mean
+            try:
+                numeric = np.asarray(values, dtype=np.float64)
+            except (ValueError, TypeError):
+                # Unparseable entries in the column: convert one by one
+                numeric = np.array([_to_float(value, mean) for value in values], dtype=np.float64)
+            numeric = np.where(np.isnan(numeric), mean, numeric)
+            X[:, column] = (numeric - mean) / std
+        for field, category_columns in self._categorical.items():
+            values = columns.get(field)
+            if values is None:
+                continue
+            indices = np.fromiter(
+                (category_columns.get(str(value), -1) for value in values), dtype=np.int64, count=n_rows
+            )
+            rows = np.flatnonzero(indices >= 0)
+            X[rows, indices[rows]] = 1.0
+        return X
+
+    def encode_one(self, payload: Mapping[Text, Any]) -> np.ndarray:
+        """Encode a single payload; cheaper than encode_batch for one row."""
+        x = np.zeros(len(self.feature_names), dtype=np.float64)
+        for field, column, mean, std in self._numeric:
+            x[column] = (_to_float(payload.get(field), mean) - mean) / std
+        for field, category_columns in self._categorical.items():
+            column = category_columns.get(str(payload.get(field)))
+            if column is not None:
+                x[column] = 1.0
+        return x
+
+    def encode_batch(self, payloads: Sequence[Mapping[Text, Any]]) -> np.ndarray:
+        columns = {field: [payload.get(field) for payload in payloads] for field in self.fields}
+        return self.encode_columns(columns, len(payloads))
+
+
+def describe_feature(feature_name: Text) -> Text:
+    """Readable label for an encoded feature name such as `insulin=Up`."""
+    field, _, category = feature_name.partition("=")
+    label = FEATURE_LABELS.get(field, field)
+    if not category:
+        return label
+    return f"{label}: {CATEGORY_LABELS.get(field, {}).get(category, category)}"
+
+
+def _to_float(value: Any, default: float) -> float:
+    try:
+        return float(value) if value is not None else default
+    except (ValueError, TypeError):
+        return default
+
+
+class LocalRiskModel:
+    def __init__(self, encoder: FeatureEncoder, coefficients: np.ndarray, intercept: float, version: Text,
+                 trained: bool = False):
+        self.encoder = encoder
+        self.coefficients = coefficients
+        self.intercept = intercept
+        self.version = version
+        # False for hand-calibrated baselines, whose scores are only rough estimates
+        self.trained = trained
+
+    @classmethod
+    def load(cls, path: Text = LOCAL_MODEL_PATH) -> "LocalRiskModel":
+        """Load a model from its JSON artifact."""
+        with open(path, "r", encoding="utf-8") as f:
+            artifact = json.load(f)
+        if artifact.get("model_type") != "logistic_regression":
+            raise ValueError(f"Unsupported local model type: {artifact.get('model_type')}")
+
+        numeric = artifact["numeric_features"]
+        categorical = artifact["categorical_features"]
+        encoder = FeatureEncoder(numeric, {field: list(weights) for field, weights in categorical.items()})
+
+        coefficients = [float(numeric[field]["coef"]) for field in numeric]
+        for weights in categorical.values():
+            coefficients.extend(float(weight) for weight in weights.values())
+
+        logger.info("local_model_loaded", version=artifact.get("version"), features=len(coefficients))
+        return cls(
+            encoder, np.asarray(coefficients, dtype=np.float64), float(artifact["intercept"]),
+            artifact.get("version", "unknown"), bool(artifact.get("trained", False)),
+        )
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        return X @ self.coefficients + self.intercept
+
+    def predict_proba_matrix(self, X: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+
+    def predict_proba_batch(self, payloads: Sequence[Mapping[Text, Any]]) -> np.ndarray:
+        """Readmission probability for each payload."""
+        return self.predict_proba_matrix(self.encoder.encode_batch(payloads))
+
+    def predict_proba(self, payload: Mapping[Text, Any]) -> float:
+        z = float(self.encoder.encode_one(payload) @ self.coefficients) + self.intercept
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def top_factors(self, payload: Mapping[Text, Any], k: int = 3) -> List[Tuple[Text, float]]:
+        """The k features that push this payload's risk up the most."""
+        contributions = self.encoder.encode_one(payload) * self.coefficients
+        order = np.argsort(contributions)[::-1][:k]
+        return [(self.encoder.feature_names[i], float(contributions[i])) for i in order if contributions[i] > 0]
+
+
+_local_model: Optional[LocalRiskModel] = None
+
+
+def get_local_model() -> LocalRiskModel:
+    """Return the process-wide local model, loading the artifact on first use."""
+    global _local_model
+    if _local_model is None:
+        _local_model = LocalRiskModel.load()
+    return _local_model
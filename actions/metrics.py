@@ -0,0 +1,266 @@
+# Prometheus metrics for the action server.
+#
+# Every custom action is decorated with @instrument_action, which times its
+# run() (and, for form validation actions, each validate_<slot> method) and
+# tracks how many are in flight. Outbound API calls are timed per endpoint by
+# the circuit breakers and LLM generations by the Ollama client. The state
+# already kept by the caches, the micro-batcher, the breakers, the rate
+# limiter, the admission gates, the live updates and the analytics pipeline
+# is exported when /metrics is scraped.
+#
+# prometheus_client is optional: without it every helper here is a no-op and
+# /metrics answers 503.
+
+import functools
+import inspect
+import time
+from typing import Any, Callable, Iterator, Optional, Text, Tuple, Type
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:  # pragma: no cover - metrics are optional
+    REGISTRY = None
+
+
+METRICS_AVAILABLE = REGISTRY is not None
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+VALIDATOR_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+if METRICS_AVAILABLE:
+    ACTION_LATENCY = Histogram(
+        "sweathog_action_duration_seconds", "Time spent in a custom action's run()", ["action"], buckets=LATENCY_BUCKETS
+    )
+    ACTION_IN_FLIGHT = Gauge("sweathog_action_in_flight", "Custom actions currently running", ["action"])
+    ACTION_ERRORS = Counter("sweathog_action_errors_total", "Custom actions that raised", ["action", "exception"])
+    VALIDATOR_LATENCY = Histogram(
+        "sweathog_validator_duration_seconds", "Time spent in a slot validator", ["form", "slot"], buckets=VALIDATOR_BUCKETS
+    )
+    HTTP_LATENCY = Histogram(
+        "sweathog_http_request_duration_seconds",
+        "Outbound API request time per endpoint",
+        ["endpoint", "outcome"],
+        buckets=LATENCY_BUCKETS,
+    )
+    FALLBACKS = Counter("sweathog_fallbacks_total", "Answers served by a fallback path", ["action", "reason"])
+    LLM_LATENCY = Histogram(
+        "sweathog_llm_duration_seconds", "LLM reply time including queueing", ["outcome"], buckets=LATENCY_BUCKETS
+    )
+    LLM_FIRST_TOKEN = Histogram(
+        "sweathog_llm_first_token_seconds", "Time until the first LLM token arrived", buckets=LATENCY_BUCKETS
+    )
+
+
+def _action_wrapper(run: Callable, action: Text) -> Callable:
+    if inspect.iscoroutinefunction(run):
+        @functools.wraps(run)
+        async def async_run(self, *args, **kwargs):
+            ACTION_IN_FLIGHT.labels(action).inc()
+            started = time.perf_counter()
+            try:
+                return await run(self, *args, **kwargs)
+            except Exception as e:
+                ACTION_ERRORS.labels(action, type(e).__name__).inc()
+                raise
+            finally:
+                ACTION_LATENCY.labels(action).observe(time.perf_counter() - started)
+                ACTION_IN_FLIGHT.labels(action).dec()
+
+        async_run._instrumented_run = run
+        return async_run
+
+    @functools.wraps(run)
+    def sync_run(self, *args, **kwargs):
+        ACTION_IN_FLIGHT.labels(action).inc()
+        started = time.perf_counter()
+        try:
+            return run(self, *args, **kwargs)
+        except Exception as e:
+            ACTION_ERRORS.labels(action, type(e).__name__).inc()
+            raise
+        finally:
+            ACTION_LATENCY.labels(action).observe(time.perf_counter() - started)
+            ACTION_IN_FLIGHT.labels(action).dec()
+
+    sync_run._instrumented_run = run
+    return sync_run
+
+
+def _validator_wrapper(validate: Callable, form: Text, slot: Text) -> Callable:
+    histogram = VALIDATOR_LATENCY.labels(form, slot)
+
+    if inspect.iscoroutinefunction(validate):
+        @functools.wraps(validate)
+        async def async_validate(self, *args, **kwargs):
+            with histogram.time():
+                return await validate(self, *args, **kwargs)
+
+        return async_validate
+
+    @functools.wraps(validate)
+    def sync_validate(self, *args, **kwargs):
+        with histogram.time():
+            return validate(self, *args, **kwargs)
+
+    return sync_validate
+
+
+def instrument_action(cls: Type) -> Type:
+    """Class decorator adding latency and in-flight metrics to a custom action."""
+    if not METRICS_AVAILABLE:
+        return cls
+    action = cls().name()
+    # Inherited runs are wrapped too (form validators use FormValidationAction.run);
+    # one instrumented for a parent action is re-wrapped under this action's name
+    run = cls.run
+    cls.run = _action_wrapper(getattr(run, "_instrumented_run", run), action)
+    for attribute, method in list(vars(cls).items()):
+        if attribute.startswith("validate_") and callable(method):
+            setattr(cls, attribute, _validator_wrapper(method, action, attribute[len("validate_"):]))
+    return cls
+
+
+def observe_http(endpoint: Text, outcome: Text, seconds: float) -> None:
+    """Record one outbound API request (`outcome` is a status code or error kind)."""
+    if METRICS_AVAILABLE:
+        HTTP_LATENCY.labels(endpoint, outcome).observe(seconds)
+
+
+def record_fallback(action: Text, reason: Text) -> None:
+    if METRICS_AVAILABLE:
+        FALLBACKS.labels(action, reason).inc()
+
+
+def observe_llm(outcome: Text, seconds: float, first_token_seconds: Optional[float] = None) -> None:
+    if METRICS_AVAILABLE:
+        LLM_LATENCY.labels(outcome).observe(seconds)
+        if first_token_seconds is not None:
+            LLM_FIRST_TOKEN.observe(first_token_seconds)
+
+
+class _ComponentStatsCollector:
+    """Exports the counters the caches, batcher and breakers already keep."""
+
+    def collect(self) -> Iterator[Any]:
+        # Imported here so that loading the metrics module stays side-effect free
+        from .admission import admission_gates
+        from .analytics import get_analytics
+        from .circuit_breaker import circuit_breakers
+        from .live_updates import get_live_updates
+        from .llm_cache import get_llm_cache
+        from .micro_batcher import get_micro_batcher
+        from .prediction_cache import get_prediction_cache
+        from .rate_limit import get_rate_limiter
+        from .report_jobs import get_report_queue
+        from .report_store import get_report_store
+        from .structured_logging import dropped_records
+
+        state = GaugeMetricFamily(
+            "sweathog_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", labels=["endpoint"]
+        )
+        trips = CounterMetricFamily("sweathog_circuit_trips", "Times a circuit breaker opened", labels=["endpoint"])
+        timeout = GaugeMetricFamily(
+            "sweathog_circuit_timeout_seconds", "Current adaptive timeout per endpoint", labels=["endpoint"]
+        )
+        for name, breaker in circuit_breakers().items():
+            snapshot = breaker.snapshot()
+            state.add_metric([name], CIRCUIT_STATE_VALUES.get(snapshot["state"], 0))
+            trips.add_metric([name], snapshot["trips"])
+            timeout.add_metric([name], snapshot["timeout"])
+        yield from (state, trips, timeout)
+
+        rate_limit_checks = CounterMetricFamily(
+            "sweathog_rate_limit_checks", "Per-sender rate limit checks by action class", labels=["action_class", "result"]
+        )
+        for action_class, counts in get_rate_limiter().stats()["by_class"].items():
+            rate_limit_checks.add_metric([action_class, "allowed"], counts["allowed"])
+            rate_limit_checks.add_metric([action_class, "limited"], counts["limited"])
+        yield rate_limit_checks
+
+        in_flight = GaugeMetricFamily("sweathog_admission_in_flight", "Backend calls running, per admission gate", labels=["gate"])
+        waiting = GaugeMetricFamily("sweathog_admission_waiting", "Backend calls waiting for a slot, per admission gate", labels=["gate"])
+        admissions = CounterMetricFamily("sweathog_admission_calls", "Backend calls by admission outcome", labels=["gate", "outcome"])
+        for name, gate in admission_gates().items():
+            gate_stats = gate.stats()
+            in_flight.add_metric([name], gate_stats["in_flight"])
+            waiting.add_metric([name], gate_stats["waiting"])
+            admissions.add_metric([name, "admitted"], gate_stats["admitted"])
+            admissions.add_metric([name, "shed"], gate_stats["shed"])
+        yield from (in_flight, waiting, admissions)
+
+        cache_lookups = CounterMetricFamily(
+            "sweathog_prediction_cache_lookups", "Prediction cache lookups", labels=["namespace", "result"]
+        )
+        cache_stats = get_prediction_cache().stats()
+        for namespace, counts in cache_stats["by_namespace"].items():
+            cache_lookups.add_metric([namespace, "hit"], counts["hits"])
+            cache_lookups.add_metric([namespace, "miss"], counts["misses"])
+        yield cache_lookups
+        yield GaugeMetricFamily("sweathog_prediction_cache_entries", "Entries in the prediction cache", value=cache_stats["entries"])
+
+        llm_cache = get_llm_cache()
+        if llm_cache is not None:
+            llm_stats = llm_cache.stats()
+            llm_lookups = CounterMetricFamily("sweathog_llm_cache_lookups", "LLM response cache lookups", labels=["result"])
+            for result in ("exact_hits", "semantic_hits", "misses"):
+                llm_lookups.add_metric([result], llm_stats[result])
+            yield llm_lookups
+            yield GaugeMetricFamily("sweathog_llm_cache_entries", "Entries in the LLM response cache", value=llm_stats["entries"])
+
+        batcher_stats = get_micro_batcher().stats()
+        yield CounterMetricFamily("sweathog_predict_batches", "Prediction batches sent", value=batcher_stats["batches"])
+        yield CounterMetricFamily("sweathog_predict_batched_requests", "Predictions sent in batches", value=batcher_stats["requests"])
+
+        report_stats = get_report_queue().stats()
+        report_jobs = GaugeMetricFamily("sweathog_report_jobs", "Report jobs currently known, by status", labels=["status"])
+        for status, count in report_stats["jobs"].items():
+            report_jobs.add_metric([status], count)
+        yield report_jobs
+        rendered = CounterMetricFamily("sweathog_reports_rendered", "Report jobs that finished", labels=["outcome"])
+        rendered.add_metric(["done"], report_stats["completed"])
+        rendered.add_metric(["failed"], report_stats["failed"])
+        yield rendered
+        yield CounterMetricFamily(
+            "sweathog_reports_repredicted", "Reports for which the backend ran the model again", value=report_stats["predicted"]
+        )
+
+        store_stats = get_report_store().stats()
+        yield GaugeMetricFamily("sweathog_report_store_files", "Reports in the report store at the last sweep", value=store_stats["files"])
+        yield GaugeMetricFamily("sweathog_report_store_bytes", "Size of the report store at the last sweep", value=store_stats["bytes"])
+        yield GaugeMetricFamily("sweathog_report_store_links", "Download links within their TTL at the last sweep", value=store_stats["links"])
+        removed = CounterMetricFamily("sweathog_report_store_removed", "Reports deleted by the sweeper", labels=["reason"])
+        removed.add_metric(["expired"], store_stats["expired"])
+        removed.add_metric(["quota"], store_stats["evicted"])
+        yield removed
+
+        analytics_stats = get_analytics().stats()
+        analytics_events = CounterMetricFamily(
+            "sweathog_analytics_events", "Assessment events by what became of them", labels=["outcome"]
+        )
+        for outcome in ("published", "written", "dropped", "failed"):
+            analytics_events.add_metric([outcome], analytics_stats[outcome])
+        yield analytics_events
+        yield GaugeMetricFamily("sweathog_analytics_buffered", "Assessment events waiting for the sink", value=analytics_stats["buffered"])
+        live_stats = get_live_updates().stats()
+        yield GaugeMetricFamily("sweathog_live_subscribers", "Open live update streams", value=live_stats["subscribers"])
+        live_events = CounterMetricFamily("sweathog_live_events", "Live updates by what became of them", labels=["outcome"])
+        live_events.add_metric(["published"], live_stats["published"])
+        live_events.add_metric(["dropped"], live_stats["dropped"])
+        yield live_events
+        yield CounterMetricFamily("sweathog_log_records_dropped", "Log records dropped because the log queue was full", value=dropped_records())
+
+
+_collector_registered = False
+
+
+def render_metrics() -> Tuple[Optional[bytes], Text]:
+    """Return the exposition-format metrics and their content type (None if unavailable)."""
+    global _collector_registered
+    if not METRICS_AVAILABLE:
+        return None, "text/plain"
+    if not _collector_registered:
+        REGISTRY.register(_ComponentStatsCollector())
+        _collector_registered = True
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,144 @@
+# Micro-batching of prediction requests.
+#
+# Assessments that finish within the same few milliseconds are collected into
+# one POST /predict_batch call instead of one /predict request each. Callers
+# simply await submit(payload) and get their own prediction back; the batch
+# is sent when the window closes or the batch is full, whichever comes first.
+# A payload submitted while no prediction is pending or in flight is sent
+# straight away, so a lone chat turn never waits for the window.
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Text, Tuple
+
+from .http_client import APIConnectionError
+from .prediction_api import (
+    BatchEndpointUnavailable, batch_endpoint_available, request_prediction, request_prediction_batch,
+)
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Batching configuration (overridable through the environment)
+PREDICT_BATCH_WINDOW_MS = float(os.getenv("PREDICT_BATCH_WINDOW_MS", "5"))
+PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "32"))
+STATS_LOG_INTERVAL = 100  # batches between distribution log lines
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """Collects concurrent prediction payloads and sends them as one batch.
+
+    With a window of 0 every payload is sent straight to /predict. If the
+    backend turns out not to have a batch endpoint, batching is switched off
+    and pending payloads are sent individually.
+    """
+
+    def __init__(self, window_ms: float = PREDICT_BATCH_WINDOW_MS, max_batch_size: int = PREDICT_BATCH_MAX_SIZE):
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.enabled = window_ms > 0 and max_batch_size > 1
+        self._pending: List[Tuple[Dict[Text, Any], asyncio.Future, float]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Set[asyncio.Future] = set()
+
+        self.batches = 0
+        self.requests = 0
+        self.size_histogram: Dict[int, int] = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.total_wait = 0.0
+
+    async def submit(self, payload: Dict[Text, Any]) -> Dict[Text, Any]:
+        """Return the prediction for `payload`, batched with concurrent submissions."""
+        if not self.enabled or not batch_endpoint_available():
+            return await request_prediction(payload)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((payload, future, time.monotonic()))
+        if len(self._pending) >= self.max_batch_size or not self._in_flight:
+            # Nothing to wait for when the backend is idle: later submissions
+            # are batched while this one is in flight
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: List[Tuple[Dict[Text, Any], asyncio.Future, float]]) -> None:
+        self._record(batch)
+        payloads = [payload for payload, _, _ in batch]
+        futures = [future for _, future, _ in batch]
+
+        results: Optional[List[Any]] = None
+        try:
+            if len(batch) == 1:
+                results = [await request_prediction(payloads[0])]
+            else:
+                results = await request_prediction_batch(payloads, breaker="predict_micro_batch")
+        except BatchEndpointUnavailable as e:
+            logger.warning("micro_batching_disabled", error=str(e))
+            self.enabled = False
+            results = await asyncio.gather(
+                *(request_prediction(payload) for payload in payloads), return_exceptions=True
+            )
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            if results is None:
+                # The flush task was cancelled (on shutdown): fail the callers
+                # rather than leave them waiting forever
+                results = [APIConnectionError("prediction batch was cancelled")] * len(batch)
+            for future, result in zip(futures, results):
+                if future.done():
+                    continue  # the waiting action was cancelled
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _record(self, batch: List[Tuple[Dict[Text, Any], asyncio.Future, float]]) -> None:
+        now = time.monotonic()
+        self.batches += 1
+        self.requests += len(batch)
+        self.total_wait += sum(now - submitted for _, _, submitted in batch)
+        bucket = next((b for b in BATCH_SIZE_BUCKETS if len(batch) <= b), BATCH_SIZE_BUCKETS[-1])
+        self.size_histogram[bucket] += 1
+        if self.batches % STATS_LOG_INTERVAL == 0:
+            logger.info("micro_batching_stats", **self.stats())
+
+    def stats(self) -> Dict[Text, Any]:
+        """Batch size distribution and time spent waiting for the window."""
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "mean_wait_ms": 1000.0 * self.total_wait / self.requests if self.requests else 0.0,
+            "batch_size_histogram": {f"<={bucket}": count for bucket, count in self.size_histogram.items()},
+        }
+
+
+_micro_batcher: Optional[MicroBatcher] = None
+
+
+def get_micro_batcher() -> MicroBatcher:
+    """Return the process-wide micro-batcher, creating it on first use."""
+    global _micro_batcher
+    if _micro_batcher is None:
+        _micro_batcher = MicroBatcher()
+    return _micro_batcher
@@ -0,0 +1,107 @@
+# Snapshot of the medical_info_form slots for one action run.
+#
+# PatientRecord reads all 30 form slots from the tracker in one pass into a
+# __slots__ object, and builds the prediction API payload from them once,
+# using lookup tables created at import. The actions, the local fallback,
+# the report flow and batch scoring all work from the same record instead
+# of re-reading the tracker and rebuilding the payload maps.
+
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Mapping, Optional, Text, Tuple
+
+from rasa_sdk import Tracker
+
+from .slot_validation import DRUG_SLOTS, SLOT_SCHEMA
+
+
+# Required slots of medical_info_form, in domain.yml order
+FORM_SLOTS: Tuple[Text, ...] = tuple(SLOT_SCHEMA)
+
+# Payload codes for the categorical slots (the backend's integer ids)
+ADMISSION_TYPE_CODES = MappingProxyType({"Emergency": 1, "Urgent": 2, "Elective": 3})
+DISCHARGE_DISPOSITION_CODES = MappingProxyType(
+    {"Home": 1, "Skilled Nursing Facility": 2, "Rehabilitation": 3, "Long-term Care": 4, "Home Health Care": 5}
+)
+ADMISSION_SOURCE_CODES = MappingProxyType(
+    {"Emergency Room": 1, "Physician Referral": 2, "Clinic Referral": 3, "Transfer from Hospital": 4}
+)
+
+# Values sent for slots that were not filled
+NUMERIC_DEFAULTS = MappingProxyType({
+    "time_in_hospital": 3.0,
+    "num_medications": 5.0,
+    "num_lab_procedures": 10.0,
+    "num_procedures": 1.0,
+    "number_diagnoses": 2.0,
+    "number_inpatient": 0.0,
+    "number_outpatient": 1.0,
+    "number_emergency": 0.0,
+})
+TEXT_DEFAULTS = MappingProxyType({
+    "age": "[30-40)",
+    "gender": "Female",
+    "race": "Other",
+    "diabetesMed": "No",
+    "change": "No",
+    "A1Cresult": "None",
+    "max_glu_serum": "None",
+    **{drug: "No" for drug in DRUG_SLOTS},
+})
+DEFAULT_DIAGNOSIS = "250.00"  # diabetes diagnosis code
+
+
+def _number(value: Any, default: float) -> float:
+    try:
+        return float(value) if value is not None else default
+    except (ValueError, TypeError):
+        return default
+
+
+class PatientRecord:
+    """The form slots of one conversation, with the API payload derived from them."""
+
+    __slots__ = FORM_SLOTS + ("_payload",)
+
+    def __init__(self, values: Mapping[Text, Any]):
+        get = values.get
+        for slot in FORM_SLOTS:
+            setattr(self, slot, get(slot))
+        self._payload: Optional[Dict[Text, Any]] = None
+
+    @classmethod
+    def from_tracker(cls, tracker: Tracker) -> "PatientRecord":
+        return cls(tracker.slots)
+
+    def get(self, slot: Text, default: Any = None) -> Any:
+        value = getattr(self, slot, None)
+        return default if value is None else value
+
+    def items(self) -> Iterator[Tuple[Text, Any]]:
+        for slot in FORM_SLOTS:
+            yield slot, getattr(self, slot)
+
+    def as_dict(self) -> Dict[Text, Any]:
+        return dict(self.items())
+
+    def filled_count(self) -> int:
+        """Number of form slots that have a value."""
+        return sum(1 for slot in FORM_SLOTS if getattr(self, slot) is not None)
+
+    def api_payload(self) -> Dict[Text, Any]:
+        """The prediction API payload for this record (built once; do not modify)."""
+        if self._payload is None:
+            payload: Dict[Text, Any] = {
+                "age": self.age or TEXT_DEFAULTS["age"],
+                "gender": self.gender or TEXT_DEFAULTS["gender"],
+                "race": self.race or TEXT_DEFAULTS["race"],
+                "admission_type": ADMISSION_TYPE_CODES.get(self.admission_type_id, 1),
+                "discharge_disposition": DISCHARGE_DISPOSITION_CODES.get(self.discharge_disposition_id, 1),
+                "admission_source": ADMISSION_SOURCE_CODES.get(self.admission_source_id, 1),
+            }
+            for slot, default in NUMERIC_DEFAULTS.items():
+                payload[slot] = _number(getattr(self, slot), default)
+            for slot in ("diabetesMed", "change", "A1Cresult", "max_glu_serum", *DRUG_SLOTS):
+                payload[slot] = getattr(self, slot) or TEXT_DEFAULTS[slot]
+            payload["diagnosis_1"] = DEFAULT_DIAGNOSIS
+            self._payload = payload
+        return self._payload
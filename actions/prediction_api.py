@@ -0,0 +1,148 @@
+# Client for the prediction backend (see the backend repository in README.md).
+#
+# Wraps the raw HTTP endpoints with the shared connection pool and the
+# per-endpoint circuit breakers, and turns unexpected responses into
+# exceptions the actions can handle.
+
+import json
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Text
+
+from .circuit_breaker import get_circuit_breaker
+from .http_client import APIConnectionError, APIResponse, APIStatusError, get_api_client
+
+
+# API Configuration
+API_BASE_URL = "http://localhost:8080"
+API_PREDICT_ENDPOINT = f"{API_BASE_URL}/predict"
+API_REPORT_ENDPOINT = f"{API_BASE_URL}/predict_with_report"
+API_RENDER_ENDPOINT = f"{API_BASE_URL}/render_report"
+API_DOWNLOAD_ENDPOINT = f"{API_BASE_URL}/download_report"
+API_BATCH_PREDICT_ENDPOINT = f"{API_BASE_URL}/predict_batch"
+
+
+# Set once /predict_batch answers 404 or 405, so the backend is not asked again
+_batch_endpoint_missing = False
+
+
+class BatchEndpointUnavailable(Exception):
+    """Raised when the backend does not provide the batch prediction endpoint."""
+
+
+class RenderEndpointUnavailable(Exception):
+    """Raised when the backend does not provide the render-only report endpoint."""
+
+
+class ReportGenerationError(Exception):
+    """Raised when the backend answers a report request without a usable report."""
+
+
+class GeneratedReport(NamedTuple):
+    filename: Optional[Text]  # None if the backend did not name the file
+    saved: bool  # whether the PDF itself was written to the requested path
+
+
+async def request_prediction(payload: Dict[Text, Any]) -> Dict[Text, Any]:
+    """Score one payload with POST /predict."""
+    response = await get_circuit_breaker("predict").call(
+        lambda timeout: get_api_client().post_json(API_PREDICT_ENDPOINT, payload, timeout=timeout)
+    )
+    if response.status_code != 200:
+        raise APIStatusError(response.status_code, response.text)
+    return response.json()
+
+
+def batch_endpoint_available() -> bool:
+    """False once the backend has shown it has no /predict_batch."""
+    return not _batch_endpoint_missing
+
+
+async def request_prediction_batch(
+    payloads: Sequence[Dict[Text, Any]], breaker: Text = "predict_batch"
+) -> List[Dict[Text, Any]]:
+    """Score several payloads with one POST /predict_batch.
+
+    The backend takes `{"instances": [...]}` and answers with
+    `{"predictions": [...]}` in the same order. `breaker` names the circuit
+    breaker, and with it the timeout cap, of the caller's kind of batch.
+    """
+    global _batch_endpoint_missing
+    if _batch_endpoint_missing:
+        raise BatchEndpointUnavailable(f"{API_BATCH_PREDICT_ENDPOINT} is not provided by the backend")
+    response = await get_circuit_breaker(breaker).call(
+        lambda timeout: get_api_client().post_json(
+            API_BATCH_PREDICT_ENDPOINT, {"instances": list(payloads)}, timeout=timeout
+        )
+    )
+    if response.status_code in (404, 405):
+        _batch_endpoint_missing = True
+        raise BatchEndpointUnavailable(f"{API_BATCH_PREDICT_ENDPOINT} answered {response.status_code}")
+    if response.status_code != 200:
+        raise APIStatusError(response.status_code, response.text)
+    predictions = response.json().get("predictions", [])
+    if len(predictions) != len(payloads):
+        raise APIConnectionError(
+            f"Batch prediction returned {len(predictions)} results for {len(payloads)} payloads"
+        )
+    return predictions
+
+
+async def request_report(payload: Dict[Text, Any], path: Text) -> GeneratedReport:
+    """Predict and render the PDF report for one payload with POST /predict_with_report.
+
+    The backend either returns the PDF itself (named in Content-Disposition),
+    which is streamed to `path`, or JSON with the `pdf_filename` to fetch
+    with download_report_file.
+    """
+    response = await get_circuit_breaker("predict_with_report").call(
+        lambda timeout: get_api_client().request_to_file("POST", API_REPORT_ENDPOINT, path, timeout, json_body=payload)
+    )
+    return _generated_report(response)
+
+
+async def request_rendered_report(payload: Dict[Text, Any], prediction: Dict[Text, Any], path: Text) -> GeneratedReport:
+    """Render the PDF report for a payload that was already scored, with POST /render_report.
+
+    The backend takes `{"patient": payload, "prediction": prediction}` and
+    answers like /predict_with_report, without running the model.
+    """
+    body = {"patient": payload, "prediction": prediction}
+    response = await get_circuit_breaker("render_report").call(
+        lambda timeout: get_api_client().request_to_file("POST", API_RENDER_ENDPOINT, path, timeout, json_body=body)
+    )
+    if response.status_code in (404, 405):
+        raise RenderEndpointUnavailable(f"{API_RENDER_ENDPOINT} answered {response.status_code}")
+    return _generated_report(response)
+
+
+def _generated_report(response: APIResponse) -> GeneratedReport:
+    if response.status_code != 200:
+        raise APIStatusError(response.status_code, response.text)
+
+    content_type = response.headers.get("Content-Type", "")
+    if "application/pdf" in content_type:
+        match = re.search(r'filename="?([^";]+)"?', response.headers.get("Content-Disposition", ""))
+        return GeneratedReport(match.group(1) if match else None, True)
+    if "application/json" in content_type:
+        try:
+            report_data = response.json()
+        except json.JSONDecodeError:
+            raise ReportGenerationError("Received invalid response from report service")
+        if report_data.get("status") != "success":
+            raise ReportGenerationError(report_data.get("error", "Unknown error occurred"))
+        if not report_data.get("pdf_filename"):
+            raise ReportGenerationError("Report was generated but download link is not available")
+        return GeneratedReport(report_data["pdf_filename"], False)
+    raise ReportGenerationError(f"Unexpected response format from report service: {content_type or 'none'}")
+
+
+async def download_report_file(filename: Text, path: Text) -> None:
+    """Stream a rendered report from GET /download_report/<filename> to `path`."""
+    url = f"{API_DOWNLOAD_ENDPOINT}/{filename}"
+    response = await get_circuit_breaker("download").call(
+        lambda timeout: get_api_client().request_to_file("GET", url, path, timeout)
+    )
+    if response.status_code != 200:
+        raise APIStatusError(response.status_code, response.text)
+    if response.content:
+        raise ReportGenerationError(f"{url} did not return a PDF")
@@ -0,0 +1,150 @@
+# Prediction result cache for the custom actions.
+#
+# Results from the prediction API are stored under a canonical hash of the
+# payload built by PatientRecord.api_payload, so
+# repeat assessments with the same answers do not go back to the model.
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Text, Tuple
+
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Cache configuration (overridable through the environment)
+PREDICTION_CACHE_BACKEND = os.getenv("PREDICTION_CACHE_BACKEND", "memory")
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "10000"))
+PREDICTION_CACHE_REDIS_URL = os.getenv("PREDICTION_CACHE_REDIS_URL", "redis://localhost:6379/0")
+PREDICTION_CACHE_PREFIX = "sweathog:prediction"
+
+
+def payload_cache_key(payload: Dict[Text, Any]) -> Text:
+    """Return a stable hash of an API payload, independent of key order."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class InMemoryCacheBackend:
+    """Per-process LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int = PREDICTION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Text, Tuple[float, Any]]" = OrderedDict()
+
+    async def get(self, key: Text) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: Text, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Cache shared by all action server processes.
+
+    Expiry uses Redis key TTLs; LRU eviction is left to the server's
+    `maxmemory-policy` (use `allkeys-lru` or `volatile-lru`).
+    """
+
+    def __init__(self, url: Text = PREDICTION_CACHE_REDIS_URL, prefix: Text = PREDICTION_CACHE_PREFIX):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:  # redis is optional for the in-process backend
+            raise ImportError("The redis package is required for the Redis prediction cache")
+        self.prefix = prefix
+        self._client = aioredis.from_url(url)
+
+    async def get(self, key: Text) -> Optional[Any]:
+        raw = await self._client.get(f"{self.prefix}:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: Text, value: Any, ttl: float) -> None:
+        await self._client.set(f"{self.prefix}:{key}", json.dumps(value), ex=max(1, int(ttl)))
+
+    def __len__(self) -> int:
+        return 0  # size lives on the Redis server
+
+
+class PredictionCache:
+    """Namespaced cache front-end that counts hits and misses.
+
+    Backend failures are logged and treated as misses so a cache outage never
+    blocks a prediction.
+    """
+
+    def __init__(self, backend: Any, ttl: float = PREDICTION_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits: Dict[Text, int] = {}
+        self.misses: Dict[Text, int] = {}
+
+    async def get(self, namespace: Text, key: Text) -> Optional[Any]:
+        try:
+            value = await self.backend.get(f"{namespace}:{key}")
+        except Exception as e:
+            logger.warning("prediction_cache_lookup_failed", error=str(e))
+            value = None
+        counter = self.hits if value is not None else self.misses
+        counter[namespace] = counter.get(namespace, 0) + 1
+        return value
+
+    async def set(self, namespace: Text, key: Text, value: Any, ttl: Optional[float] = None) -> None:
+        try:
+            await self.backend.set(f"{namespace}:{key}", value, ttl if ttl is not None else self.ttl)
+        except Exception as e:
+            logger.warning("prediction_cache_store_failed", error=str(e))
+
+    def stats(self) -> Dict[Text, Any]:
+        """Hit/miss counters per namespace plus overall hit rate."""
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        total = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "by_namespace": {
+                namespace: {"hits": self.hits.get(namespace, 0), "misses": self.misses.get(namespace, 0)}
+                for namespace in set(self.hits) | set(self.misses)
+            },
+        }
+
+
+_prediction_cache: Optional[PredictionCache] = None
+
+
+def get_prediction_cache() -> PredictionCache:
+    """Return the process-wide prediction cache, creating it on first use."""
+    global _prediction_cache
+    if _prediction_cache is None:
+        backend: Any = None
+        if PREDICTION_CACHE_BACKEND == "redis":
+            try:
+                backend = RedisCacheBackend()
+            except ImportError as e:
+                logger.warning("prediction_cache_fallback", backend="memory", error=str(e))
+        if backend is None:
+            backend = InMemoryCacheBackend()
+        _prediction_cache = PredictionCache(backend)
+    return _prediction_cache
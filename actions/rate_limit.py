@@ -0,0 +1,207 @@
+# Per-sender rate limiting.
+#
+# Token buckets keyed by action class and sender ID: a bucket holds up to N
+# tokens, refills at N per period, and every call takes one. Each action class
+# has its own limit, so a client hammering one expensive action (the
+# prediction, the PDF report, the LLM fallback) is slowed down without
+# affecting anyone else. The REST channel in addons/rate_limit.py uses the
+# "message" class for the Rasa webhook itself.
+#
+# Buckets live in process memory by default. With RATE_LIMIT_BACKEND=redis
+# they are shared by all action server workers and the Rasa server, updated
+# atomically by a Lua script on Redis' clock. A backend failure lets the call
+# through: rate limiting must never take the chat down with it.
+
+import functools
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Text, Tuple, Type
+
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Rate limit configuration (overridable through the environment)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory or redis
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_PREFIX = "sweathog:ratelimit"
+
+
+def parse_limit(value: Text) -> Optional[Tuple[float, float]]:
+    """(tokens, period in seconds) of a "<tokens>/<seconds>" limit; None for "0" (unlimited)."""
+    tokens, _, period = value.partition("/")
+    if float(tokens) <= 0:
+        return None
+    return float(tokens), float(period or 60)
+
+
+# Calls allowed per sender, as "<calls>/<seconds>" (bursts of up to <calls>); 0 disables a limit
+RATE_LIMITS: Dict[Text, Optional[Tuple[float, float]]] = {
+    "message": parse_limit(os.getenv("RATE_LIMIT_MESSAGES", "30/60")),
+    "prediction": parse_limit(os.getenv("RATE_LIMIT_PREDICTIONS", "6/300")),
+    "report": parse_limit(os.getenv("RATE_LIMIT_REPORTS", "6/300")),
+    "llm": parse_limit(os.getenv("RATE_LIMIT_LLM", "12/60")),
+}
+
+
+class InMemoryBucketStore:
+    """Token buckets of this process, the least recently used dropped beyond max_keys."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Text, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: Text, capacity: float, per_second: float) -> float:
+        """Take a token from bucket `key`; 0 if there was one, else the seconds until there is."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * per_second)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / per_second
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        # An idle bucket refills anyway, so dropping the oldest loses nothing
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Refill and take in one step on the Redis server; returns the wait in milliseconds
+TAKE_TOKEN_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local per_ms = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + clock[2] / 1000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * per_ms)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) / per_ms)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / per_ms))
+return wait
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared by every process using the same Redis; idle buckets expire."""
+
+    def __init__(self, url: Text = RATE_LIMIT_REDIS_URL, prefix: Text = RATE_LIMIT_PREFIX):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:  # redis is optional for the in-process backend
+            raise ImportError("The redis package is required for the Redis rate limit backend")
+        self.prefix = prefix
+        self._client = aioredis.from_url(url)
+        self._take = self._client.register_script(TAKE_TOKEN_SCRIPT)
+
+    async def take(self, key: Text, capacity: float, per_second: float) -> float:
+        wait_ms = await self._take(keys=[f"{self.prefix}:{key}"], args=[capacity, per_second / 1000.0])
+        return int(wait_ms) / 1000.0
+
+    def __len__(self) -> int:
+        return 0  # buckets live on the Redis server
+
+
+class RateLimiter:
+    """Checks calls against the per-sender limit of their action class and counts the outcome."""
+
+    def __init__(self, backend: Any, limits: Dict[Text, Optional[Tuple[float, float]]] = RATE_LIMITS):
+        self.backend = backend
+        self.limits = limits
+        self.allowed: Dict[Text, int] = {}
+        self.limited: Dict[Text, int] = {}
+
+    async def check(self, action_class: Text, sender_id: Optional[Text]) -> float:
+        """Seconds `sender_id` has to wait before its next `action_class` call; 0 if it may go ahead."""
+        limit = self.limits.get(action_class)
+        if limit is None:
+            return 0.0
+        tokens, period = limit
+        try:
+            wait = await self.backend.take(f"{action_class}:{sender_id}", tokens, tokens / period)
+        except Exception as e:
+            logger.warning("rate_limit_check_failed", error=str(e))
+            wait = 0.0
+        counter = self.limited if wait > 0 else self.allowed
+        counter[action_class] = counter.get(action_class, 0) + 1
+        return wait
+
+    def stats(self) -> Dict[Text, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "buckets": len(self.backend),
+            "by_class": {
+                action_class: {"allowed": self.allowed.get(action_class, 0), "limited": self.limited.get(action_class, 0)}
+                for action_class in set(self.allowed) | set(self.limited)
+            },
+        }
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter, creating it on first use."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        backend: Any = None
+        if RATE_LIMIT_BACKEND == "redis":
+            try:
+                backend = RedisBucketStore()
+            except ImportError as e:
+                logger.warning("rate_limit_fallback", backend="memory", error=str(e))
+        if backend is None:
+            backend = InMemoryBucketStore()
+        _rate_limiter = RateLimiter(backend)
+    return _rate_limiter
+
+
+def retry_message(wait: float) -> Text:
+    if wait < 90:
+        return f"{max(1, round(wait))} seconds"
+    return f"{round(wait / 60)} minutes"
+
+
+def rate_limited(action_class: Text) -> Callable[[Type], Type]:
+    """Class decorator applying the per-sender limit of `action_class` to a custom action's run().
+
+    A limited call does not run the action. It calls the action's
+    on_rate_limited(dispatcher, tracker, wait) if it has one, and otherwise
+    tells the user when to try again.
+    """
+    def decorate(cls: Type) -> Type:
+        run = vars(cls)["run"]
+
+        @functools.wraps(run)
+        async def limited_run(self, dispatcher, tracker, domain):
+            wait = await get_rate_limiter().check(action_class, tracker.sender_id)
+            if wait <= 0:
+                return await run(self, dispatcher, tracker, domain)
+            logger.info("action_rate_limited", action=self.name(), wait=round(wait, 1))
+            handler = getattr(self, "on_rate_limited", None)
+            if handler is not None:
+                return handler(dispatcher, tracker, wait)
+            dispatcher.utter_message(
+                text=f"⏳ You've asked for this a lot in a short time. Please try again in {retry_message(wait)}."
+            )
+            return []
+
+        cls.run = limited_run
+        return cls
+
+    return decorate
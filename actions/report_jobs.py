@@ -0,0 +1,309 @@
+# Background PDF report generation.
+#
+# Rendering a report can take the backend up to a minute, so the report
+# action only enqueues a job and answers the chat with the job's download
+# link straight away. A fixed number of worker tasks render the queued jobs;
+# the action server's /download_report/<job_id> routes report the status and
+# hand out the file once it is ready. A job that comes with the prediction the
+# chat already showed only asks the backend to render it (/render_report);
+# without one the backend predicts again (/predict_with_report). Rendered PDFs
+# are kept in the local report store (actions/report_store.py) under the hash
+# of the payload and prediction, so an assessment that already has a job, or
+# a stored report, shares it. Jobs live in the process's memory; a finished
+# job's link is also recorded in the store, so after a restart, or on another
+# worker of actions.cluster, the link still serves its report.
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Text
+
+from .prediction_api import (
+    API_DOWNLOAD_ENDPOINT,
+    GeneratedReport,
+    RenderEndpointUnavailable,
+    download_report_file,
+    request_rendered_report,
+    request_report,
+)
+from .prediction_cache import payload_cache_key
+from .report_store import REPORT_STORE_TTL, get_report_store
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Report job configuration (overridable through the environment)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_MAX = int(os.getenv("REPORT_QUEUE_MAX", "100"))
+REPORT_JOB_TTL = float(os.getenv("REPORT_JOB_TTL", str(REPORT_STORE_TTL)))
+# Seconds a download request waits for its job before answering 202
+REPORT_DOWNLOAD_WAIT = float(os.getenv("REPORT_DOWNLOAD_WAIT", "30"))
+# Public URL of the action server's download route, used in chat messages
+REPORT_DOWNLOAD_BASE_URL = os.getenv("REPORT_DOWNLOAD_BASE_URL", "http://localhost:5055/download_report").rstrip("/")
+
+# Job ids carry the worker that owns the job so actions.cluster can route to it
+_JOB_PREFIX = f"w{os.environ['ACTIONS_WORKER_ID']}-" if "ACTIONS_WORKER_ID" in os.environ else ""
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class ReportQueueFull(Exception):
+    """Raised when more report jobs are waiting than REPORT_QUEUE_MAX."""
+
+
+class ReportJob:
+    """One report to render and its progress."""
+
+    __slots__ = ("job_id", "cache_key", "payload", "prediction", "status", "filename", "path", "error",
+                 "created", "started", "finished", "_done")
+
+    def __init__(self, cache_key: Text, payload: Optional[Dict[Text, Any]], prediction: Optional[Dict[Text, Any]] = None,
+                 job_id: Optional[Text] = None):
+        self.job_id = job_id or f"{_JOB_PREFIX}{uuid.uuid4().hex}"
+        self.cache_key = cache_key
+        self.payload: Optional[Dict[Text, Any]] = payload
+        self.prediction = prediction  # the result shown in the chat, if the report should reuse it
+        self.status = QUEUED
+        self.filename: Optional[Text] = None
+        self.path: Optional[Text] = None  # the PDF in the report store
+        self.error: Optional[Text] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._done = asyncio.Event()
+
+    @property
+    def download_url(self) -> Text:
+        """Link given to the user; it waits for the job and then serves the file."""
+        return f"{REPORT_DOWNLOAD_BASE_URL}/{self.job_id}.pdf"
+
+    @property
+    def file_url(self) -> Optional[Text]:
+        """The rendered file on the backend, for jobs that could not be stored locally."""
+        return f"{API_DOWNLOAD_ENDPOINT}/{self.filename}" if self.status == DONE else None
+
+    @property
+    def available(self) -> bool:
+        """False once the sweeper has deleted the stored PDF of a finished job."""
+        return self.path is None or os.path.exists(self.path)
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the job to finish; True if it has."""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._done.is_set()
+
+    def finish(self, status: Text, error: Optional[Text] = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished = time.time()
+        self.payload = None
+        self.prediction = None
+        self._done.set()
+
+    def as_dict(self) -> Dict[Text, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "filename": self.filename,
+            "download_url": self.download_url,
+            "error": self.error,
+            "created": self.created,
+            "queued_seconds": round((self.started or time.time()) - self.created, 3),
+            "render_seconds": round((self.finished or time.time()) - self.started, 3) if self.started else None,
+        }
+
+
+class ReportJobQueue:
+    """Renders report jobs in the background with bounded concurrency."""
+
+    def __init__(self, workers: int = REPORT_WORKERS, max_queued: int = REPORT_QUEUE_MAX, ttl: float = REPORT_JOB_TTL):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._jobs: "OrderedDict[Text, ReportJob]" = OrderedDict()
+        self._by_key: Dict[Text, ReportJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._render_only = True  # until the backend turns out not to have /render_report
+
+        self.completed = 0
+        self.failed = 0
+        self.predicted = 0  # reports for which the backend ran the model again
+
+    def _start(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, payload: Dict[Text, Any], prediction: Optional[Dict[Text, Any]] = None) -> ReportJob:
+        """Enqueue a report for `payload` (and its `prediction`), or return the job that already covers it."""
+        self._prune()
+        cache_key = report_cache_key(payload, prediction)
+        job = self._by_key.get(cache_key)
+        # A stored report is handed out under a new job (below), so that the
+        # link and the file are both good for the full TTL again
+        if job is not None and job.status != FAILED and job.available and not (job.status == DONE and job.path):
+            return job
+
+        path = get_report_store().lookup(cache_key)
+        if path is not None:
+            job = ReportJob(cache_key, payload, prediction)
+            job.filename = report_filename(cache_key)
+            job.path = path
+            job.finish(DONE)
+            self._jobs[job.job_id] = job
+            self._by_key[cache_key] = job
+            self._save_link(job)
+            logger.info("report_reused", path=path)
+            return job
+
+        self._start()
+        if self._queue.qsize() >= self.max_queued:
+            raise ReportQueueFull(f"{self._queue.qsize()} reports are already waiting")
+        job = ReportJob(cache_key, payload, prediction)
+        self._jobs[job.job_id] = job
+        self._by_key[cache_key] = job
+        self._queue.put_nowait(job)
+        logger.info("report_job_queued", job_id=job.job_id, waiting=self._queue.qsize())
+        return job
+
+    def get(self, job_id: Text) -> Optional[ReportJob]:
+        """The job behind a download link, restored from the store if this process does not know it."""
+        self._prune()
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._restore(job_id)
+        return job
+
+    def _restore(self, job_id: Text) -> Optional[ReportJob]:
+        store = get_report_store()
+        link = store.load_link(job_id)
+        if link is None:
+            return None
+        info, created = link
+        job = ReportJob(info["key"], None, job_id=job_id)
+        job.filename = info.get("filename")
+        job.path = store.path_for(info["key"]) if info.get("stored") else None
+        job.finish(DONE)
+        job.created = job.started = job.finished = created
+        self._jobs[job_id] = job
+        return job
+
+    @staticmethod
+    def _save_link(job: ReportJob) -> None:
+        try:
+            get_report_store().save_link(job.job_id, job.cache_key, job.filename, job.path is not None)
+        except OSError as e:
+            # The link still works until this process restarts
+            logger.warning("report_link_not_saved", job_id=job.job_id, error=str(e))
+
+    def _prune(self) -> None:
+        expires = time.time() - self.ttl
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.finished is None or job.finished > expires:
+                break
+            del self._jobs[job.job_id]
+            if self._by_key.get(job.cache_key) is job:
+                del self._by_key[job.cache_key]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._render(job)
+            finally:
+                self._queue.task_done()
+
+    async def _render(self, job: ReportJob) -> None:
+        job.status = RUNNING
+        job.started = time.time()
+        store = get_report_store()
+        part = store.part_path()
+        try:
+            report = await self._request(job, part)
+            job.filename = report.filename or report_filename(job.cache_key)
+            if not report.saved:
+                await self._fetch(job, part)
+            if os.path.exists(part):
+                job.path = store.commit(part, job.cache_key)
+        except asyncio.CancelledError:
+            store.discard(part)
+            job.finish(FAILED, "Report generation was cancelled")
+            raise
+        except Exception as e:
+            store.discard(part)
+            logger.error("report_job_failed", job_id=job.job_id, error=str(e))
+            self.failed += 1
+            job.finish(FAILED, str(e) or type(e).__name__)
+            return
+
+        self.completed += 1
+        job.finish(DONE)
+        self._save_link(job)
+        logger.info("report_job_rendered", job_id=job.job_id, filename=job.filename, seconds=round(job.finished - job.started, 2))
+
+    async def _request(self, job: ReportJob, part: Text) -> GeneratedReport:
+        """Have the backend render the job's report, reusing its prediction when there is one."""
+        if job.prediction is not None and self._render_only:
+            try:
+                return await request_rendered_report(job.payload, job.prediction, part)
+            except RenderEndpointUnavailable as e:
+                logger.warning("report_endpoint_fallback", endpoint="/predict_with_report", error=str(e))
+                self._render_only = False
+        self.predicted += 1
+        return await request_report(job.payload, part)
+
+    @staticmethod
+    async def _fetch(job: ReportJob, part: Text) -> None:
+        """Copy a report the backend only named into the store's temporary file."""
+        try:
+            await download_report_file(job.filename, part)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The backend still serves the file, so downloads are redirected there
+            logger.warning("report_store_failed", filename=job.filename, error=str(e))
+            get_report_store().discard(part)
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def stats(self) -> Dict[Text, Any]:
+        by_status = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in self._jobs.values():
+            by_status[job.status] += 1
+        return {"jobs": by_status, "completed": self.completed, "failed": self.failed, "predicted": self.predicted}
+
+
+def report_cache_key(payload: Dict[Text, Any], prediction: Optional[Dict[Text, Any]] = None) -> Text:
+    """Store key of a report: the payload hash, or the hash of payload and prediction when it reuses one."""
+    if prediction is None:
+        return payload_cache_key(payload)
+    return payload_cache_key({"patient": payload, "prediction": prediction})
+
+
+def report_filename(cache_key: Text) -> Text:
+    """Download name for a report the backend did not name."""
+    return f"medical_report_{cache_key[:12]}.pdf"
+
+
+_report_queue: Optional[ReportJobQueue] = None
+
+
+def get_report_queue() -> ReportJobQueue:
+    """Return the process-wide report job queue, creating it on first use."""
+    global _report_queue
+    if _report_queue is None:
+        _report_queue = ReportJobQueue()
+    return _report_queue
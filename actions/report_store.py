@@ -0,0 +1,218 @@
+# Local store for rendered PDF reports.
+#
+# Reports are kept on disk under the hash of the assessment payload they were
+# rendered from (see prediction_cache.payload_cache_key), so an identical
+# assessment reuses the existing file - also across the workers of
+# actions.cluster, which share the directory. A background sweeper deletes
+# reports once they are older than the promised 24 hours and, oldest first,
+# whenever the store grows beyond its disk quota.
+#
+# Every download link handed out is recorded next to the reports, as
+# links/<job_id>.json naming the report it serves, so the link keeps working
+# after a restart and on any worker. A report with a link that has not
+# expired yet is never evicted for the quota: the store rather stays over
+# its quota (and says so) than break a link within its 24 hours.
+
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set, Text, Tuple
+
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Report store configuration (overridable through the environment)
+REPORT_STORE_DIR = os.getenv("REPORT_STORE_DIR", "report_store")
+REPORT_STORE_TTL = float(os.getenv("REPORT_STORE_TTL", "86400"))
+REPORT_STORE_MAX_BYTES = int(os.getenv("REPORT_STORE_MAX_BYTES", str(1024 ** 3)))
+REPORT_SWEEP_INTERVAL = float(os.getenv("REPORT_SWEEP_INTERVAL", "300"))
+
+# Partial downloads older than this are left over from a crash
+STALE_PART_SECONDS = 3600
+
+# Link ids are used as file names
+_LINK_ID = re.compile(r"^[A-Za-z0-9_-]{1,100}$")
+
+
+class ReportStore:
+    """Content-addressed PDF files with an age limit and a size quota."""
+
+    def __init__(self, directory: Text = REPORT_STORE_DIR, ttl: float = REPORT_STORE_TTL, max_bytes: int = REPORT_STORE_MAX_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._parts = os.path.join(self.directory, "tmp")
+        self._links = os.path.join(self.directory, "links")
+        os.makedirs(self._parts, exist_ok=True)
+        os.makedirs(self._links, exist_ok=True)
+
+        self.files = 0
+        self.bytes = 0
+        self.links = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def path_for(self, key: Text) -> Text:
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def lookup(self, key: Text) -> Optional[Text]:
+        """Path of the stored report for `key`, if it exists and has not expired.
+
+        A report found is touched: it is handed out again, and its link has
+        to work for the full TTL from now.
+        """
+        path = self.path_for(key)
+        try:
+            if time.time() - os.stat(path).st_mtime < self.ttl:
+                os.utime(path)
+                return path
+        except FileNotFoundError:
+            pass
+        return None
+
+    def part_path(self) -> Text:
+        """A fresh temporary path to write a report to before commit()."""
+        return os.path.join(self._parts, f"{uuid.uuid4().hex}.part")
+
+    def commit(self, part: Text, key: Text) -> Text:
+        """Move a completely written report into place under `key`."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(part)
+        os.replace(part, path)
+        self.files += 1
+        self.bytes += size
+        return path
+
+    def discard(self, part: Text) -> None:
+        try:
+            os.remove(part)
+        except FileNotFoundError:
+            pass
+
+    def save_link(self, link_id: Text, key: Text, filename: Optional[Text], stored: bool) -> None:
+        """Record that download link `link_id` serves the report under `key`, for the TTL from now.
+
+        `stored` is False for a report only the backend has, which the link
+        redirects to.
+        """
+        if not _LINK_ID.match(link_id):
+            raise ValueError(f"Invalid link id: {link_id!r}")
+        part = self.part_path()
+        with open(part, "w") as file:
+            json.dump({"key": key, "filename": filename, "stored": stored}, file)
+        os.replace(part, os.path.join(self._links, f"{link_id}.json"))
+        self.links += 1
+
+    def load_link(self, link_id: Text) -> Optional[Tuple[Dict[Text, Any], float]]:
+        """The report a download link serves and when the link was made, unless it is unknown or expired."""
+        if not _LINK_ID.match(link_id):
+            return None
+        try:
+            with open(os.path.join(self._links, f"{link_id}.json")) as file:
+                created = os.fstat(file.fileno()).st_mtime
+                if time.time() - created >= self.ttl:
+                    return None
+                return json.load(file), created
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _sweep_links(self, now: float) -> Set[Text]:
+        """Delete expired links; the keys of the reports the others serve."""
+        linked = set()
+        self.links = 0
+        for entry in os.scandir(self._links):
+            try:
+                if now - entry.stat().st_mtime >= self.ttl:
+                    self._remove(entry.path)
+                    continue
+                with open(entry.path) as file:
+                    linked.add(json.load(file)["key"])
+                self.links += 1
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+        return linked
+
+    def _scan(self) -> List[Tuple[float, int, Text]]:
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir() or shard.path == self._links:
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def sweep(self) -> Dict[Text, int]:
+        """Delete expired reports, then the oldest unlinked ones until the store fits its quota."""
+        now = time.time()
+        linked = self._sweep_links(now)
+        expired = evicted = 0
+        kept = []
+        for mtime, size, path in sorted(self._scan()):
+            limit = STALE_PART_SECONDS if path.endswith(".part") else self.ttl
+            if now - mtime >= limit:
+                expired += self._remove(path)
+            else:
+                kept.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in kept)
+        remaining = []
+        for mtime, size, path in kept:
+            key = os.path.basename(path)[:-len(".pdf")]
+            if total > self.max_bytes and path.endswith(".pdf") and key not in linked:
+                evicted += self._remove(path)
+                total -= size
+            else:
+                remaining.append((mtime, size, path))
+        if total > self.max_bytes:
+            logger.warning("report_store_over_quota", bytes=total, max_bytes=self.max_bytes, links=self.links)
+
+        self.files = sum(1 for _, _, path in remaining if not path.endswith(".part"))
+        self.bytes = total
+        self.expired += expired
+        self.evicted += evicted
+        if expired or evicted:
+            logger.info("report_store_swept", expired=expired, evicted=evicted)
+        return {"expired": expired, "evicted": evicted, "files": self.files, "bytes": self.bytes}
+
+    @staticmethod
+    def _remove(path: Text) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0  # another worker got there first
+
+    async def run_sweeper(self, interval: float = REPORT_SWEEP_INTERVAL) -> None:
+        """Sweep the store every `interval` seconds until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except OSError as e:
+                logger.error("report_store_sweep_failed", error=str(e))
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[Text, Any]:
+        """Approximate size (exact as of the last sweep), and files removed so far."""
+        return {"files": self.files, "bytes": self.bytes, "links": self.links, "expired": self.expired, "evicted": self.evicted}
+
+
+_report_store: Optional[ReportStore] = None
+
+
+def get_report_store() -> ReportStore:
+    """Return the process-wide report store, creating its directory on first use."""
+    global _report_store
+    if _report_store is None:
+        _report_store = ReportStore()
+    return _report_store
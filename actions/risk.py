@@ -0,0 +1,15 @@
+# Risk levels of a readmission probability.
+#
+# Shared by the chat assessment and batch scoring, so both put a score in
+# the same band.
+
+from typing import Text, Tuple
+
+
+def classify_risk(probability: float) -> Tuple[Text, Text]:
+    """Map a readmission probability to a risk level and its color"""
+    if probability < 0.3:
+        return "LOW", "🟢"
+    elif probability < 0.7:
+        return "MODERATE", "🟡"
+    return "HIGH", "🟠"
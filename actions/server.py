@@ -0,0 +1,314 @@
+# Action server entrypoint.
+#
+# Runs the standard rasa-sdk action server (/webhook, /health, /actions) for
+# the `actions` package and mounts the additional HTTP routes this project
+# needs next to it.
+#
+# Usage:
+#   python -m actions.server --port 5055
+
+import argparse
+import asyncio
+import io
+import logging
+import os
+import re
+import urllib.parse
+from typing import TYPE_CHECKING, AsyncIterator, BinaryIO, List, Optional, Text, Tuple, Union
+
+from rasa_sdk.endpoint import create_app
+from sanic import Blueprint, Sanic, response
+from sanic.request import Request
+from sanic.response import HTTPResponse
+
+from .analytics import get_analytics
+from .batch_scoring import DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY, BatchScorer
+from .http_client import FILE_CHUNK_SIZE, close_api_client
+from .internal_auth import internal_only
+from .llm_cache import get_llm_cache
+from .live_updates import LIVE_KEEPALIVE_INTERVAL, get_live_updates, sse_event
+from .llm_client import get_llm_client
+from .metrics import render_metrics
+from .report_jobs import FAILED, REPORT_DOWNLOAD_WAIT, get_report_queue
+from .report_store import get_report_store
+from .structured_logging import configure_logging, get_logger
+from .warm_up import ACTIONS_WARM_UP, warm_up_actions
+
+if TYPE_CHECKING:  # pandas is only imported when a batch is scored
+    import pandas as pd
+
+
+logger = get_logger(__name__)
+
+DEFAULT_ACTIONS_PORT = 5055
+BATCH_SCORE_CHUNK_SIZE = 1000
+# Upper bounds for the batch_size and concurrency of a /batch/score request
+BATCH_SCORE_MAX_BATCH_SIZE = int(os.getenv("BATCH_SCORE_MAX_BATCH_SIZE", "500"))
+BATCH_SCORE_MAX_CONCURRENCY = int(os.getenv("BATCH_SCORE_MAX_CONCURRENCY", "8"))
+_BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+batch_blueprint = Blueprint("batch_scoring")
+live_blueprint = Blueprint("live_updates")
+metrics_blueprint = Blueprint("metrics")
+reports_blueprint = Blueprint("reports")
+
+
+@batch_blueprint.post("/batch/score", stream=True)
+@internal_only
+async def batch_score(request: Request):
+    """Score an uploaded CSV of discharge records and stream the scored CSV back.
+
+    Query parameters: `backend` (api or local), `fallback` (none or local),
+    `batch_size`, `concurrency`; the last two are capped at BATCH_SCORE_MAX_BATCH_SIZE and
+    BATCH_SCORE_MAX_CONCURRENCY. The upload is read and scored
+    BATCH_SCORE_CHUNK_SIZE rows at a time.
+    """
+    import pandas as pd
+
+    try:
+        scorer = BatchScorer(
+            backend=request.args.get("backend", "api"),
+            fallback=request.args.get("fallback", "none"),
+            batch_size=clamp(int(request.args.get("batch_size", DEFAULT_BATCH_SIZE)), BATCH_SCORE_MAX_BATCH_SIZE),
+            concurrency=clamp(int(request.args.get("concurrency", DEFAULT_CONCURRENCY)), BATCH_SCORE_MAX_CONCURRENCY),
+        )
+        chunks = csv_chunks(request, BATCH_SCORE_CHUNK_SIZE)
+        # Parse the first chunk before answering, so a malformed upload still gets a 400
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        return response.json({"error": "The upload is empty"}, status=400)
+    except (ValueError, pd.errors.ParserError) as e:
+        return response.json({"error": str(e)}, status=400)
+
+    stream = await request.respond(content_type="text/csv")
+    scored = await scorer.score_frame(first)
+    await stream.send(scored.to_csv(index=False))
+    async for chunk in chunks:
+        scored = await scorer.score_frame(chunk)
+        await stream.send(scored.to_csv(header=False, index=False))
+    await stream.eof()
+
+
+def clamp(value: int, maximum: int) -> int:
+    return max(1, min(value, maximum))
+
+
+def complete_rows_end(buffer: bytearray) -> int:
+    """Index just past the last complete CSV row in `buffer`, or 0 if there is none.
+
+    A newline inside a quoted field does not end a row; quotes are escaped by
+    doubling them, so a newline ends a row where the quotes before it are even.
+    """
+    end = buffer.rfind(b"\n")
+    while end >= 0 and buffer.count(b'"', 0, end) % 2:
+        end = buffer.rfind(b"\n", 0, end)
+    return end + 1
+
+
+async def csv_chunks(request: Request, rows: int) -> AsyncIterator["pd.DataFrame"]:
+    """DataFrames of about `rows` rows each, parsed from a streamed CSV request body.
+
+    Only the rows not yet parsed are held in memory, however large the upload.
+    """
+    import pandas as pd
+
+    buffer = bytearray()
+    header = b""
+    pending_rows = 0
+    while True:
+        data = await request.stream.read()
+        if data is not None:
+            buffer += data
+            pending_rows += data.count(b"\n")
+            if pending_rows <= rows:
+                continue
+        if not header:
+            header_end = buffer.find(b"\n") + 1 or len(buffer)
+            header = bytes(buffer[:header_end])
+            del buffer[:header_end]
+        end = complete_rows_end(buffer) if data is not None else len(buffer)
+        if buffer[:end].strip():
+            yield pd.read_csv(io.BytesIO(header + bytes(buffer[:end])))
+        del buffer[:end]
+        pending_rows = buffer.count(b"\n")
+        if data is None:
+            return
+
+
+@live_blueprint.get("/live/<sender_id>")
+@internal_only
+async def live_updates(request: Request, sender_id: Text):
+    """Server-sent events with the messages and LLM tokens of the sender's running actions.
+
+    The ": subscribed" comment is sent once the subscription is in place, so
+    a client can start the turn after reading it. Only the Rasa server may
+    subscribe: the events are other people's conversations.
+    """
+    sender_id = urllib.parse.unquote(sender_id)
+    hub = get_live_updates()
+    queue = hub.subscribe(sender_id)
+    try:
+        stream = await request.respond(content_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+        await stream.send(": subscribed\n\n")
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), LIVE_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                await stream.send(": keep-alive\n\n")
+                continue
+            await stream.send(sse_event(event))
+    finally:
+        # Runs when the client disconnects and Sanic cancels the handler
+        hub.unsubscribe(sender_id, queue)
+
+
+@metrics_blueprint.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus metrics for the actions and their backends."""
+    body, content_type = render_metrics()
+    if body is None:
+        return response.text("prometheus_client is not installed", status=503)
+    return response.raw(body, content_type=content_type)
+
+
+@reports_blueprint.get("/download_report/<job_id>/status")
+async def report_status(request: Request, job_id: Text):
+    """Progress of a background report job."""
+    job = get_report_queue().get(job_id)
+    if job is None:
+        return response.json({"error": "Unknown or expired report job"}, status=404)
+    return response.json(job.as_dict())
+
+
+@reports_blueprint.get("/download_report/<name>")
+async def download_report(request: Request, name: Text):
+    """Serve the PDF of a report job, waiting a while for it if it is still rendering.
+
+    Answers 202 with the job status if the report is not ready in time. A
+    single `Range: bytes=...` is honoured so interrupted downloads can resume.
+    """
+    job = get_report_queue().get(name[:-4] if name.endswith(".pdf") else name)
+    if job is None:
+        return response.json({"error": "Unknown or expired report job"}, status=404)
+    if not await job.wait(REPORT_DOWNLOAD_WAIT):
+        return response.json(job.as_dict(), status=202, headers={"Retry-After": "5"})
+    if job.status == FAILED:
+        return response.json(job.as_dict(), status=502)
+    if job.path is None:
+        return response.redirect(job.file_url)
+    try:
+        report = open(job.path, "rb")
+    except FileNotFoundError:
+        return response.json({"error": "The report has expired, please generate it again"}, status=410)
+    with report:
+        return await send_file(request, report, job.filename)
+
+
+def byte_range(header: Optional[Text], size: int) -> Optional[Tuple[int, int]]:
+    """First and last byte requested by a single-range Range header.
+
+    None means the whole file (no header, or one this server does not handle,
+    such as several ranges); ValueError means the range is not satisfiable.
+    """
+    match = _BYTE_RANGE.match(header.strip()) if header else None
+    if match is None or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:  # the last N bytes
+        if int(last) == 0:
+            raise ValueError(f"{header} is empty")
+        return max(0, size - int(last)), size - 1
+    if last and int(last) < int(first):
+        return None
+    if int(first) >= size:
+        raise ValueError(f"{header} is outside of {size} bytes")
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+async def send_file(request: Request, f: BinaryIO, filename: Text) -> Optional[HTTPResponse]:
+    """Stream an open PDF in chunks, or the byte range the request asks for."""
+    size = os.fstat(f.fileno()).st_size
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    try:
+        requested = byte_range(request.headers.get("Range"), size)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{size}"
+        return response.empty(status=416, headers=headers)
+    status = 200
+    first, last = 0, size - 1
+    if requested is not None:
+        status = 206
+        first, last = requested
+        headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+    headers["Content-Length"] = str(last - first + 1)
+
+    loop = asyncio.get_running_loop()
+    stream = await request.respond(status=status, headers=headers, content_type="application/pdf")
+    f.seek(first)
+    remaining = last - first + 1
+    while remaining > 0:
+        chunk = await loop.run_in_executor(None, f.read, min(FILE_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        await stream.send(chunk)
+    await stream.eof()
+    return None
+
+
+def create_action_server_app(
+    action_package_name: Text = "actions",
+    cors_origins: Union[Text, List[Text], None] = "*",
+) -> Sanic:
+    """Build the rasa-sdk action server app with this project's routes mounted."""
+    app = create_app(action_package_name, cors_origins=cors_origins)
+    app.blueprint(batch_blueprint)
+    app.blueprint(live_blueprint)
+    app.blueprint(metrics_blueprint)
+    app.blueprint(reports_blueprint)
+
+    @app.listener("before_server_start")
+    async def warm_up(app, loop):
+        # Runs before the socket is served, so /health only answers once warm
+        if ACTIONS_WARM_UP:
+            await warm_up_actions()
+
+    @app.listener("after_server_start")
+    async def start_report_sweeper(app, loop):
+        app.add_task(get_report_store().run_sweeper())
+
+    @app.listener("after_server_start")
+    async def warm_up_llm(app, loop):
+        if os.getenv("LLM_WARM_UP", "true").lower() == "true":
+            app.add_task(get_llm_client().warm_up())
+            llm_cache = get_llm_cache()
+            if llm_cache:
+                llm_cache.warm_up()
+
+    @app.listener("after_server_stop")
+    async def close_clients(app, loop):
+        await get_report_queue().close()
+        await get_analytics().close()
+        await close_api_client()
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the SweatHog action server")
+    parser.add_argument("--port", type=int, default=int(os.getenv("ACTIONS_PORT", DEFAULT_ACTIONS_PORT)))
+    parser.add_argument("--cors", default="*", help="CORS origins to allow")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    args = parser.parse_args()
+
+    configure_logging(logging.DEBUG if args.debug else logging.INFO)
+    app = create_action_server_app(cors_origins=args.cors)
+    logger.info("action_server_started", url=f"http://0.0.0.0:{args.port}")
+    app.run(host=os.getenv("SANIC_HOST", "0.0.0.0"), port=args.port, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# Table-driven validation for the medical_info_form slots.
+#
+# SLOT_SCHEMA declares every required slot once: numeric slots with their
+# allowed range, categorical slots with a synonym map onto the canonical
+# values the prediction payload uses, and the age slot with its brackets.
+# At import the schema is compiled into one validator per slot (frozen
+# lookup tables and per-year arrays), so validating a value is a dict lookup
+# or an array index regardless of the slot. add_slot_validators() turns the
+# compiled validators into the validate_<slot> methods of a form validation
+# action.
+
+import random
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, NamedTuple, Optional, Sequence, Text, Tuple
+
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+from rasa_sdk.types import DomainDict
+
+
+class ValidationResult(NamedTuple):
+    value: Any  # normalized slot value, None if rejected
+    message: Optional[Text]  # what to tell the user, if anything
+
+
+# Age: ten-year brackets, plus one bracket for 100 and over
+AGE_BRACKETS = ("[0-10)", "[10-20)", "[20-30)", "[30-40)", "[40-50)", "[50-60)", "[60-70)", "[70-80)", "[80-90)", "[90-100)")
+AGE_OVER_100_BRACKET = "[90-100)+"
+MAX_AGE = 120
+
+# (upper age bound, encouragement) bands used when confirming an age
+AGE_ENCOURAGEMENT = (
+    (18, ("Great! Youth is on your side for health recovery!", "Young and resilient - that's a positive factor!")),
+    (30, ("Perfect! You're in a great age range for health management!", "Your age works in your favor for diabetes management!")),
+    (50, ("Excellent! Prime time for taking control of your health!", "This is a perfect age to focus on long-term health strategies!")),
+    (70, ("Wise and experienced! Your maturity helps with consistent health management!", "At this stage, your health awareness really pays off!")),
+    (100, ("Admirable! Your longevity shows you know how to take care of yourself!", "Age brings wisdom, especially in health management!")),
+)
+
+AGE_MESSAGES = {
+    "negative": (
+        "Time travel isn't covered by our health assessment! Please enter a valid age.",
+        "I appreciate the creativity, but negative ages aren't in my database! What's your real age?",
+        "Unless you're Benjamin Button, I'll need a positive number for your age!",
+    ),
+    "too_old": (
+        "That's quite an age! Please double-check and enter a realistic age.",
+        "If you've really lived that long, I'd love to know your secrets! But for now, please enter a realistic age.",
+        "That would make you superhuman! I need a more typical human age for accurate assessment.",
+    ),
+    "over_100": (
+        "Wow, {age} years young! You're in the 90+ category. Impressive longevity!",
+        "Amazing! At {age}, you're a true inspiration! You're in our highest age bracket.",
+        "Incredible! {age} years of life experience - you're in the 90+ category.",
+    ),
+    "not_a_number": (
+        "I need a number for your age! Try something like 25, 45, or 67.",
+        "Oops! I need your age as a number. For example: 35 or 62.",
+        "Let me get a numerical age from you - just type a number like 28 or 54!",
+    ),
+}
+
+DRUG_SYNONYMS = {
+    "No": ("no", "none", "not taking", "not prescribed", "never"),
+    "Steady": ("steady", "same", "stable", "unchanged", "no change", "yes"),
+    "Up": ("up", "increased", "higher", "raised"),
+    "Down": ("down", "decreased", "lower", "reduced"),
+}
+DRUG_SLOTS = (
+    "insulin", "metformin", "repaglinide", "nateglinide", "chlorpropamide", "glimepiride",
+    "acetohexamide", "glipizide", "glyburide", "tolbutamide", "pioglitazone", "rosiglitazone",
+)
+
+# Declarative schema: one entry per required slot of medical_info_form
+SLOT_SCHEMA: Dict[Text, Dict[Text, Any]] = {
+    "age": {"kind": "age"},
+    "gender": {
+        "kind": "choice",
+        "label": "gender",
+        "synonyms": {
+            "Male": ("male", "m", "man", "boy", "guy", "gentleman"),
+            "Female": ("female", "f", "woman", "girl", "lady"),
+        },
+        "confirmations": {
+            "Male": (
+                "Got it - Male! Thanks for that info.",
+                "Perfect! Male recorded. Moving forward!",
+                "Excellent! I've noted Male for your demographic info.",
+            ),
+            "Female": (
+                "Got it - Female! Thanks for sharing that.",
+                "Perfect! Female recorded. Continuing on!",
+                "Excellent! I've noted Female for your demographic data.",
+            ),
+        },
+        "help": (
+            "I need either 'Male' or 'Female' for this assessment. Could you clarify?",
+            "Please specify Male or Female for the demographic analysis.",
+            "For this medical assessment, I need Male or Female. Which applies to you?",
+        ),
+    },
+    "race": {
+        "kind": "choice",
+        "label": "race",
+        # Only answers that name one of the model's categories unambiguously
+        # are mapped. Anything else (for instance "Indian" or "Middle
+        # Eastern") is not guessed at: the form asks again with the choices.
+        "synonyms": {
+            "Caucasian": ("caucasian", "white", "european", "irish", "italian", "german", "english", "polish"),
+            "AfricanAmerican": ("african american", "africanamerican", "black"),
+            "Hispanic": ("hispanic", "latino", "latina", "latinx", "mexican", "puerto rican", "cuban"),
+            "Asian": ("asian", "chinese", "japanese", "korean", "filipino", "vietnamese"),
+            "Other": ("other", "native american", "pacific islander", "mixed", "multiracial", "prefer not to say"),
+        },
+    },
+    "time_in_hospital": {"kind": "number", "label": "days in hospital", "min": 1, "max": 365},
+    "admission_type_id": {
+        "kind": "choice",
+        "label": "admission type",
+        "synonyms": {
+            "Emergency": ("emergency", "er", "emergency room", "1"),
+            "Urgent": ("urgent", "urgent care", "2"),
+            "Elective": ("elective", "planned", "scheduled", "3"),
+        },
+    },
+    "discharge_disposition_id": {
+        "kind": "choice",
+        "label": "discharge destination",
+        "synonyms": {
+            "Home": ("home", "discharged home", "went home", "1"),
+            "Skilled Nursing Facility": ("skilled nursing facility", "nursing facility", "nursing home", "snf", "2"),
+            "Rehabilitation": ("rehabilitation", "rehab", "3"),
+            "Long-term Care": ("long-term care", "long term care", "ltc", "4"),
+            "Home Health Care": ("home health care", "home health", "home care", "5"),
+        },
+    },
+    "admission_source_id": {
+        "kind": "choice",
+        "label": "admission source",
+        "synonyms": {
+            "Emergency Room": ("emergency room", "er", "emergency", "emergency department", "ed", "1"),
+            "Physician Referral": ("physician referral", "doctor referral", "referred by doctor", "physician", "2"),
+            "Clinic Referral": ("clinic referral", "clinic", "3"),
+            "Transfer from Hospital": ("transfer from hospital", "hospital transfer", "transfer", "transferred", "4"),
+        },
+    },
+    "num_medications": {"kind": "number", "label": "number of medications", "min": 0, "max": 100},
+    "num_lab_procedures": {"kind": "number", "label": "number of lab procedures", "min": 0, "max": 200},
+    "num_procedures": {"kind": "number", "label": "number of procedures", "min": 0, "max": 50},
+    "number_diagnoses": {"kind": "number", "label": "number of diagnoses", "min": 0, "max": 50},
+    "number_inpatient": {"kind": "number", "label": "number of inpatient visits", "min": 0, "max": 100},
+    "number_outpatient": {"kind": "number", "label": "number of outpatient visits", "min": 0, "max": 100},
+    "number_emergency": {"kind": "number", "label": "number of emergency visits", "min": 0, "max": 100},
+    "diabetesMed": {
+        "kind": "choice",
+        "label": "diabetes medication",
+        "synonyms": {"Yes": ("yes", "y", "true", "1"), "No": ("no", "n", "false", "0")},
+        "confirmations": {
+            "Yes": (
+                "Noted - you are taking diabetes medication. That's important for management!",
+                "Great! Diabetes medication usage recorded. Good job staying on top of treatment!",
+                "Perfect! I've noted that you're on diabetes medication. Consistency is key!",
+            ),
+            "No": (
+                "Noted - you are not taking diabetes medication. We'll factor this into the assessment.",
+                "Got it! No diabetes medication currently. This is important information for the analysis.",
+                "Understood - no diabetes medication at this time. Thanks for the clarification!",
+            ),
+        },
+        "help": (
+            "Please answer Yes or No for diabetes medication. Are you currently taking any?",
+            "I need a Yes or No answer about diabetes medication. Currently taking any?",
+            "Simple Yes or No - are you taking diabetes medication right now?",
+        ),
+    },
+    "change": {
+        "kind": "choice",
+        "label": "medication change",
+        "synonyms": {
+            "No": ("no", "none", "no change", "unchanged"),
+            "Ch": ("ch", "changed", "change"),
+            "Steady": ("steady", "same", "stable"),
+            "Up": ("up", "increased"),
+            "Down": ("down", "decreased"),
+        },
+    },
+    "A1Cresult": {
+        "kind": "choice",
+        "label": "A1C result",
+        "synonyms": {
+            ">8": (">8", "> 8", "above 8", "over 8", "greater than 8"),
+            ">7": (">7", "> 7", "above 7", "over 7", "greater than 7"),
+            "Norm": ("norm", "normal"),
+            "None": ("none", "not tested", "no test", "not measured", "unknown"),
+        },
+    },
+    "max_glu_serum": {
+        "kind": "choice",
+        "label": "max glucose serum",
+        "synonyms": {
+            ">300": (">300", "> 300", "above 300", "over 300", "greater than 300"),
+            ">200": (">200", "> 200", "above 200", "over 200", "greater than 200"),
+            "Norm": ("norm", "normal"),
+            "None": ("none", "not tested", "no test", "not measured", "unknown"),
+        },
+    },
+}
+SLOT_SCHEMA.update(
+    {drug: {"kind": "choice", "label": f"{drug} dosage", "synonyms": DRUG_SYNONYMS} for drug in DRUG_SLOTS}
+)
+
+SlotValidator = Callable[[Any], ValidationResult]
+
+
+def _pick(messages: Optional[Sequence[Text]], **values: Any) -> Optional[Text]:
+    if not messages:
+        return None
+    message = random.choice(messages)
+    return message.format(**values) if values else message
+
+
+def _compile_age(spec: Dict[Text, Any]) -> SlotValidator:
+    # Bracket and encouragement for every whole year below 100, indexed by age
+    brackets = tuple(AGE_BRACKETS[age // 10] for age in range(100))
+    encouragements = tuple(next(text for bound, text in AGE_ENCOURAGEMENT if age < bound) for age in range(100))
+    known_brackets = frozenset(AGE_BRACKETS) | {AGE_OVER_100_BRACKET}
+
+    def validate_age(value: Any) -> ValidationResult:
+        if value in known_brackets:
+            return ValidationResult(value, None)
+        try:
+            age = int(value)
+        except (ValueError, TypeError):
+            return ValidationResult(None, _pick(AGE_MESSAGES["not_a_number"]))
+        if age < 0:
+            return ValidationResult(None, _pick(AGE_MESSAGES["negative"]))
+        if age > MAX_AGE:
+            return ValidationResult(None, _pick(AGE_MESSAGES["too_old"]))
+        if age >= 100:
+            return ValidationResult(AGE_OVER_100_BRACKET, _pick(AGE_MESSAGES["over_100"], age=age))
+        bracket = brackets[age]
+        return ValidationResult(
+            bracket,
+            f"Perfect! You're {age} years old, which puts you in the {bracket} age bracket. {random.choice(encouragements[age])}",
+        )
+
+    return validate_age
+
+
+def _compile_number(spec: Dict[Text, Any]) -> SlotValidator:
+    label, low, high = spec["label"], spec["min"], spec["max"]
+    help_messages = (
+        f"I need a whole number for the {label}. Could you enter it as digits?",
+        f"Please give the {label} as a number, for example {low + 2}.",
+    )
+    range_messages = (
+        f"That doesn't look right for the {label}. Please enter a number between {low} and {high}.",
+        f"The {label} should be between {low} and {high}. Could you double-check it?",
+    )
+
+    def validate_number(value: Any) -> ValidationResult:
+        try:
+            number = float(value)
+        except (ValueError, TypeError):
+            return ValidationResult(None, _pick(help_messages))
+        if not number.is_integer():
+            return ValidationResult(None, _pick(help_messages))
+        if not low <= number <= high:
+            return ValidationResult(None, _pick(range_messages))
+        return ValidationResult(number, None)
+
+    return validate_number
+
+
+def _compile_choice(spec: Dict[Text, Any]) -> SlotValidator:
+    lookup: Mapping[Text, Text] = MappingProxyType(
+        {synonym: canonical for canonical, synonyms in spec["synonyms"].items() for synonym in (canonical.lower(), *synonyms)}
+    )
+    confirmations: Mapping[Text, Tuple[Text, ...]] = MappingProxyType(dict(spec.get("confirmations", {})))
+    options = ", ".join(spec["synonyms"])
+    help_messages = spec.get("help") or (
+        f"I didn't quite catch the {spec['label']}. Please answer with one of: {options}.",
+        f"For the {spec['label']}, I need one of these: {options}. Which applies to you?",
+    )
+
+    def validate_choice(value: Any) -> ValidationResult:
+        if not value:
+            return ValidationResult(None, None)
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)  # numeric codes read from CSV files
+        canonical = lookup.get(str(value).lower().strip())
+        if canonical is None:
+            return ValidationResult(None, _pick(help_messages))
+        return ValidationResult(canonical, _pick(confirmations.get(canonical)))
+
+    return validate_choice
+
+
+_COMPILERS = {"age": _compile_age, "number": _compile_number, "choice": _compile_choice}
+
+SLOT_VALIDATORS: Mapping[Text, SlotValidator] = MappingProxyType(
+    {slot: _COMPILERS[spec["kind"]](spec) for slot, spec in SLOT_SCHEMA.items()}
+)
+
+
+def validate_slot(slot: Text, value: Any) -> ValidationResult:
+    """Validate and normalize one slot value."""
+    return SLOT_VALIDATORS[slot](value)
+
+
+def _validator_method(slot: Text, validator: SlotValidator) -> Callable:
+    def validate(
+        self,
+        slot_value: Any,
+        dispatcher: CollectingDispatcher,
+        tracker: Tracker,
+        domain: DomainDict,
+    ) -> Dict[Text, Any]:
+        result = validator(slot_value)
+        if result.message:
+            dispatcher.utter_message(text=result.message)
+        return {slot: result.value}
+
+    validate.__name__ = f"validate_{slot}"
+    validate.__doc__ = f"Validate and normalize the {slot} slot."
+    return validate
+
+
+def add_slot_validators(cls: type) -> type:
+    """Class decorator adding a validate_<slot> method for every slot in SLOT_SCHEMA."""
+    for slot, validator in SLOT_VALIDATORS.items():
+        if f"validate_{slot}" not in vars(cls):
+            setattr(cls, f"validate_{slot}", _validator_method(slot, validator))
+    return cls
@@ -0,0 +1,184 @@
+# Structured logging for the action server.
+#
+# configure_logging() sends both structlog events and standard library log
+# records through one bounded queue. On the calling coroutine a log call only
+# checks the level, applies sampling and enqueues the event dict; a listener
+# thread does the rest:
+#   - evaluates lazy(...) fields, so costly values are only computed for
+#     events that are written
+#   - redacts medical fields (the form slots and the model payload keys), also
+#     inside nested dicts such as a logged payload
+#   - renders the event as key=value text or JSON and writes it
+# Events logged with sample=<rate> are written with that probability, for
+# high-volume events. When the queue is full, records are dropped and counted
+# rather than blocking the event loop.
+#
+# Without configure_logging() (for instance under `rasa run actions`)
+# structlog events the standard library logger's level lets through are
+# rendered on the spot and handed to whatever handlers it has.
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Text, TextIO
+
+import structlog
+
+from .patient_record import FORM_SLOTS, PatientRecord
+
+
+# Logging configuration (overridable through the environment)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "console").lower()  # console or json
+LOG_REDACT = os.getenv("LOG_REDACT", "true").lower() == "true"
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+# Share of high-volume events (logged with sample=LOG_SAMPLE_RATE) that are written
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+REDACTED = "[redacted]"
+REDACTED_FIELDS = frozenset(FORM_SLOTS) | frozenset(PatientRecord({}).api_payload())
+
+
+class lazy:
+    """A log field that is only computed if its event is written."""
+
+    __slots__ = ("function",)
+
+    def __init__(self, function: Callable[[], Any]):
+        self.function = function
+
+
+def sample(logger: Any, method_name: Text, event_dict: Dict[Text, Any]) -> Dict[Text, Any]:
+    """Drop events logged with sample=<rate> with probability 1 - rate."""
+    rate = event_dict.pop("sample", None)
+    if rate is not None and random.random() >= rate:
+        raise structlog.DropEvent
+    return event_dict
+
+
+def render_lazy(logger: Any, method_name: Text, event_dict: Dict[Text, Any]) -> Dict[Text, Any]:
+    for key, value in event_dict.items():
+        if isinstance(value, lazy):
+            event_dict[key] = value.function()
+    return event_dict
+
+
+def _redact(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: REDACTED if key in REDACTED_FIELDS else _redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+
+def redact_medical_fields(logger: Any, method_name: Text, event_dict: Dict[Text, Any]) -> Dict[Text, Any]:
+    if not LOG_REDACT:
+        return event_dict
+    return _redact(event_dict)
+
+
+def add_record_fields(logger: Any, method_name: Text, event_dict: Dict[Text, Any]) -> Dict[Text, Any]:
+    """Timestamp, level and logger name, taken from the log record when it was created."""
+    record = event_dict.get("_record")
+    if record is not None:
+        event_dict.setdefault("timestamp", datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"))
+        event_dict.setdefault("level", record.levelname.lower())
+        event_dict.setdefault("logger", record.name)
+    return event_dict
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records unformatted, and drops them when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record  # formatted by the listener thread
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Until configure_logging() runs, structlog events are rendered by the caller.
+# Events below the standard library logger's level are dropped first, so a
+# debug event with a large payload costs nothing at INFO.
+structlog.configure(
+    processors=[
+        structlog.stdlib.filter_by_level,
+        structlog.contextvars.merge_contextvars,
+        sample,
+        render_lazy,
+        redact_medical_fields,
+        structlog.processors.KeyValueRenderer(key_order=["event"]),
+    ],
+    logger_factory=structlog.stdlib.LoggerFactory(),
+)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[_QueueHandler] = None
+
+
+def configure_logging(level: int = logging.INFO, stream: Optional[TextIO] = None, fmt: Text = LOG_FORMAT) -> None:
+    """Route structlog and standard library logging through the queue to `stream` (stderr by default)."""
+    global _listener, _handler
+    stop_logging()
+
+    rendering: List[Any] = [
+        add_record_fields,
+        structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+        render_lazy,
+        redact_medical_fields,
+    ]
+    if fmt == "json":
+        rendering += [structlog.processors.format_exc_info, structlog.processors.JSONRenderer()]
+    else:
+        rendering.append(structlog.dev.ConsoleRenderer(colors=False))
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(structlog.stdlib.ProcessorFormatter(processors=rendering))
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_MAX)
+    _handler = _QueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(level)
+    structlog.configure(
+        processors=[
+            structlog.contextvars.merge_contextvars,
+            sample,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        # Calls below `level` return immediately, without building an event
+        wrapper_class=structlog.make_filtering_bound_logger(level),
+        cache_logger_on_first_use=True,
+    )
+
+
+def stop_logging() -> None:
+    """Write out the queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+def get_logger(name: Text) -> Any:
+    return structlog.get_logger(name)
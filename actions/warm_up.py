@@ -0,0 +1,98 @@
+# Start-up warm-up for the action server.
+#
+# The first conversation after a (re)start would otherwise pay for loading the
+# local model, the first pass through the rasa-sdk executor and the slot
+# validators, and creating the shared clients. warm_up_actions() does that
+# work with a synthetic, fully answered medical form before the server takes
+# traffic: actions.server calls it from a before_server_start listener, so
+# /health only answers once it is done. Nothing is sent to the backend.
+
+import os
+import time
+from typing import Any, Dict, List, Text
+
+from rasa_sdk.executor import ActionExecutor
+
+from .actions import ValidateMedicalInfoForm
+from .analytics import get_analytics
+from .local_model import get_local_model
+from .micro_batcher import get_micro_batcher
+from .patient_record import PatientRecord
+from .prediction_cache import get_prediction_cache
+from .report_jobs import get_report_queue
+from .report_store import get_report_store
+from .slot_validation import SLOT_SCHEMA
+from .structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+ACTIONS_WARM_UP = os.getenv("ACTIONS_WARM_UP", "true").lower() == "true"
+
+FORM_NAME = "medical_info_form"
+WARM_UP_SENDER_ID = "action-server-warm-up"
+
+
+def sample_answer(slot: Text) -> Text:
+    """A valid answer for a form slot, as a user would type it."""
+    spec = SLOT_SCHEMA[slot]
+    if spec["kind"] == "age":
+        return "65"
+    if spec["kind"] == "number":
+        return str(spec.get("min", 0) + 1)
+    return next(iter(spec["synonyms"]))
+
+
+def _validation_call() -> Dict[Text, Any]:
+    """The action call Rasa sends once every form slot has just been answered."""
+    answers = {slot: sample_answer(slot) for slot in SLOT_SCHEMA}
+    events: List[Dict[Text, Any]] = [{"event": "user", "text": "warm up", "parse_data": {}}]
+    events.extend({"event": "slot", "name": slot, "value": value} for slot, value in answers.items())
+    return {
+        "next_action": f"validate_{FORM_NAME}",
+        "sender_id": WARM_UP_SENDER_ID,
+        "tracker": {
+            "sender_id": WARM_UP_SENDER_ID,
+            "slots": answers,
+            "latest_message": {"text": "warm up", "intent": {"name": "inform"}, "entities": []},
+            "events": events,
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {"name": FORM_NAME},
+            "latest_action_name": "action_listen",
+        },
+        "domain": {"forms": {FORM_NAME: {"required_slots": list(SLOT_SCHEMA)}}, "slots": {}},
+    }
+
+
+async def warm_up_actions() -> Dict[Text, float]:
+    """Run the synthetic form through validation and the local model; returns seconds per step."""
+    timings: Dict[Text, float] = {}
+
+    def step(name: Text, started: float) -> float:
+        now = time.perf_counter()
+        timings[name] = round(now - started, 4)
+        return now
+
+    started = time.perf_counter()
+    executor = ActionExecutor()
+    executor.register_action(ValidateMedicalInfoForm)
+    result = await executor.run(_validation_call())
+    started = step("form_validation", started)
+
+    slots = {event["name"]: event["value"] for event in (result or {}).get("events", []) if event.get("event") == "slot"}
+    get_local_model().predict_proba(PatientRecord(slots).api_payload())
+    started = step("local_model", started)
+
+    get_analytics()
+    get_prediction_cache()
+    get_micro_batcher()
+    get_report_queue()
+    get_report_store()
+    step("clients", started)
+
+    logger.info(
+        "action_server_warmed_up", total_ms=round(1000 * sum(timings.values())),
+        **{f"{name}_ms": round(1000 * seconds) for name, seconds in timings.items()},
+    )
+    return timings
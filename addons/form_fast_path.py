@@ -0,0 +1,266 @@
+# NLU fast path for bare form answers, for the Rasa server.
+#
+# Inside medical_info_form most user turns are just the answer to the slot
+# that was asked for ("45", "male", "No"). This REST channel checks such
+# answers against patterns compiled from data/nlu.yml before Rasa sees them:
+# numbers for slots whose annotated values are all numeric (bare, or followed
+# by the words the examples put after them, such as "days" or "years old"),
+# and the annotated entity texts (and synonyms) for the others. It only applies while a form is
+# active and the answer fits the slot it requested. A hit is handed to Rasa
+# with its parse data already filled in (the slot's entity, and the intent
+# whose examples annotate that entity), so the NLU model is not run for it.
+# Everything else takes the normal path.
+#
+# A small share of hits is also parsed by the model in the background, to
+# estimate the time saved and check that the model agrees. Counters are
+# served in the Prometheus text format at /webhooks/rest/metrics.
+#
+# Enable it in credentials.yml in place of the `rest:` channel (the webhook
+# URL stays /webhooks/rest/webhook):
+#
+#   addons.form_fast_path.FormFastPathInput:
+
+import asyncio
+import os
+import random
+import re
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Set, Text, Tuple
+
+from rasa.core.channels.channel import UserMessage
+from rasa.core.channels.rest import RestInput
+from rasa.shared.nlu.training_data.loading import load_data
+from rasa.shared.utils.io import read_yaml_file
+from sanic import Blueprint, response
+from sanic.request import Request
+
+from actions.structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Fast path configuration (overridable through the environment)
+FAST_PATH_NLU_DATA = os.getenv("FAST_PATH_NLU_DATA", "data/nlu.yml")
+FAST_PATH_DOMAIN = os.getenv("FAST_PATH_DOMAIN", "domain.yml")
+# Share of hits also parsed by the model, to measure the time saved
+FAST_PATH_SHADOW_RATE = float(os.getenv("FAST_PATH_SHADOW_RATE", "0.02"))
+
+EXTRACTOR_NAME = "FormFastPath"
+REQUESTED_SLOT = "requested_slot"
+
+# A number, optionally followed by its unit ("45", "45 years old", "3 days");
+# the unit has to be one the slot's examples use, so "2 weeks" goes to the model
+_NUMBER_ANSWER = re.compile(r"^(\d{1,4})(?:\s+([a-z][a-z ]*))?$")
+_TRAILING_PUNCTUATION = re.compile(r"[\s.!,;]+$")
+
+
+def normalize(text: Text) -> Text:
+    return _TRAILING_PUNCTUATION.sub("", text.strip().lower())
+
+
+class SlotAnswers:
+    """How to recognise a bare answer for one slot."""
+
+    __slots__ = ("entity", "intent", "numeric", "values", "units")
+
+    def __init__(
+        self, entity: Text, intent: Text, numeric: bool, values: Dict[Text, Text], units: FrozenSet[Text] = frozenset()
+    ):
+        self.entity = entity
+        self.intent = intent
+        self.numeric = numeric
+        self.values = values  # normalized answer text -> entity value
+        self.units = units  # words allowed after a numeric answer
+
+    def _number(self, normalized: Text) -> Optional["re.Match"]:
+        match = _NUMBER_ANSWER.match(normalized)
+        if match is None or (match.group(2) is not None and match.group(2) not in self.units):
+            return None
+        return match
+
+    def could_match(self, normalized: Text) -> bool:
+        if self.numeric:
+            return self._number(normalized) is not None
+        return normalized in self.values
+
+    def match(self, text: Text) -> Optional[Tuple[Text, int, int]]:
+        """(value, start, end) of the answer in `text`, or None."""
+        normalized = normalize(text)
+        if self.numeric:
+            match = self._number(normalized)
+            if match is None:
+                return None
+            start = text.lower().index(match.group(1))
+            return match.group(1), start, start + len(match.group(1))
+        value = self.values.get(normalized)
+        if value is None:
+            return None
+        start = text.lower().index(normalized)
+        return value, start, start + len(normalized)
+
+
+def compile_answers(nlu_data: Text, domain: Text) -> Dict[Text, SlotAnswers]:
+    """Build the answer patterns of every slot filled from an entity annotated in `nlu_data`."""
+    training_data = load_data(nlu_data)
+    surfaces: Dict[Text, Dict[Text, Text]] = {}
+    intents: Dict[Text, Counter] = {}
+    units: Dict[Text, Set[Text]] = {}
+    for example in training_data.entity_examples:
+        text = example.get("text")
+        for entity in example.get("entities") or []:
+            name = entity["entity"]
+            surface = normalize(text[entity["start"]:entity["end"]])
+            value = training_data.entity_synonyms.get(surface, entity["value"])
+            surfaces.setdefault(name, {})[surface] = str(value)
+            intents.setdefault(name, Counter())[example.get("intent")] += 1
+            # "[7](time_in_hospital) days in hospital": "days", "days in" and
+            # "days in hospital" may follow a bare number for this entity
+            if not text[:entity["start"]].strip():
+                words = normalize(text[entity["end"]:]).split()
+                units.setdefault(name, set()).update(" ".join(words[:n]) for n in range(1, len(words) + 1))
+    for synonym, value in training_data.entity_synonyms.items():
+        for values in surfaces.values():
+            if value in values.values():
+                values.setdefault(normalize(synonym), value)
+
+    answers = {}
+    for slot, spec in (read_yaml_file(domain).get("slots") or {}).items():
+        entity = next(
+            (mapping.get("entity") for mapping in spec.get("mappings", []) if mapping.get("type") == "from_entity"),
+            None,
+        )
+        if entity not in surfaces:
+            continue
+        values = surfaces[entity]
+        numeric = all(surface.isdigit() for surface in values)
+        answers[slot] = SlotAnswers(
+            entity, intents[entity].most_common(1)[0][0], numeric, {} if numeric else values,
+            frozenset(units.get(entity, ())) if numeric else frozenset(),
+        )
+    return answers
+
+
+class FastPathStats:
+    """Counters behind /webhooks/rest/metrics."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.fast_path_seconds = 0.0
+        self.shadow_parses = 0
+        self.shadow_seconds = 0.0
+        self.shadow_agreed = 0
+
+    def seconds_saved(self) -> float:
+        """Estimated model time avoided: hits times the mean shadow parse, minus the fast path's own time."""
+        if not self.shadow_parses:
+            return 0.0
+        return max(0.0, self.hits * self.shadow_seconds / self.shadow_parses - self.fast_path_seconds)
+
+    def render(self) -> Text:
+        checked = self.hits + self.misses
+        lines = [
+            "# HELP sweathog_fast_path_answers_total Short user messages checked by the NLU fast path",
+            "# TYPE sweathog_fast_path_answers_total counter",
+            f'sweathog_fast_path_answers_total{{result="hit"}} {self.hits}',
+            f'sweathog_fast_path_answers_total{{result="miss"}} {self.misses}',
+            "# HELP sweathog_fast_path_hit_ratio Share of checked messages that skipped the NLU model",
+            "# TYPE sweathog_fast_path_hit_ratio gauge",
+            f"sweathog_fast_path_hit_ratio {self.hits / checked if checked else 0.0}",
+            "# HELP sweathog_fast_path_seconds_total Time spent on the fast path, including tracker reads",
+            "# TYPE sweathog_fast_path_seconds_total counter",
+            f"sweathog_fast_path_seconds_total {self.fast_path_seconds}",
+            "# HELP sweathog_fast_path_saved_seconds_total Estimated NLU model time saved by fast path hits",
+            "# TYPE sweathog_fast_path_saved_seconds_total counter",
+            f"sweathog_fast_path_saved_seconds_total {self.seconds_saved()}",
+            "# HELP sweathog_fast_path_shadow_parses_total Fast path hits also parsed by the model",
+            "# TYPE sweathog_fast_path_shadow_parses_total counter",
+            f"sweathog_fast_path_shadow_parses_total {self.shadow_parses}",
+            "# HELP sweathog_fast_path_shadow_agreement_ratio Share of shadow parses where the model found the same entity value",
+            "# TYPE sweathog_fast_path_shadow_agreement_ratio gauge",
+            f"sweathog_fast_path_shadow_agreement_ratio {self.shadow_agreed / self.shadow_parses if self.shadow_parses else 0.0}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class FormFastPathInput(RestInput):
+    """The REST channel, with bare form answers parsed without the NLU model."""
+
+    @classmethod
+    def name(cls) -> Text:
+        return "rest"
+
+    def __init__(self, nlu_data: Text = FAST_PATH_NLU_DATA, domain: Text = FAST_PATH_DOMAIN):
+        self.answers = compile_answers(nlu_data, domain)
+        self.stats = FastPathStats()
+        self._app = None
+        logger.info("form_fast_path_loaded", slots=len(self.answers))
+
+    def blueprint(self, on_new_message: Callable[[UserMessage], Awaitable[Any]]) -> Blueprint:
+        async def handle(message: UserMessage) -> Any:
+            await self._fast_path(message)
+            return await on_new_message(message)
+
+        webhook = super().blueprint(handle)
+
+        @webhook.listener("before_server_start")
+        async def remember_app(app, loop):
+            self._app = app
+
+        @webhook.route("/metrics", methods=["GET"])
+        async def metrics(request: Request):
+            return response.text(self.render_metrics(), content_type="text/plain; version=0.0.4")
+
+        return webhook
+
+    def render_metrics(self) -> Text:
+        return self.stats.render()
+
+    async def _fast_path(self, message: UserMessage) -> None:
+        """Fill in the parse data of `message` if it answers the slot the form asked for."""
+        text = message.text or ""
+        if text.startswith("/") or len(text) > 40 or self._app is None:
+            return
+        agent = getattr(self._app.ctx, "agent", None)
+        if agent is None or agent.tracker_store is None:
+            return
+
+        started = time.perf_counter()
+        match = None
+        # Only read the tracker for text that could answer some slot
+        normalized = normalize(text)
+        if any(answers.could_match(normalized) for answers in self.answers.values()):
+            tracker = await agent.tracker_store.retrieve(message.sender_id)
+            if tracker is not None and tracker.active_loop_name:
+                answers = self.answers.get(tracker.get_slot(REQUESTED_SLOT))
+                match = answers.match(text) if answers is not None else None
+        self.stats.fast_path_seconds += time.perf_counter() - started
+        if match is None:
+            self.stats.misses += 1
+            return
+        value, start, end = match
+        message.parse_data = {
+            "text": text,
+            "intent": {"name": answers.intent, "confidence": 1.0},
+            "intent_ranking": [{"name": answers.intent, "confidence": 1.0}],
+            "entities": [
+                {"entity": answers.entity, "value": value, "start": start, "end": end, "extractor": EXTRACTOR_NAME}
+            ],
+        }
+        self.stats.hits += 1
+        if random.random() < FAST_PATH_SHADOW_RATE:
+            asyncio.ensure_future(self._shadow_parse(agent, text, answers.entity, value))
+
+    async def _shadow_parse(self, agent: Any, text: Text, entity: Text, value: Text) -> None:
+        started = time.perf_counter()
+        try:
+            parse_data = await agent.parse_message(text)
+        except Exception as e:
+            logger.warning("form_fast_path_shadow_parse_failed", error_type=type(e).__name__)
+            return
+        self.stats.shadow_parses += 1
+        self.stats.shadow_seconds += time.perf_counter() - started
+        found = {(item.get("entity"), str(item.get("value")).lower()) for item in parse_data.get("entities", [])}
+        if (entity, value.lower()) in found:
+            self.stats.shadow_agreed += 1
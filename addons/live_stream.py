@@ -0,0 +1,181 @@
+# Streaming REST channel with live action updates, for the Rasa server.
+#
+# Rasa's REST channel already streams a turn when the webhook is called with
+# ?stream=true: every bot message is written as one JSON line as soon as Rasa
+# sends it, instead of one JSON array at the end of the turn. Messages of a
+# custom action still arrive only when the action returns, though. This
+# channel also subscribes to the action server's live updates for the sender
+# (GET /live/<sender_id>, see actions/live_updates.py, authenticated with
+# ACTIONS_INTERNAL_TOKEN) for the duration of the turn, and interleaves them
+# into the same stream:
+#   - messages are written the moment the action utters them; Rasa's copy at
+#     the end of the action is dropped (or the live copy, if Rasa's came first)
+#   - LLM reply pieces are written as {"event": "token", "stream_id", "text"}
+#     lines; the full reply follows as a normal message
+# If the action server cannot be reached the turn streams without live
+# updates. Requests without ?stream=true are answered as before.
+#
+# It includes the rate limit and form fast path of addons/rate_limit.py.
+# Enable it in credentials.yml in place of the `rest:` channel:
+#
+#   addons.live_stream.LiveStreamRestInput:
+
+import asyncio
+import json
+import os
+import urllib.parse
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, Text
+
+import aiohttp
+from rasa.core.channels.channel import CollectingOutputChannel, UserMessage
+from sanic import Blueprint
+
+from actions.internal_auth import internal_headers
+from actions.structured_logging import get_logger
+
+from addons.rate_limit import RateLimitedRestInput
+
+
+logger = get_logger(__name__)
+
+# Live stream configuration (overridable through the environment)
+LIVE_UPDATES_URL = os.getenv("LIVE_UPDATES_URL", "http://localhost:5055/live")
+LIVE_CONNECT_TIMEOUT = float(os.getenv("LIVE_CONNECT_TIMEOUT", "1"))
+
+_DONE = "DONE"  # what Rasa's REST channel puts on the queue at the end of a turn
+
+
+def message_key(message: Dict[Text, Any]) -> Text:
+    return json.dumps(message, sort_keys=True, default=str)
+
+
+class LiveStreamRestInput(RateLimitedRestInput):
+    """The rate-limited REST channel, streaming action messages and LLM tokens as they are produced."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.live_turns = 0
+        self.plain_turns = 0
+        self.live_events = 0
+        self.duplicates = 0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=None, connect=LIVE_CONNECT_TIMEOUT)
+            )
+        return self._session
+
+    def blueprint(self, on_new_message: Callable[[UserMessage], Awaitable[Any]]) -> Blueprint:
+        webhook = super().blueprint(on_new_message)
+
+        @webhook.listener("after_server_stop")
+        async def close_session(app, loop):
+            if self._session is not None:
+                await self._session.close()
+
+        return webhook
+
+    async def _subscribe(self, sender_id: Text) -> Optional[aiohttp.ClientResponse]:
+        """Open the sender's live update stream; None if the action server does not answer."""
+        url = f"{LIVE_UPDATES_URL}/{urllib.parse.quote(sender_id, safe='')}"
+        try:
+            live = await self.session.get(url, headers=internal_headers())
+            if live.status != 200:
+                live.release()
+                return None
+            # The first line confirms the subscription, so nothing uttered this turn is missed
+            await asyncio.wait_for(live.content.readline(), LIVE_CONNECT_TIMEOUT)
+            return live
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug("live_updates_unavailable", sender_id=sender_id, error=str(e))
+            return None
+
+    @staticmethod
+    async def _read_live(live: aiohttp.ClientResponse, queue: asyncio.Queue) -> None:
+        async for line in live.content:
+            if line.startswith(b"data: "):
+                await queue.put(("live", json.loads(line[len(b"data: "):])))
+
+    def stream_response(
+        self,
+        on_new_message: Callable[[UserMessage], Awaitable[Any]],
+        text: Text,
+        sender_id: Text,
+        input_channel: Text,
+        metadata: Optional[Dict[Text, Any]],
+    ) -> Callable[[Any], Awaitable[None]]:
+        async def stream(resp: Any) -> None:
+            queue: asyncio.Queue = asyncio.Queue()
+            live = await self._subscribe(sender_id)
+            task = asyncio.ensure_future(
+                self.on_message_wrapper(on_new_message, text, queue, sender_id, input_channel, metadata)
+            )
+            # A turn that fails never puts DONE on the queue
+            task.add_done_callback(lambda _: queue.put_nowait(_DONE))
+            reader = asyncio.ensure_future(self._read_live(live, queue)) if live is not None else None
+            if live is not None:
+                self.live_turns += 1
+            else:
+                self.plain_turns += 1
+
+            # Messages sent from one source and still expected from the other
+            from_live: Counter = Counter()
+            from_rasa: Counter = Counter()
+            try:
+                while True:
+                    item = await queue.get()
+                    if item == _DONE:
+                        break
+                    if not isinstance(item, tuple):
+                        key = message_key(item)
+                        if from_live[key]:
+                            from_live[key] -= 1
+                            self.duplicates += 1
+                            continue
+                        from_rasa[key] += 1
+                        await resp.write(json.dumps(item) + "\n")
+                        continue
+
+                    event = item[1]
+                    self.live_events += 1
+                    if event.get("event") == "token":
+                        await resp.write(json.dumps({"recipient_id": sender_id, **event}) + "\n")
+                        continue
+                    # Split and shape the message exactly as Rasa's REST output does
+                    collector = CollectingOutputChannel()
+                    await collector.send_response(sender_id, {k: v for k, v in event.items() if k != "event"})
+                    for message in collector.messages:
+                        key = message_key(message)
+                        if from_rasa[key]:
+                            from_rasa[key] -= 1
+                            self.duplicates += 1
+                            continue
+                        from_live[key] += 1
+                        await resp.write(json.dumps(message) + "\n")
+            finally:
+                if reader is not None:
+                    reader.cancel()
+                if live is not None:
+                    live.close()
+            await task
+
+        return stream
+
+    def render_metrics(self) -> Text:
+        lines = [
+            "# HELP sweathog_stream_turns_total Streamed turns, by whether live action updates were available",
+            "# TYPE sweathog_stream_turns_total counter",
+            f'sweathog_stream_turns_total{{live="true"}} {self.live_turns}',
+            f'sweathog_stream_turns_total{{live="false"}} {self.plain_turns}',
+            "# HELP sweathog_stream_live_events_total Live messages and LLM tokens received from the action server",
+            "# TYPE sweathog_stream_live_events_total counter",
+            f"sweathog_stream_live_events_total {self.live_events}",
+            "# HELP sweathog_stream_duplicates_total Messages not written again because the other source sent them first",
+            "# TYPE sweathog_stream_duplicates_total counter",
+            f"sweathog_stream_duplicates_total {self.duplicates}",
+        ]
+        return super().render_metrics() + "\n".join(lines) + "\n"
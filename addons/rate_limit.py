@@ -0,0 +1,67 @@
+# Rate-limited REST channel for the Rasa server.
+#
+# The REST channel with the form fast path (addons/form_fast_path.py), plus a
+# per-sender token bucket on /webhooks/rest/webhook: a sender that posts more
+# than RATE_LIMIT_MESSAGES gets 429 Too Many Requests with a Retry-After
+# header, before the message reaches NLU or any action. The buckets are those
+# of actions/rate_limit.py ("message" class); with RATE_LIMIT_BACKEND=redis
+# they are shared with the action server and between Rasa server replicas.
+#
+# Enable it in credentials.yml in place of the `rest:` channel (the webhook
+# URL stays /webhooks/rest/webhook):
+#
+#   addons.rate_limit.RateLimitedRestInput:
+
+import math
+from typing import Any, Awaitable, Callable, Optional, Text
+
+from rasa.core.channels.channel import UserMessage
+from sanic import Blueprint, response
+from sanic.request import Request
+from sanic.response import HTTPResponse
+
+from actions.rate_limit import get_rate_limiter
+from actions.structured_logging import get_logger
+from addons.form_fast_path import FormFastPathInput
+
+
+logger = get_logger(__name__)
+
+MESSAGE_CLASS = "message"
+
+
+class RateLimitedRestInput(FormFastPathInput):
+    """The fast-path REST channel, with a per-sender message rate limit."""
+
+    def blueprint(self, on_new_message: Callable[[UserMessage], Awaitable[Any]]) -> Blueprint:
+        webhook = super().blueprint(on_new_message)
+
+        @webhook.middleware("request")
+        async def limit_sender(request: Request) -> Optional[HTTPResponse]:
+            if request.method != "POST" or not request.path.endswith("/webhook"):
+                return None
+            try:
+                sender_id = self._extract_sender(request)
+            except Exception:
+                return None  # malformed bodies are rejected by the handler
+            wait = await get_rate_limiter().check(MESSAGE_CLASS, sender_id)
+            if wait <= 0:
+                return None
+            logger.info("sender_rate_limited", sender_id=sender_id, wait=round(wait, 1))
+            return response.json(
+                {"error": "Too many messages, please slow down", "retry_after": math.ceil(wait)},
+                status=429,
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+        return webhook
+
+    def render_metrics(self) -> Text:
+        counts = get_rate_limiter().stats()["by_class"].get(MESSAGE_CLASS, {})
+        lines = [
+            "# HELP sweathog_rest_messages_rate_limited_total Webhook messages checked against the per-sender limit",
+            "# TYPE sweathog_rest_messages_rate_limited_total counter",
+            f'sweathog_rest_messages_rate_limited_total{{result="allowed"}} {counts.get("allowed", 0)}',
+            f'sweathog_rest_messages_rate_limited_total{{result="limited"}} {counts.get("limited", 0)}',
+        ]
+        return super().render_metrics() + "\n".join(lines) + "\n"
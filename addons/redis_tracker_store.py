@@ -0,0 +1,227 @@
+# Redis tracker store for the Rasa server, with conversation compaction.
+#
+# Every conversation is kept in two keys: a list of zlib-compressed JSON
+# chunks holding its events (one chunk per save, so a save only writes the
+# events added since the last one) and a small hash with the number of stored
+# events. Once a conversation grows past a threshold, everything before the
+# most recent turns is replaced by a snapshot - a session start that carries
+# the slot values and active form over - so loading a long-lived session does
+# not replay thousands of events. Both keys expire after a period of
+# inactivity.
+#
+# Enable it in endpoints.yml:
+#
+#   tracker_store:
+#     type: addons.redis_tracker_store.CompactingRedisTrackerStore
+#     url: localhost
+#     port: 6379
+
+import json
+import os
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Text
+
+import redis
+from rasa.core.brokers.broker import EventBroker
+from rasa.core.tracker_store import TrackerStore
+from rasa.shared.core.constants import ACTION_LISTEN_NAME, ACTION_SESSION_START_NAME
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.events import ActionExecuted, ActiveLoop, Event, SessionStarted, SlotSet, UserUttered
+from rasa.shared.core.trackers import DialogueStateTracker
+
+from actions.structured_logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Tracker store configuration (overridable through the environment)
+TRACKER_STORE_KEY_PREFIX = os.getenv("TRACKER_STORE_KEY_PREFIX", "sweathog:tracker:")
+TRACKER_STORE_TTL = int(os.getenv("TRACKER_STORE_TTL", "604800"))
+TRACKER_COMPACT_AFTER = int(os.getenv("TRACKER_COMPACT_AFTER", "400"))
+TRACKER_COMPACT_KEEP = int(os.getenv("TRACKER_COMPACT_KEEP", "100"))
+TRACKER_COMPRESSION_LEVEL = int(os.getenv("TRACKER_COMPRESSION_LEVEL", "1"))
+
+# Parts of a user message's parse data that no policy reads
+UNUSED_PARSE_DATA = ("intent_ranking", "response_selector")
+
+
+def pack_events(events: Iterable[Event], level: int = TRACKER_COMPRESSION_LEVEL) -> bytes:
+    """Serialise events into one compressed chunk (None fields and rankings are dropped)."""
+    dicts = []
+    for event in events:
+        data = {key: value for key, value in event.as_dict().items() if value is not None}
+        parse_data = data.get("parse_data")
+        if parse_data:
+            data["parse_data"] = {key: value for key, value in parse_data.items() if key not in UNUSED_PARSE_DATA}
+        dicts.append(data)
+    return zlib.compress(json.dumps(dicts, separators=(",", ":")).encode("utf-8"), level)
+
+
+def unpack_events(chunk: bytes) -> List[Event]:
+    events = []
+    for data in json.loads(zlib.decompress(chunk)):
+        event = Event.from_parameters(data)
+        if event is not None:
+            events.append(event)
+    return events
+
+
+class CompactingRedisTrackerStore(TrackerStore):
+    """Stores conversations in Redis as appended event chunks, compacted once they grow long."""
+
+    def __init__(
+        self,
+        domain: Domain,
+        host: Text = "localhost",
+        port: int = 6379,
+        db: int = 0,
+        username: Optional[Text] = None,
+        password: Optional[Text] = None,
+        use_ssl: bool = False,
+        event_broker: Optional[EventBroker] = None,
+        record_exp: Optional[float] = None,
+        key_prefix: Optional[Text] = None,
+        compact_after: Optional[int] = None,
+        compact_keep: Optional[int] = None,
+        compression_level: Optional[int] = None,
+        fakeredis: bool = False,
+        client: Optional[Any] = None,
+        **kwargs: Dict[Text, Any],
+    ) -> None:
+        if client is None:
+            if fakeredis:
+                import fakeredis as fake  # local experiments and benchmarks only
+
+                client = fake.FakeStrictRedis()
+            else:
+                client = redis.StrictRedis(
+                    host=host or "localhost", port=port, db=db, username=username, password=password, ssl=use_ssl
+                )
+        self.red = client
+        self.key_prefix = key_prefix or TRACKER_STORE_KEY_PREFIX
+        self.record_exp = int(record_exp if record_exp is not None else TRACKER_STORE_TTL)
+        self.compact_after = compact_after or TRACKER_COMPACT_AFTER
+        self.compact_keep = min(compact_keep or TRACKER_COMPACT_KEEP, self.compact_after)
+        self.compression_level = TRACKER_COMPRESSION_LEVEL if compression_level is None else compression_level
+        super().__init__(domain, event_broker, **kwargs)
+
+    def _events_key(self, sender_id: Text) -> Text:
+        return f"{self.key_prefix}{sender_id}:events"
+
+    def _meta_key(self, sender_id: Text) -> Text:
+        return f"{self.key_prefix}{sender_id}:meta"
+
+    async def keys(self) -> Iterable[Text]:
+        suffix = len(":meta")
+        return [
+            key.decode("utf-8")[len(self.key_prefix):-suffix]
+            for key in self.red.scan_iter(match=f"{self.key_prefix}*:meta", count=1000)
+        ]
+
+    async def exists(self, conversation_id: Text) -> bool:
+        return bool(self.red.exists(self._meta_key(conversation_id)))
+
+    async def retrieve(self, sender_id: Text) -> Optional[DialogueStateTracker]:
+        chunks = self.red.lrange(self._events_key(sender_id), 0, -1)
+        if not chunks:
+            return None
+        events = [event for chunk in chunks for event in unpack_events(chunk)]
+        return DialogueStateTracker.from_events(
+            sender_id, events, slots=self.domain.slots, max_event_history=self.max_event_history
+        )
+
+    async def retrieve_full_tracker(self, conversation_id: Text) -> Optional[DialogueStateTracker]:
+        # Compacted turns are gone; the stored events are the full tracker
+        return await self.retrieve(conversation_id)
+
+    async def save(self, tracker: DialogueStateTracker) -> None:
+        sender_id = tracker.sender_id
+        events_key, meta_key = self._events_key(sender_id), self._meta_key(sender_id)
+        events = list(tracker.events)
+        if not events:
+            return
+
+        meta = self.red.hgetall(meta_key)
+        stored = int(meta.get(b"count", 0))
+        # The tracker continues what is stored if the last stored event is where
+        # we left it; otherwise (events replaced through the API, a tracker
+        # saved again after compaction) the conversation is rewritten.
+        appending = (
+            0 < stored <= len(events)
+            and repr(events[stored - 1].timestamp) == meta.get(b"last_timestamp", b"").decode("utf-8")
+        )
+        new_events = events[stored:]
+        self._publish(sender_id, new_events if appending else self._unpublished(events, meta))
+        if appending and not new_events:
+            return
+
+        pipe = self.red.pipeline()
+        if len(events) > self.compact_after:
+            events = self._compact(sender_id, events)
+            appending = False
+        if appending:
+            pipe.rpush(events_key, pack_events(new_events, self.compression_level))
+        else:
+            pipe.delete(events_key)
+            pipe.rpush(events_key, pack_events(events, self.compression_level))
+        pipe.hset(meta_key, mapping={"count": len(events), "last_timestamp": repr(events[-1].timestamp)})
+        if self.record_exp:
+            pipe.expire(events_key, self.record_exp)
+            pipe.expire(meta_key, self.record_exp)
+        pipe.execute()
+
+    @staticmethod
+    def _unpublished(events: List[Event], meta: Dict[bytes, bytes]) -> List[Event]:
+        """Events of a rewritten conversation that the broker has not seen yet.
+
+        After a compaction the stored count no longer matches the tracker, but
+        the last stored event is still the last one published, so only what
+        follows it is new.
+        """
+        last_timestamp = meta.get(b"last_timestamp")
+        if last_timestamp is None:
+            return events
+        last_timestamp = last_timestamp.decode("utf-8")
+        for index in range(len(events) - 1, -1, -1):
+            if repr(events[index].timestamp) == last_timestamp:
+                return events[index + 1:]
+        # Events replaced through the API: whatever is newer than the stored ones
+        return [event for event in events if event.timestamp > float(last_timestamp)]
+
+    def _publish(self, sender_id: Text, events: List[Event]) -> None:
+        if self.event_broker is None:
+            return
+        for event in events:
+            body = {"sender_id": sender_id}
+            body.update(event.as_dict())
+            self.event_broker.publish(body)
+
+    def _compact(self, sender_id: Text, events: List[Event]) -> List[Event]:
+        """Replace all but the last `compact_keep` events (from a user turn on) with a snapshot."""
+        cut = next(
+            (
+                index
+                for index in range(len(events) - self.compact_keep, len(events))
+                if isinstance(events[index], UserUttered)
+            ),
+            None,
+        )
+        if not cut:
+            return events
+
+        state = DialogueStateTracker.from_events(sender_id, events[:cut], slots=self.domain.slots)
+        timestamp = events[cut - 1].timestamp
+        snapshot: List[Event] = [
+            ActionExecuted(ACTION_SESSION_START_NAME, timestamp=timestamp),
+            SessionStarted(timestamp=timestamp),
+        ]
+        snapshot.extend(
+            SlotSet(name, slot.value, timestamp=timestamp)
+            for name, slot in state.slots.items()
+            if slot.value != slot.initial_value
+        )
+        if state.active_loop_name:
+            snapshot.append(ActiveLoop(state.active_loop_name, timestamp=timestamp))
+        snapshot.append(ActionExecuted(ACTION_LISTEN_NAME, timestamp=timestamp))
+        logger.debug("tracker_compacted", sender_id=sender_id, events_before=len(events), events_after=len(snapshot) + len(events) - cut)
+        return snapshot + events[cut:]
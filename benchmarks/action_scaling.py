@@ -0,0 +1,233 @@
+# Load test of the action server alone, at several worker counts.
+#
+# Starts actions.cluster with 1, 2, 4, ... workers and has concurrent
+# simulated conversations post action calls straight to its /webhook, the
+# way Rasa does: a series of medical form validations followed by the
+# readmission prediction, all under one sender ID. Reports action throughput
+# and latency per worker count, so the scaling with CPU cores is visible
+# without the Rasa server becoming the bottleneck.
+#
+# Usage:
+#   python -m benchmarks.action_scaling --start-stubs
+#   python -m benchmarks.action_scaling --workers 1 2 4 8 --clients 64 --duration 30 --start-stubs
+#   python -m benchmarks.action_scaling --start-stubs --save-baseline benchmarks/baselines/action_scaling.json
+
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Text
+
+import aiohttp
+import yaml
+
+from actions.slot_validation import SLOT_SCHEMA
+from benchmarks.common import compare_to_baseline, print_table, save_baseline, summarize
+from benchmarks.load_test import start_stubs
+
+
+FORM_NAME = "medical_info_form"
+PREDICT_ACTION = "action_predict_diabetes_readmission"
+VALIDATE_ACTION = f"validate_{FORM_NAME}"
+
+
+def answer(slot: Text, rng: random.Random) -> Any:
+    """A valid answer for a form slot."""
+    spec = SLOT_SCHEMA[slot]
+    if spec["kind"] == "age":
+        return str(rng.randint(18, 95))
+    if spec["kind"] == "number":
+        return str(rng.randint(int(spec.get("min", 0)), int(spec.get("min", 0)) + 20))
+    return rng.choice(list(spec["synonyms"]))
+
+
+def action_call(
+    action: Text, sender_id: Text, slots: Dict[Text, Any], domain: Dict[Text, Any], new_slot: Optional[Text] = None
+) -> Dict[Text, Any]:
+    """The body Rasa posts to the action server for `action`."""
+    events: List[Dict[Text, Any]] = [{"event": "user", "text": str(slots.get(new_slot, "")), "parse_data": {}}]
+    if new_slot:
+        events.append({"event": "slot", "name": new_slot, "value": slots[new_slot]})
+    return {
+        "next_action": action,
+        "sender_id": sender_id,
+        "tracker": {
+            "sender_id": sender_id,
+            "slots": slots,
+            "latest_message": {"text": str(slots.get(new_slot, "")), "intent": {"name": "inform"}, "entities": []},
+            "events": events,
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {"name": FORM_NAME} if new_slot else {},
+            "latest_action_name": "action_listen",
+        },
+        "domain": domain,
+        "version": "3.6.21",
+    }
+
+
+async def simulated_conversation(
+    session: aiohttp.ClientSession,
+    webhook_url: Text,
+    domain: Dict[Text, Any],
+    deadline: float,
+    rng: random.Random,
+    latencies: List[float],
+    errors: List[int],
+) -> None:
+    """Fill the form slot by slot, then ask for the prediction, until the deadline."""
+    while time.monotonic() < deadline:
+        sender_id = f"scaling-{uuid.uuid4().hex[:12]}"
+        slots: Dict[Text, Any] = {slot: None for slot in SLOT_SCHEMA}
+        calls = []
+        for slot in SLOT_SCHEMA:
+            slots[slot] = answer(slot, rng)
+            calls.append(action_call(VALIDATE_ACTION, sender_id, dict(slots), domain, new_slot=slot))
+        calls.append(action_call(PREDICT_ACTION, sender_id, slots, domain))
+
+        for body in calls:
+            if time.monotonic() >= deadline:
+                return
+            started = time.perf_counter()
+            try:
+                async with session.post(webhook_url, json=body) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors[0] += 1
+
+
+def start_cluster(workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, LLM_WARM_UP="false")
+    return subprocess.Popen(
+        [sys.executable, "-m", "actions.cluster", "--workers", str(workers), "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_for_cluster(url: Text, workers: int, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{url}/health") as response:
+                    if response.status == 200:
+                        status = await response.json()
+                        if sum(1 for worker in status["workers"] if worker["healthy"]) == workers:
+                            return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"Action cluster with {workers} workers did not start")
+
+
+async def measure(workers: int, args: argparse.Namespace, domain: Dict[Text, Any]) -> Dict[Text, float]:
+    url = f"http://127.0.0.1:{args.port}"
+    cluster = start_cluster(workers, args.port)
+    try:
+        await wait_for_cluster(url, workers)
+        latencies: List[float] = []
+        errors = [0]
+        rng = random.Random(args.seed)
+        connector = aiohttp.TCPConnector(limit=args.clients)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+            started = time.monotonic()
+            deadline = started + args.duration
+            await asyncio.gather(
+                *(
+                    simulated_conversation(
+                        session, f"{url}/webhook", domain, deadline, random.Random(rng.random()), latencies, errors
+                    )
+                    for _ in range(args.clients)
+                )
+            )
+            elapsed = time.monotonic() - started
+    finally:
+        cluster.send_signal(signal.SIGTERM)
+        cluster.wait(timeout=60)
+
+    summary = summarize(latencies)
+    return {
+        "actions_per_s": round(len(latencies) / elapsed, 1),
+        "p50": summary["p50"],
+        "p95": summary["p95"],
+        "p99": summary["p99"],
+        "errors": errors[0],
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[Text, Dict[Text, float]]:
+    with open(args.domain, "r", encoding="utf-8") as f:
+        domain = yaml.safe_load(f)
+    rows: Dict[Text, Dict[Text, float]] = {}
+    for workers in args.workers:
+        print(f"Running {args.clients} conversations for {args.duration:g}s against {workers} worker(s)...")
+        row = await measure(workers, args, domain)
+        first = next(iter(rows.values()), row)
+        row["speedup"] = round(row["actions_per_s"] / first["actions_per_s"], 2) if first["actions_per_s"] else 0.0
+        rows[f"workers={workers}"] = row
+    return rows
+
+
+def main() -> None:
+    cores = os.cpu_count() or 1
+    default_workers = sorted({1, *(n for n in (2, 4, 8, 16) if n <= cores), cores})
+
+    parser = argparse.ArgumentParser(description="Measure action throughput against the number of action workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers, help="Worker counts to measure")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent simulated conversations")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per worker count")
+    parser.add_argument("--port", type=int, default=5155, help="Port for the cluster under test")
+    parser.add_argument("--domain", default="domain.yml")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start-stubs", action="store_true", help="Start benchmarks/stub_services.py for the run")
+    parser.add_argument("--stub-predict-latency-ms", type=float, default=50)
+    parser.add_argument("--stub-token-delay-ms", type=float, default=20)
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    stubs = start_stubs(args) if args.start_stubs else None
+    try:
+        rows = asyncio.run(run(args))
+    finally:
+        if stubs is not None:
+            stubs.terminate()
+
+    print_table(
+        f"Action throughput by worker count ({cores} cores, latency in ms)",
+        rows,
+        columns=("actions_per_s", "speedup", "p50", "p95", "p99", "errors"),
+    )
+    metrics = {}
+    for name, row in rows.items():
+        workers = name.split("=")[1]
+        metrics[f"workers_{workers}_actions_per_s"] = row["actions_per_s"]
+        metrics[f"workers_{workers}_p95_ms"] = row["p95"]
+    if args.save_baseline:
+        save_baseline(args.save_baseline, metrics, {"cores": cores, "clients": args.clients, "rows": rows})
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, metrics, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# Prediction latency of well-behaved users next to an abusive client, with
+# and without rate limiting and admission control.
+#
+# Starts the stub services with a prediction backend that serves only
+# --capacity predictions at a time, and an action server per variant. Two
+# kinds of traffic post the prediction action straight to the action
+# server's /webhook, the way Rasa does:
+#   abusive - --abusive concurrent loops under one sender ID
+#   users   - --users concurrent loops, each call from a new sender, as many
+#             people finishing the form at once
+# Variants:
+#   unprotected  - no rate limits, no admission gate
+#   rate_limited - per-sender limits (actions/rate_limit.py), no gate
+#   protected    - per-sender limits and the prediction admission gate
+#                  (actions/admission.py)
+# Micro-batching is switched off so that every prediction takes one backend
+# slot. For each kind of traffic the table shows the action latency, the
+# share answered by the prediction API (rather than the local model) and the
+# share turned away by the rate limit.
+#
+# Usage:
+#   python -m benchmarks.admission_control
+#   python -m benchmarks.admission_control --users 24 --abusive 48 --capacity 4 --duration 20
+#   python -m benchmarks.admission_control --save-baseline benchmarks/baselines/admission_control.json
+
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Text
+
+import aiohttp
+import yaml
+
+from actions.slot_validation import SLOT_SCHEMA
+from benchmarks.action_scaling import PREDICT_ACTION, action_call, answer
+from benchmarks.common import compare_to_baseline, print_table, save_baseline, summarize
+
+
+VARIANTS = ("unprotected", "rate_limited", "protected")
+
+
+def variant_env(variant: Text, args: argparse.Namespace) -> Dict[Text, Text]:
+    env = dict(
+        os.environ,
+        LLM_WARM_UP="false",
+        ANALYTICS_SINK="none",
+        PREDICT_BATCH_WINDOW_MS="0",
+        PREDICT_MAX_CONCURRENCY=str(args.gate_concurrency if variant == "protected" else 0),
+        PREDICT_MAX_WAIT=str(args.gate_wait),
+    )
+    if variant == "unprotected":
+        env["RATE_LIMIT_PREDICTIONS"] = "0"
+    return env
+
+
+def start_action_server(variant: Text, args: argparse.Namespace) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "actions.server", "--port", str(args.port)],
+        env=variant_env(variant, args),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_for_server(url: Text, server: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise SystemExit(f"actions.server exited with status {server.returncode}")
+            try:
+                async with session.get(f"{url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"actions.server did not answer /health within {timeout:g}s")
+
+
+def outcome(body: Dict[Text, Any]) -> Text:
+    """api, cache or local from the prediction slot the action set; limited if it set none."""
+    for event in body.get("events", []):
+        if event.get("event") == "slot" and isinstance(event.get("value"), dict):
+            return event["value"].get("source", "local")
+    return "limited"
+
+
+async def client(
+    session: aiohttp.ClientSession,
+    webhook_url: Text,
+    domain: Dict[Text, Any],
+    deadline: float,
+    rng: random.Random,
+    sender_id: Text,
+    results: List[Any],
+) -> None:
+    """Post predictions until the deadline; a new sender per call unless `sender_id` is given."""
+    while time.monotonic() < deadline:
+        slots = {slot: answer(slot, rng) for slot in SLOT_SCHEMA}
+        body = action_call(PREDICT_ACTION, sender_id or f"user-{uuid.uuid4().hex[:12]}", slots, domain)
+        started = time.perf_counter()
+        try:
+            async with session.post(webhook_url, json=body) as response:
+                result = outcome(await response.json()) if response.status == 200 else "error"
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            result = "error"
+        results.append((time.perf_counter() - started, result))
+
+
+def traffic_row(results: List[Any]) -> Dict[Text, float]:
+    answered = [seconds for seconds, result in results if result != "error"]
+    summary = summarize(answered)
+    count = max(1, len(results))
+    return {
+        "calls": len(results),
+        "p50": summary["p50"],
+        "p95": summary["p95"],
+        "p99": summary["p99"],
+        "api_share": round(sum(1 for _, result in results if result in ("api", "cache")) / count, 3),
+        "limited_share": round(sum(1 for _, result in results if result == "limited") / count, 3),
+        "errors": sum(1 for _, result in results if result == "error"),
+    }
+
+
+async def measure(variant: Text, args: argparse.Namespace, domain: Dict[Text, Any]) -> Dict[Text, Dict[Text, float]]:
+    url = f"http://127.0.0.1:{args.port}"
+    server = start_action_server(variant, args)
+    try:
+        await wait_for_server(url, server)
+        rng = random.Random(args.seed)
+        abusive: List[Any] = []
+        users: List[Any] = []
+        connector = aiohttp.TCPConnector(limit=args.users + args.abusive)
+        timeout = aiohttp.ClientTimeout(total=120)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            deadline = time.monotonic() + args.duration
+            abuser = f"abusive-{uuid.uuid4().hex[:8]}"
+            await asyncio.gather(
+                *(client(session, f"{url}/webhook", domain, deadline, random.Random(rng.random()), abuser, abusive)
+                  for _ in range(args.abusive)),
+                *(client(session, f"{url}/webhook", domain, deadline, random.Random(rng.random()), "", users)
+                  for _ in range(args.users)),
+            )
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    return {f"{variant}/users": traffic_row(users), f"{variant}/abusive": traffic_row(abusive)}
+
+
+async def run(args: argparse.Namespace) -> Dict[Text, Dict[Text, float]]:
+    with open(args.domain, "r", encoding="utf-8") as f:
+        domain = yaml.safe_load(f)
+    rows: Dict[Text, Dict[Text, float]] = {}
+    for variant in args.variants:
+        print(f"Running {variant} for {args.duration:g}s ({args.users} users, {args.abusive} abusive loops)...")
+        rows.update(await measure(variant, args, domain))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prediction latency under an abusive client, with and without protection")
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument("--users", type=int, default=32, help="Concurrent well-behaved clients, a new sender per call")
+    parser.add_argument("--abusive", type=int, default=48, help="Concurrent loops of the abusive sender")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per variant")
+    parser.add_argument("--capacity", type=int, default=4, help="Predictions the stub backend serves at a time")
+    parser.add_argument("--predict-latency-ms", type=float, default=100, help="Stub backend time per prediction")
+    parser.add_argument("--gate-concurrency", type=int, default=4, help="PREDICT_MAX_CONCURRENCY of the protected variant")
+    parser.add_argument("--gate-wait", type=float, default=0.5, help="PREDICT_MAX_WAIT of the protected variant")
+    parser.add_argument("--port", type=int, default=5156, help="Port for the action server under test")
+    parser.add_argument("--domain", default="domain.yml")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    stubs = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.stub_services",
+            "--predict-latency-ms", str(args.predict_latency_ms), "--predict-capacity", str(args.capacity),
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    time.sleep(1.0)
+    try:
+        rows = asyncio.run(run(args))
+    finally:
+        stubs.terminate()
+
+    print_table(
+        f"Prediction action under abuse (backend capacity {args.capacity}, latency in ms)",
+        rows,
+        columns=("calls", "p50", "p95", "p99", "api_share", "limited_share", "errors"),
+    )
+    metrics = {f"{name.replace('/', '_')}_p99_ms": row["p99"] for name, row in rows.items() if name.endswith("/users")}
+    if args.save_baseline:
+        save_baseline(args.save_baseline, metrics, {"rows": rows, "capacity": args.capacity})
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, metrics, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Helpers shared by the benchmark scripts: latency summaries and baselines.
+#
+# A baseline is a JSON file holding a flat {metric: value} map. Metrics whose
+# name ends in "_per_s" are throughputs (higher is better); everything else is
+# treated as a latency or cost (lower is better).
+
+import json
+import math
+import os
+import platform
+import time
+from typing import Any, Dict, List, Optional, Sequence, Text
+
+
+def percentile(sorted_samples: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted samples (q in 0..100)."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, min(len(sorted_samples) - 1, math.ceil(q / 100.0 * len(sorted_samples)) - 1))
+    return sorted_samples[rank]
+
+
+def summarize(samples: Sequence[float], scale: float = 1000.0) -> Dict[Text, float]:
+    """count/mean/p50/p95/p99/max of `samples`, scaled (seconds to ms by default)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(ordered),
+        "mean": round(scale * sum(ordered) / len(ordered), 3),
+        "p50": round(scale * percentile(ordered, 50), 3),
+        "p95": round(scale * percentile(ordered, 95), 3),
+        "p99": round(scale * percentile(ordered, 99), 3),
+        "max": round(scale * ordered[-1], 3),
+    }
+
+
+def save_baseline(path: Text, metrics: Dict[Text, float], details: Optional[Dict[Text, Any]] = None) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "host": platform.node(),
+                "python": platform.python_version(),
+                "metrics": metrics,
+                "details": details or {},
+            },
+            f,
+            indent=2,
+        )
+
+
+def compare_to_baseline(path: Text, metrics: Dict[Text, float], tolerance: float) -> List[Text]:
+    """Return a description of every metric that regressed by more than `tolerance` (0.2 = 20%)."""
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["metrics"]
+
+    regressions = []
+    for name, expected in baseline.items():
+        actual = metrics.get(name)
+        if actual is None or not expected:
+            continue
+        if name.endswith("_per_s"):
+            regressed = actual < expected * (1 - tolerance)
+        else:
+            regressed = actual > expected * (1 + tolerance)
+        if regressed:
+            regressions.append(f"{name}: {actual:g} vs baseline {expected:g} ({100.0 * (actual - expected) / expected:+.1f}%)")
+    return regressions
+
+
+def print_table(title: Text, rows: Dict[Text, Dict[Text, float]], columns: Sequence[Text] = ("count", "mean", "p50", "p95", "p99", "max")) -> None:
+    if not rows:
+        return
+    width = max(len(name) for name in rows) + 2
+    widths = [max(10, len(column) + 2) for column in columns]
+    print(f"\n{title}")
+    print("".join([f"{'':<{width}}"] + [f"{column:>{w}}" for column, w in zip(columns, widths)]))
+    for name, values in rows.items():
+        cells = [f"{values[column]:>{w}g}" if column in values else " " * w for column, w in zip(columns, widths)]
+        print("".join([f"{name:<{width}}"] + cells))
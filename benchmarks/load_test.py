@@ -0,0 +1,330 @@
+# Load test for the full chat pipeline (Rasa server + action server).
+#
+# Replays the conversation paths from the story files against Rasa's REST
+# webhook with N concurrent simulated users. Stories that only list intents
+# get a training example for each intent from data/nlu.yml, and stories that
+# open medical_info_form are continued with one answer per required slot so
+# the prediction action runs at the end. Per-action latency is taken from
+# the action server's /metrics endpoint.
+#
+# Usage (Rasa on :5005 and the action server on :5055 already running):
+#   python -m benchmarks.load_test --users 20 --duration 60 --start-stubs
+#   python -m benchmarks.load_test --users 20 --save-baseline benchmarks/baselines/rest_20_users.json
+#   python -m benchmarks.load_test --users 20 --baseline benchmarks/baselines/rest_20_users.json
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Text, Tuple
+
+import aiohttp
+import yaml
+
+from benchmarks.common import compare_to_baseline, print_table, save_baseline, summarize
+
+
+DEFAULT_STORY_FILES = ["tests/test_stories.yml", "data/stories.yml"]
+FORM_NAME = "medical_info_form"
+
+_ENTITY_ANNOTATION = re.compile(r"\[([^\]]+)\](?:\((\w+)(?::[^)]*)?\)|\{\"entity\":\s*\"(\w+)\"[^}]*\})")
+
+
+class Scenario(NamedTuple):
+    name: Text
+    turns: List[Tuple[Text, Text]]  # (label, message text)
+
+
+def _strip_annotations(example: Text) -> Text:
+    return _ENTITY_ANNOTATION.sub(lambda match: match.group(1), example).strip()
+
+
+def load_nlu_examples(nlu_path: Text) -> Tuple[Dict[Text, Text], Dict[Text, Text]]:
+    """Return the first example of every intent and the first example annotating every entity."""
+    with open(nlu_path, "r", encoding="utf-8") as f:
+        nlu = yaml.safe_load(f).get("nlu", [])
+
+    by_intent: Dict[Text, Text] = {}
+    by_entity: Dict[Text, Text] = {}
+    for block in nlu:
+        if "intent" not in block:
+            continue
+        examples = [line[2:].strip() for line in block.get("examples", "").splitlines() if line.strip().startswith("- ")]
+        if examples:
+            by_intent.setdefault(block["intent"], _strip_annotations(examples[0]))
+        for example in examples:
+            for match in _ENTITY_ANNOTATION.finditer(example):
+                by_entity.setdefault(match.group(2) or match.group(3), _strip_annotations(example))
+    return by_intent, by_entity
+
+
+def load_scenarios(story_files: List[Text], nlu_path: Text, domain_path: Text) -> List[Scenario]:
+    """Turn the stories into lists of user messages to replay."""
+    by_intent, by_entity = load_nlu_examples(nlu_path)
+    with open(domain_path, "r", encoding="utf-8") as f:
+        required_slots = yaml.safe_load(f).get("forms", {}).get(FORM_NAME, {}).get("required_slots", [])
+    form_turns = [(f"form:{slot}", by_entity[slot]) for slot in required_slots if slot in by_entity]
+
+    scenarios = []
+    for path in story_files:
+        with open(path, "r", encoding="utf-8") as f:
+            stories = yaml.safe_load(f).get("stories", [])
+        for story in stories:
+            turns: List[Tuple[Text, Text]] = []
+            for step in story.get("steps", []):
+                if "user" in step:
+                    turns.append((step.get("intent") or "user", step["user"].strip()))
+                elif "intent" in step and step["intent"] in by_intent:
+                    turns.append((step["intent"], by_intent[step["intent"]]))
+                elif step.get("active_loop") == FORM_NAME:
+                    turns.extend(form_turns)
+            if turns:
+                scenarios.append(Scenario(f"{path}:{story.get('story', len(scenarios))}", turns))
+    return scenarios
+
+
+class TurnResult(NamedTuple):
+    scenario: Text
+    label: Text
+    seconds: float
+    ok: bool
+
+
+async def simulated_user(
+    session: aiohttp.ClientSession,
+    webhook_url: Text,
+    scenarios: List[Scenario],
+    deadline: float,
+    think_time: float,
+    rng: random.Random,
+    results: List[TurnResult],
+    conversations: List[int],
+) -> None:
+    """Replay random scenarios, each in a fresh conversation, until the deadline."""
+    while time.monotonic() < deadline:
+        scenario = rng.choice(scenarios)
+        sender = f"loadtest-{uuid.uuid4().hex[:12]}"
+        for label, text in scenario.turns:
+            if time.monotonic() >= deadline:
+                return
+            started = time.perf_counter()
+            try:
+                async with session.post(webhook_url, json={"sender": sender, "message": text}) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            results.append(TurnResult(scenario.name, label, time.perf_counter() - started, ok))
+            if think_time:
+                await asyncio.sleep(rng.uniform(0, 2 * think_time))
+        conversations[0] += 1
+
+
+async def scrape_action_histograms(metrics_url: Text) -> Optional[Dict[Text, Dict[Text, Any]]]:
+    """Read the per-action latency histograms from the action server, if reachable."""
+    try:
+        from prometheus_client.parser import text_string_to_metric_families
+    except ImportError:
+        return None
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(metrics_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                if response.status != 200:
+                    return None
+                text = await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+
+    actions: Dict[Text, Dict[Text, Any]] = defaultdict(lambda: {"buckets": {}, "count": 0.0, "sum": 0.0})
+    # Samples are summed so the per-worker series of actions.cluster add up
+    for family in text_string_to_metric_families(text):
+        if family.name != "sweathog_action_duration_seconds":
+            continue
+        for sample in family.samples:
+            action = sample.labels.get("action")
+            if sample.name.endswith("_bucket"):
+                buckets = actions[action]["buckets"]
+                bound = float(sample.labels["le"])
+                buckets[bound] = buckets.get(bound, 0.0) + sample.value
+            elif sample.name.endswith("_count"):
+                actions[action]["count"] += sample.value
+            elif sample.name.endswith("_sum"):
+                actions[action]["sum"] += sample.value
+    return dict(actions)
+
+
+def action_latency_delta(
+    before: Dict[Text, Dict[Text, Any]], after: Dict[Text, Dict[Text, Any]]
+) -> Dict[Text, Dict[Text, float]]:
+    """Mean and bucket-resolution p50/p95/p99 (ms) of each action during the run."""
+    rows = {}
+    for action, current in after.items():
+        previous = before.get(action, {"buckets": {}, "count": 0.0, "sum": 0.0})
+        count = current["count"] - previous["count"]
+        if count <= 0:
+            continue
+        buckets = sorted(
+            (bound, current["buckets"][bound] - previous["buckets"].get(bound, 0.0)) for bound in current["buckets"]
+        )
+        row = {"count": count, "mean": round(1000.0 * (current["sum"] - previous["sum"]) / count, 3)}
+        for name, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            bound = next((bound for bound, cumulative in buckets if cumulative >= q * count), float("inf"))
+            row[name] = round(1000.0 * bound, 3)
+        rows[action] = row
+    return rows
+
+
+def start_stubs(args: argparse.Namespace) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.stub_services",
+            "--predict-latency-ms", str(args.stub_predict_latency_ms),
+            "--token-delay-ms", str(args.stub_token_delay_ms),
+        ]
+    )
+    time.sleep(1.0)
+    return process
+
+
+async def run(args: argparse.Namespace) -> Dict[Text, Any]:
+    scenarios = load_scenarios(args.stories, args.nlu, args.domain)
+    if args.scenario:
+        scenarios = [s for s in scenarios if any(name in s.name for name in args.scenario)]
+    if not scenarios:
+        raise SystemExit("No scenarios to replay")
+    print(f"Replaying {len(scenarios)} scenarios with {args.users} users for {args.duration}s against {args.webhook_url}")
+
+    metrics_before = await scrape_action_histograms(args.metrics_url)
+    results: List[TurnResult] = []
+    conversations = [0]
+    rng = random.Random(args.seed)
+    timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+    connector = aiohttp.TCPConnector(limit=args.users)
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(
+            *(
+                simulated_user(
+                    session, args.webhook_url, scenarios, deadline, args.think_time,
+                    random.Random(rng.random()), results, conversations,
+                )
+                for _ in range(args.users)
+            )
+        )
+        elapsed = time.monotonic() - started
+
+    metrics_after = await scrape_action_histograms(args.metrics_url)
+
+    ok_latencies = [r.seconds for r in results if r.ok]
+    by_label: Dict[Text, List[float]] = defaultdict(list)
+    for r in results:
+        if r.ok:
+            by_label[r.label].append(r.seconds)
+
+    overall = summarize(ok_latencies)
+    report = {
+        "users": args.users,
+        "duration_s": round(elapsed, 2),
+        "turns": len(results),
+        "errors": sum(1 for r in results if not r.ok),
+        "conversations": conversations[0],
+        "turns_per_s": round(len(ok_latencies) / elapsed, 2) if elapsed else 0.0,
+        "conversations_per_s": round(conversations[0] / elapsed, 3) if elapsed else 0.0,
+        "turn_latency_ms": overall,
+        "turn_latency_by_step_ms": {label: summarize(samples) for label, samples in sorted(by_label.items())},
+        "action_latency_ms": (
+            action_latency_delta(metrics_before, metrics_after)
+            if metrics_before is not None and metrics_after is not None
+            else None
+        ),
+    }
+    return report
+
+
+def baseline_metrics(report: Dict[Text, Any]) -> Dict[Text, float]:
+    """The numbers a baseline stores and later runs are compared against."""
+    metrics = {
+        "turns_per_s": report["turns_per_s"],
+        "turn_p50_ms": report["turn_latency_ms"]["p50"],
+        "turn_p95_ms": report["turn_latency_ms"]["p95"],
+        "turn_p99_ms": report["turn_latency_ms"]["p99"],
+    }
+    for action, row in (report["action_latency_ms"] or {}).items():
+        metrics[f"{action}_p95_ms"] = row["p95"]
+    return metrics
+
+
+def print_report(report: Dict[Text, Any]) -> None:
+    print(
+        f"\n{report['turns']} turns ({report['errors']} errors) in {report['duration_s']}s: "
+        f"{report['turns_per_s']} turns/s, {report['conversations_per_s']} conversations/s"
+    )
+    print_table("Turn latency (ms)", {"all turns": report["turn_latency_ms"], **report["turn_latency_by_step_ms"]})
+    if report["action_latency_ms"] is None:
+        print("\nAction latency unavailable (action server /metrics not reachable)")
+    elif report["action_latency_ms"]:
+        print_table(
+            "Action latency (ms, p-values at histogram bucket resolution)",
+            report["action_latency_ms"],
+            columns=("count", "mean", "p50", "p95", "p99"),
+        )
+    else:
+        print("\nNo custom actions ran during the test")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the chat pipeline through Rasa's REST webhook")
+    parser.add_argument("--webhook-url", default="http://localhost:5005/webhooks/rest/webhook")
+    parser.add_argument("--metrics-url", default="http://localhost:5055/metrics", help="Action server metrics endpoint")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to run")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between a user's turns, in seconds")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--stories", nargs="+", default=DEFAULT_STORY_FILES)
+    parser.add_argument("--nlu", default="data/nlu.yml")
+    parser.add_argument("--domain", default="domain.yml")
+    parser.add_argument("--scenario", action="append", help="Only replay stories whose name contains this (repeatable)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start-stubs", action="store_true", help="Start benchmarks/stub_services.py for the run")
+    parser.add_argument("--stub-predict-latency-ms", type=float, default=50)
+    parser.add_argument("--stub-token-delay-ms", type=float, default=20)
+    parser.add_argument("--output", help="Write the full report as JSON")
+    parser.add_argument("--save-baseline", help="Store this run as a baseline")
+    parser.add_argument("--baseline", help="Compare against a stored baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    stubs = start_stubs(args) if args.start_stubs else None
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        if stubs is not None:
+            stubs.terminate()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, baseline_metrics(report), details=report)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, baseline_metrics(report), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# Per-turn logging overhead of a prediction turn, before and after structured logging.
+#
+# Replays the log calls of one ActionPredictDiabetesReadmission turn (form
+# completed, prediction request, payload, result) many times and measures the
+# time they take on the calling thread, which is what the chat turn pays:
+#   before     - the former calls: f-strings through logging.basicConfig, with
+#                the payload serialized by json.dumps(indent=2) at INFO
+#   after      - the calls in actions/actions.py through
+#                structured_logging.configure_logging() at INFO
+#   after_debug - the same at DEBUG, where the (redacted) payload is written
+# Each variant runs in a fresh interpreter, writing to a temporary file. The
+# time for the listener thread to write out what is still queued after the
+# last turn is reported as drain_ms.
+#
+# Usage:
+#   python -m benchmarks.logging_overhead
+#   python -m benchmarks.logging_overhead --turns 20000
+#   python -m benchmarks.logging_overhead --save-baseline benchmarks/baselines/logging_overhead.json
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Text
+
+from benchmarks.common import compare_to_baseline, print_table, save_baseline, summarize
+
+
+VARIANTS = ("before", "after", "after_debug")
+API_PREDICT_ENDPOINT = "http://localhost:8080/predict"
+
+
+def _payload() -> Dict[Text, object]:
+    from actions.patient_record import PatientRecord
+    from actions.slot_validation import SLOT_SCHEMA
+    from actions.warm_up import sample_answer
+
+    return PatientRecord({slot: sample_answer(slot) for slot in SLOT_SCHEMA}).api_payload()
+
+
+def run_variant(variant: Text, turns: int, path: Text) -> Dict[Text, float]:
+    payload = _payload()
+    samples: List[float] = []
+    with open(path, "w") as stream:
+        if variant == "before":
+            logging.basicConfig(
+                stream=stream, level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s - %(message)s"
+            )
+            logger = logging.getLogger("actions.actions")
+            for turn in range(turns):
+                started = time.perf_counter()
+                logger.info(f"Medical data collected: {len(payload)} fields populated")
+                logger.info(f"Sending prediction request to API: {API_PREDICT_ENDPOINT}")
+                logger.info(f"Payload: {json.dumps(payload, indent=2)}")
+                logger.info(f"AI Prediction completed successfully: MODERATE risk, confidence: {turn % 100 / 100}")
+                samples.append(time.perf_counter() - started)
+            drain = 0.0
+        else:
+            from actions.structured_logging import LOG_SAMPLE_RATE, configure_logging, get_logger, stop_logging
+
+            configure_logging(logging.DEBUG if variant == "after_debug" else logging.INFO, stream=stream)
+            logger = get_logger("actions.actions")
+            for turn in range(turns):
+                started = time.perf_counter()
+                logger.info("medical_data_collected", filled_fields=len(payload))
+                logger.info("prediction_request", endpoint=API_PREDICT_ENDPOINT, sample=LOG_SAMPLE_RATE)
+                logger.debug("prediction_payload", payload=payload)
+                logger.info("prediction_completed", source="api", risk_level="MODERATE", confidence=turn % 100 / 100)
+                samples.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            stop_logging()
+            drain = time.perf_counter() - started
+
+    latency = summarize(samples, scale=1e6)
+    return {
+        "mean": latency["mean"],
+        "p50": latency["p50"],
+        "p95": latency["p95"],
+        "p99": latency["p99"],
+        "drain_ms": round(1000 * drain, 1),
+        "bytes_per_turn": round(os.path.getsize(path) / turns),
+    }
+
+
+def run_child(variant: Text, turns: int) -> Dict[Text, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        command = [
+            sys.executable, "-m", "benchmarks.logging_overhead", "--child", variant,
+            "--turns", str(turns), "--output", os.path.join(directory, "log.txt"),
+        ]
+        stdout = subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(stdout.decode("utf-8").strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Logging overhead per prediction turn, before and after structured logging")
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_variant(args.child, args.turns, args.output)))
+        return
+
+    rows = {variant: run_child(variant, args.turns) for variant in args.variants}
+    print_table(
+        f"Logging per turn ({args.turns} turns, microseconds on the calling thread)",
+        rows,
+        columns=("mean", "p50", "p95", "p99", "drain_ms", "bytes_per_turn"),
+    )
+    metrics = {f"{variant}_p95_us": row["p95"] for variant, row in rows.items()}
+    if args.save_baseline:
+        save_baseline(args.save_baseline, metrics, {"rows": rows, "turns": args.turns})
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, metrics, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# Latency, memory and accuracy of the NLU pipeline profiles.
+#
+# Splits data/nlu.yml into a training and a held-out test set, trains an NLU
+# model for every profile (config.yml and config-low-latency.yml by default)
+# on the training part and parses every test message with it. Training and
+# evaluation run in fresh interpreters, so the memory footprint of the loaded
+# model is measured alone.
+# Reports training time, per-message inference latency, peak memory, model
+# size, and intent and entity F1 on the test set.
+#
+# Usage:
+#   python -m benchmarks.nlu_profiles
+#   python -m benchmarks.nlu_profiles --configs config.yml config-low-latency.yml --test-fraction 0.2
+#   python -m benchmarks.nlu_profiles --save-baseline benchmarks/baselines/nlu_profiles.json
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Set, Text, Tuple
+
+from benchmarks.common import compare_to_baseline, print_table, save_baseline, summarize
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def _entity_spans(entities: List[Dict[Text, Any]]) -> Set[Tuple[int, int, Text]]:
+    return {(entity["start"], entity["end"], entity["entity"]) for entity in entities or []}
+
+
+def _f1(true_positives: int, predicted: int, expected: int) -> float:
+    precision = true_positives / predicted if predicted else 0.0
+    recall = true_positives / expected if expected else 0.0
+    return 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+
+def split(nlu_data: Text, test_fraction: float, seed: int):
+    from rasa.shared.nlu.training_data.loading import load_data
+
+    return load_data(nlu_data).train_test_split(train_frac=1 - test_fraction, random_seed=seed)
+
+
+def train_profile(config: Text, args: argparse.Namespace) -> Dict[Text, Any]:
+    """Train `config` on the training split into args.output."""
+    from rasa.model_training import train_nlu
+
+    train_data, _ = split(args.nlu, args.test_fraction, args.seed)
+    train_path = os.path.join(args.output, "nlu_train.yml")
+    train_data.persist_nlu(train_path)
+    started = time.perf_counter()
+    model_path = train_nlu(config, train_path, args.output, fixed_model_name="profile", domain=args.domain)
+    return {"model": model_path, "train_s": round(time.perf_counter() - started, 1)}
+
+
+def evaluate_profile(model_path: Text, args: argparse.Namespace) -> Dict[Text, float]:
+    """Parse every held-out message with the model and score the results."""
+    from rasa.core.agent import Agent
+    from sklearn.metrics import f1_score
+
+    _, test_data = split(args.nlu, args.test_fraction, args.seed)
+    rss_before_load = _peak_rss_mb()
+    agent = Agent.load(model_path)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(agent.parse_message("hello"))  # builds the inference graph
+
+    latencies: List[float] = []
+    expected_intents: List[Text] = []
+    predicted_intents: List[Text] = []
+    entity_hits = entity_predicted = entity_expected = 0
+    for example in test_data.nlu_examples:
+        started = time.perf_counter()
+        result = loop.run_until_complete(agent.parse_message(example.get("text")))
+        latencies.append(time.perf_counter() - started)
+
+        expected_intents.append(example.get("intent"))
+        predicted_intents.append((result.get("intent") or {}).get("name"))
+        expected = _entity_spans(example.get("entities"))
+        predicted = _entity_spans(result.get("entities"))
+        entity_hits += len(expected & predicted)
+        entity_predicted += len(predicted)
+        entity_expected += len(expected)
+    loop.close()
+
+    latency = summarize(latencies)
+    return {
+        "p50": latency["p50"],
+        "p95": latency["p95"],
+        "p99": latency["p99"],
+        "rss_mb": round(_peak_rss_mb(), 1),
+        "model_rss_mb": round(_peak_rss_mb() - rss_before_load, 1),
+        "model_mb": round(os.path.getsize(model_path) / (1024.0 * 1024.0), 2),
+        "intent_f1": round(f1_score(expected_intents, predicted_intents, average="weighted", zero_division=0), 4),
+        "entity_f1": round(_f1(entity_hits, entity_predicted, entity_expected), 4),
+        "messages": len(latencies),
+    }
+
+
+def run_child(mode: Text, target: Text, args: argparse.Namespace, output: Text) -> Dict[Text, Any]:
+    command = [
+        sys.executable, "-m", "benchmarks.nlu_profiles", f"--{mode}-child", target, "--output", output,
+        "--nlu", args.nlu, "--domain", args.domain,
+        "--test-fraction", str(args.test_fraction), "--seed", str(args.seed),
+    ]
+    stdout = subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(stdout.decode("utf-8").strip().splitlines()[-1])
+
+
+def run_profile(config: Text, args: argparse.Namespace) -> Dict[Text, float]:
+    """Train and evaluate one profile, each in its own interpreter."""
+    with tempfile.TemporaryDirectory() as output:
+        trained = run_child("train", config, args, output)
+        row = run_child("evaluate", trained["model"], args, output)
+    row["train_s"] = trained["train_s"]
+    return row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare NLU pipeline profiles on held-out data/nlu.yml examples")
+    parser.add_argument("--configs", nargs="+", default=["config.yml", "config-low-latency.yml"])
+    parser.add_argument("--nlu", default="data/nlu.yml")
+    parser.add_argument("--domain", default="domain.yml")
+    parser.add_argument("--test-fraction", type=float, default=0.2, help="Share of the examples held out for testing")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--train-child", help=argparse.SUPPRESS)
+    parser.add_argument("--evaluate-child", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.train_child:
+        print(json.dumps(train_profile(args.train_child, args)))
+        return
+    if args.evaluate_child:
+        print(json.dumps(evaluate_profile(args.evaluate_child, args)))
+        return
+
+    rows: Dict[Text, Dict[Text, float]] = {}
+    for config in args.configs:
+        print(f"Training and evaluating {config}...")
+        rows[config] = run_profile(config, args)
+
+    print_table(
+        "NLU profiles (latency in ms per message, memory in MB)",
+        rows,
+        columns=("train_s", "p50", "p95", "p99", "rss_mb", "model_rss_mb", "model_mb", "intent_f1", "entity_f1"),
+    )
+    metrics = {}
+    for config, row in rows.items():
+        name = os.path.splitext(os.path.basename(config))[0].replace("-", "_")
+        metrics[f"{name}_p95_ms"] = row["p95"]
+        metrics[f"{name}_rss_mb"] = row["rss_mb"]
+        # F1 is stored as an error rate so that higher counts as a regression
+        metrics[f"{name}_intent_error"] = round(1 - row["intent_f1"], 4)
+        metrics[f"{name}_entity_error"] = round(1 - row["entity_f1"], 4)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, metrics, {"rows": rows, "test_fraction": args.test_fraction, "seed": args.seed})
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, metrics, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
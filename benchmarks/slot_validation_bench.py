@@ -0,0 +1,94 @@
+# Microbenchmark for the medical_info_form slot validators.
+#
+# Times every slot's validator on accepted and rejected inputs, both through
+# the compiled validator (validate_slot) and through the form action's
+# validate_<slot> method with a dispatcher, plus a full pass over all slots.
+#
+# Usage:
+#   python -m benchmarks.slot_validation_bench
+#   python -m benchmarks.slot_validation_bench --save-baseline benchmarks/baselines/slot_validation.json
+#   python -m benchmarks.slot_validation_bench --baseline benchmarks/baselines/slot_validation.json
+
+import argparse
+import sys
+import timeit
+from typing import Any, Callable, Dict, Text
+
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions.actions import ValidateMedicalInfoForm
+from actions.slot_validation import SLOT_SCHEMA, validate_slot
+from benchmarks.common import compare_to_baseline, print_table, save_baseline
+
+
+# One accepted and one rejected input per slot kind
+SAMPLE_VALUES = {
+    "age": ("45", "abc"),
+    "number": ("7", "-3"),
+    "choice": (None, "definitely not an option"),  # accepted value taken from the schema
+}
+
+
+def _samples(slot: Text) -> Dict[Text, Any]:
+    spec = SLOT_SCHEMA[slot]
+    accepted, rejected = SAMPLE_VALUES[spec["kind"]]
+    if spec["kind"] == "choice":
+        accepted = next(iter(spec["synonyms"].values()))[0].upper()
+    return {"accepted": accepted, "rejected": rejected}
+
+
+def _time_ns(function: Callable[[], Any], repeat: int, number: int) -> float:
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number * 1e9
+
+
+def run(repeat: int, number: int) -> Dict[Text, Dict[Text, float]]:
+    form = ValidateMedicalInfoForm()
+    dispatcher = CollectingDispatcher()
+    rows: Dict[Text, Dict[Text, float]] = {}
+
+    for slot in SLOT_SCHEMA:
+        samples = _samples(slot)
+        method = getattr(form, f"validate_{slot}")
+        row = {}
+        for case, value in samples.items():
+            row[f"{case}_ns"] = round(_time_ns(lambda: validate_slot(slot, value), repeat, number), 1)
+        row["method_ns"] = round(
+            _time_ns(lambda: method(samples["accepted"], dispatcher, None, {}), repeat, number), 1
+        )
+        dispatcher.messages.clear()
+        rows[slot] = row
+
+    record = {slot: _samples(slot)["accepted"] for slot in SLOT_SCHEMA}
+    full_pass = _time_ns(lambda: [validate_slot(slot, value) for slot, value in record.items()], repeat, max(1, number // 10))
+    rows["all slots"] = {"accepted_ns": round(full_pass, 1)}
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the form slot validators")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20000, help="Calls per timing")
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    rows = run(args.repeat, args.number)
+    print_table("Validator cost (ns per call, best of repeats)", rows, columns=("accepted_ns", "rejected_ns", "method_ns"))
+
+    metrics = {f"{slot}_{name}": value for slot, row in rows.items() for name, value in row.items()}
+    if args.save_baseline:
+        save_baseline(args.save_baseline, metrics)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, metrics, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
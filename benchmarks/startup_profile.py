@@ -0,0 +1,182 @@
+# Start-up profile of the action server and the Rasa server.
+#
+# Every part is measured in a fresh interpreter, so nothing is imported yet:
+#   actions - importing rasa-sdk and each actions module in the order the
+#             executor loads them, then the warm-up steps (actions/warm_up.py)
+#   server  - seconds from launching actions.server until /health answers
+#   rasa    - importing Rasa, loading the latest model with the load time of
+#             every graph component, and the first and second message parse
+# The Rasa part is skipped when Rasa or a trained model is not available.
+#
+# Usage:
+#   python -m benchmarks.startup_profile
+#   python -m benchmarks.startup_profile --model models/20250716-223904.tar.gz
+#   python -m benchmarks.startup_profile --skip-rasa --save-baseline benchmarks/baselines/startup.json
+
+import argparse
+import asyncio
+import importlib
+import importlib.util
+import json
+import os
+import pkgutil
+import re
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Optional, Text
+
+from benchmarks.common import compare_to_baseline, print_table, save_baseline
+
+
+def profile_actions() -> Dict[Text, float]:
+    """Import cost of rasa-sdk and of each actions module, then the warm-up steps."""
+    timings: Dict[Text, float] = {}
+    started = time.perf_counter()
+    importlib.import_module("rasa_sdk.executor")
+
+    timings["import rasa_sdk"] = time.perf_counter() - started
+
+    import actions
+
+    for module in pkgutil.iter_modules(actions.__path__):
+        started = time.perf_counter()
+        importlib.import_module(f"actions.{module.name}")
+        timings[f"import actions.{module.name}"] = time.perf_counter() - started
+
+    from actions.warm_up import warm_up_actions
+
+    for step, seconds in asyncio.run(warm_up_actions()).items():
+        timings[f"warm-up {step}"] = seconds
+    return timings
+
+
+def profile_rasa(model: Optional[Text]) -> Dict[Text, float]:
+    """Import Rasa, load a model timing each graph component, and parse twice."""
+    timings: Dict[Text, float] = {}
+    started = time.perf_counter()
+    from rasa.core.agent import Agent
+    from rasa.engine import graph
+    from rasa.model import get_latest_model
+
+    timings["import rasa"] = time.perf_counter() - started
+
+    components: Dict[Text, float] = {}
+    load_component = graph.GraphNode._load_component
+
+    def timed_load_component(node, **kwargs):
+        component_started = time.perf_counter()
+        try:
+            return load_component(node, **kwargs)
+        finally:
+            name = getattr(node, "_node_name", type(node).__name__)
+            components[name] = components.get(name, 0.0) + time.perf_counter() - component_started
+
+    graph.GraphNode._load_component = timed_load_component
+
+    started = time.perf_counter()
+    agent = Agent.load(model or get_latest_model("models"))
+    timings["load model"] = time.perf_counter() - started
+    for name, seconds in sorted(components.items(), key=lambda item: -item[1]):
+        timings[f"component {name}"] = seconds
+
+    loop = asyncio.new_event_loop()
+    for attempt in ("first parse", "second parse"):
+        started = time.perf_counter()
+        loop.run_until_complete(agent.parse_message("hello"))
+        timings[attempt] = time.perf_counter() - started
+    loop.close()
+    return timings
+
+
+def run_child(part: Text, model: Optional[Text] = None) -> Dict[Text, float]:
+    command = [sys.executable, "-m", "benchmarks.startup_profile", "--child", part]
+    if model:
+        command += ["--model", model]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, env=dict(os.environ, LLM_WARM_UP="false")).stdout
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def profile_server(port: int, timeout: float = 120) -> Dict[Text, float]:
+    """Seconds from launching actions.server until /health answers."""
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "actions.server", "--port", str(port)],
+        env=dict(os.environ, LLM_WARM_UP="false"),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return {"time to /health": time.perf_counter() - started}
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            if server.poll() is not None:
+                raise SystemExit(f"actions.server exited with status {server.returncode}")
+            time.sleep(0.05)
+        raise SystemExit(f"actions.server did not answer /health within {timeout:g}s")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def rasa_available(model: Optional[Text]) -> bool:
+    if importlib.util.find_spec("rasa") is None:
+        return False
+    return bool(model) or (os.path.isdir("models") and any(name.endswith(".tar.gz") for name in os.listdir("models")))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profile the start-up of the action server and the Rasa server")
+    parser.add_argument("--model", help="Rasa model to load (default: the latest in models/)")
+    parser.add_argument("--port", type=int, default=5156, help="Port for the action server under test")
+    parser.add_argument("--skip-rasa", action="store_true")
+    parser.add_argument("--child", choices=("actions", "rasa"), help=argparse.SUPPRESS)
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    if args.child:
+        timings = profile_actions() if args.child == "actions" else profile_rasa(args.model)
+        print(json.dumps(timings))
+        return
+
+    parts: Dict[Text, Dict[Text, float]] = {
+        "actions": run_child("actions"),
+        "server": profile_server(args.port),
+    }
+    if not args.skip_rasa:
+        if rasa_available(args.model):
+            parts["rasa"] = run_child("rasa", args.model)
+        else:
+            print("Rasa or a trained model is not available, skipping the Rasa profile")
+
+    metrics = {}
+    for part, timings in parts.items():
+        rows = {name: {"ms": round(1000 * seconds, 1)} for name, seconds in timings.items()}
+        print_table(f"Start-up: {part} (ms)", rows, columns=("ms",))
+        for name, row in rows.items():
+            metrics[f"{part}_{re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')}_ms"] = row["ms"]
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, metrics)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, metrics, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
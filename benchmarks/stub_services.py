@@ -0,0 +1,167 @@
+# Stub versions of the external services the action server talks to.
+#
+# Serves a fake prediction backend (/predict, /predict_batch, /render_report,
+# /predict_with_report, /download_report) and a fake Ollama server
+# (/api/chat streaming NDJSON, /api/generate) with configurable latency, so
+# the actions can be exercised and load-tested without the real model or LLM.
+# With --predict-capacity the prediction backend serves only that many
+# predictions at a time and queues the rest, like a saturated model server.
+#
+# Usage:
+#   python benchmarks/stub_services.py
+#   python benchmarks/stub_services.py --predict-latency-ms 150 --token-delay-ms 40
+#
+# Then point the action server at it:
+#   OLLAMA_HOST=http://localhost:11434 python -m actions.server
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Text
+
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+STUB_REPLY = (
+    "Thanks for asking! I focus on diabetes care, so for anything medical please check with your "
+    "healthcare team. Would you like to run a readmission risk assessment?"
+)
+STUB_PDF = b"%PDF-1.4\n% stub report\n1 0 obj << /Type /Catalog >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n"
+
+
+def _stub_prediction(payload: Dict[Text, Any]) -> Dict[Text, Any]:
+    # Deterministic per payload so repeated assessments get the same answer
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).digest()
+    score = round(digest[0] / 255, 4)
+    return {
+        "prediction": int(score >= 0.5),
+        "confidence_score": score,
+        "remedy": "Keep follow-up appointments and review medications with your care team.",
+        "status": "success",
+    }
+
+
+def create_prediction_app(latency: float, capacity: int = 0) -> web.Application:
+    slots = asyncio.Semaphore(capacity) if capacity > 0 else None
+
+    async def run_model() -> None:
+        if slots is None:
+            await asyncio.sleep(latency)
+            return
+        async with slots:
+            await asyncio.sleep(latency)
+
+    async def predict(request: web.Request) -> web.Response:
+        payload = await request.json()
+        await run_model()
+        return web.json_response(_stub_prediction(payload))
+
+    async def predict_batch(request: web.Request) -> web.Response:
+        body = await request.json()
+        await run_model()
+        return web.json_response({"predictions": [_stub_prediction(p) for p in body.get("instances", [])]})
+
+    async def predict_with_report(request: web.Request) -> web.Response:
+        payload = await request.json()
+        await asyncio.sleep(latency * 4)
+        filename = f"report_{hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:12]}.pdf"
+        return web.Response(
+            body=STUB_PDF,
+            content_type="application/pdf",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    async def render_report(request: web.Request) -> web.Response:
+        body = await request.json()
+        await asyncio.sleep(latency * 3)  # rendering without the model call
+        key = json.dumps(body, sort_keys=True).encode("utf-8")
+        return web.Response(
+            body=STUB_PDF,
+            content_type="application/pdf",
+            headers={"Content-Disposition": f'attachment; filename="report_{hashlib.sha256(key).hexdigest()[:12]}.pdf"'},
+        )
+
+    async def download_report(request: web.Request) -> web.Response:
+        return web.Response(body=STUB_PDF, content_type="application/pdf")
+
+    app = web.Application()
+    app.router.add_post("/predict", predict)
+    app.router.add_post("/predict_batch", predict_batch)
+    app.router.add_post("/predict_with_report", predict_with_report)
+    app.router.add_post("/render_report", render_report)
+    app.router.add_get("/download_report/{filename}", download_report)
+    return app
+
+
+def create_ollama_app(first_token_delay: float, token_delay: float) -> web.Application:
+    async def chat(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        await asyncio.sleep(first_token_delay)
+
+        limit = body.get("options", {}).get("num_predict", -1)
+        tokens = [f"{word} " for word in STUB_REPLY.split()]
+        if limit > 0:
+            tokens = tokens[:limit]
+        for token in tokens:
+            chunk = {"model": body.get("model"), "message": {"role": "assistant", "content": token}, "done": False}
+            await response.write(json.dumps(chunk).encode("utf-8") + b"\n")
+            await asyncio.sleep(token_delay)
+        done = {"model": body.get("model"), "message": {"role": "assistant", "content": ""}, "done": True}
+        await response.write(json.dumps(done).encode("utf-8") + b"\n")
+        await response.write_eof()
+        return response
+
+    async def generate(request: web.Request) -> web.Response:
+        body = await request.json()
+        return web.json_response({"model": body.get("model"), "response": "", "done": True})
+
+    app = web.Application()
+    app.router.add_post("/api/chat", chat)
+    app.router.add_post("/api/generate", generate)
+    return app
+
+
+async def serve(args: argparse.Namespace) -> None:
+    runners = []
+    for app, port in (
+        (create_prediction_app(args.predict_latency_ms / 1000.0, args.predict_capacity), args.api_port),
+        (create_ollama_app(args.first_token_ms / 1000.0, args.token_delay_ms / 1000.0), args.ollama_port),
+    ):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, args.host, port).start()
+        runners.append(runner)
+    logger.info(f"Prediction stub on :{args.api_port}, Ollama stub on :{args.ollama_port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run stub prediction and Ollama services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--api-port", type=int, default=8080)
+    parser.add_argument("--ollama-port", type=int, default=11434)
+    parser.add_argument("--predict-latency-ms", type=float, default=50, help="Delay before each prediction response")
+    parser.add_argument("--predict-capacity", type=int, default=0, help="Predictions served at a time (0 for no limit)")
+    parser.add_argument("--first-token-ms", type=float, default=200, help="Delay before the first LLM token")
+    parser.add_argument("--token-delay-ms", type=float, default=20, help="Delay between LLM tokens")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
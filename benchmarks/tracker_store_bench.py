@@ -0,0 +1,169 @@
+# Microbenchmark for the Redis tracker store.
+#
+# Builds conversations of increasing length out of medical form turns and
+# times a full message cycle (retrieve the tracker, add one turn, save it)
+# against Rasa's own RedisTrackerStore and the compacting store in
+# addons/redis_tracker_store.py. Runs against fakeredis unless a Redis URL is
+# given, so it needs no server.
+#
+# Usage:
+#   python -m benchmarks.tracker_store_bench
+#   python -m benchmarks.tracker_store_bench --redis-url redis://localhost:6379/15 --lengths 100 1000 5000
+#   python -m benchmarks.tracker_store_bench --save-baseline benchmarks/baselines/tracker_store.json
+#   python -m benchmarks.tracker_store_bench --baseline benchmarks/baselines/tracker_store.json
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Text
+
+from rasa.core.tracker_store import RedisTrackerStore, TrackerStore
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.events import ActionExecuted, BotUttered, Event, SlotSet, UserUttered
+
+from actions.patient_record import FORM_SLOTS
+from addons.redis_tracker_store import CompactingRedisTrackerStore
+from benchmarks.common import compare_to_baseline, print_table, save_baseline, summarize
+
+
+EVENTS_PER_TURN = 6
+INTENTS = ("inform", "affirm", "deny", "greet", "goodbye", "ask_for_prediction", "out_of_scope", "bot_challenge")
+
+
+def form_turn(index: int) -> List[Event]:
+    """The events of one medical form question and answer."""
+    slot, next_slot = FORM_SLOTS[index % len(FORM_SLOTS)], FORM_SLOTS[(index + 1) % len(FORM_SLOTS)]
+    text = str(20 + index % 60)
+    ranking = [{"name": intent, "confidence": round(1.0 / (rank + 2), 4)} for rank, intent in enumerate(INTENTS)]
+    return [
+        UserUttered(
+            text,
+            intent=ranking[0],
+            parse_data={
+                "text": text,
+                "intent": ranking[0],
+                "entities": [],
+                "message_id": uuid.uuid4().hex,
+                "intent_ranking": ranking,
+                "response_selector": {"all_retrieval_intents": [], "default": {"ranking": [], "response": {}}},
+            },
+        ),
+        ActionExecuted("medical_info_form"),
+        SlotSet(slot, text),
+        SlotSet("requested_slot", next_slot),
+        BotUttered(f"Please provide {next_slot}.", metadata={"utter_action": f"utter_ask_{next_slot}"}),
+        ActionExecuted("action_listen"),
+    ]
+
+
+def make_client(redis_url: Optional[Text]) -> Any:
+    if redis_url:
+        import redis
+
+        return redis.from_url(redis_url)
+    import fakeredis
+
+    return fakeredis.FakeStrictRedis()
+
+
+def make_stores(domain: Domain, client: Any) -> Dict[Text, TrackerStore]:
+    rasa_store = RedisTrackerStore(domain, key_prefix="benchrasa")
+    rasa_store.red = client
+    return {
+        "rasa": rasa_store,
+        "compacting": CompactingRedisTrackerStore(domain, client=client, key_prefix="bench_compacting:"),
+    }
+
+
+def stored_bytes(client: Any, sender_id: Text) -> int:
+    total = 0
+    for key in client.scan_iter(match=f"*{sender_id}*"):
+        if client.type(key) == b"list":
+            total += sum(len(chunk) for chunk in client.lrange(key, 0, -1))
+        elif client.type(key) == b"string":
+            total += client.strlen(key)
+    return total
+
+
+async def bench_store(store: TrackerStore, client: Any, length: int, rounds: int) -> Dict[Text, float]:
+    sender_id = f"bench-{uuid.uuid4().hex[:8]}"
+    tracker = store.init_tracker(sender_id)
+    for index in range(length // EVENTS_PER_TURN):
+        for event in form_turn(index):
+            tracker.update(event)
+    await store.save(tracker)
+
+    retrieve_times, save_times = [], []
+    for index in range(rounds):
+        started = time.perf_counter()
+        tracker = await store.retrieve(sender_id)
+        retrieve_times.append(time.perf_counter() - started)
+        for event in form_turn(length + index):
+            tracker.update(event)
+        started = time.perf_counter()
+        await store.save(tracker)
+        save_times.append(time.perf_counter() - started)
+
+    retrieved = summarize(retrieve_times)
+    saved = summarize(save_times)
+    loaded = await store.retrieve(sender_id)
+    return {
+        "retrieve_p50": retrieved["p50"],
+        "retrieve_p95": retrieved["p95"],
+        "save_p50": saved["p50"],
+        "save_p95": saved["p95"],
+        "events": len(loaded.events),
+        "stored_kb": round(stored_bytes(client, sender_id) / 1024, 1),
+    }
+
+
+async def run(lengths: List[int], rounds: int, redis_url: Optional[Text]) -> Dict[Text, Dict[Text, float]]:
+    domain = Domain.load("domain.yml")
+    client = make_client(redis_url)
+    rows: Dict[Text, Dict[Text, float]] = {}
+    for name, store in make_stores(domain, client).items():
+        for length in lengths:
+            rows[f"{name} n={length}"] = await bench_store(store, client, length, rounds)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark tracker load/save latency against conversation length")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[60, 300, 1200, 3000], help="Events per conversation")
+    parser.add_argument("--rounds", type=int, default=30, help="Message cycles timed per conversation")
+    parser.add_argument("--redis-url", help="Use this Redis server instead of fakeredis (its keys are not cleaned up)")
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args.lengths, args.rounds, args.redis_url))
+    print_table(
+        "Tracker store latency (ms per call) by conversation length",
+        rows,
+        columns=("retrieve_p50", "retrieve_p95", "save_p50", "save_p95", "events", "stored_kb"),
+    )
+
+    metrics = {
+        f"{name.replace(' n=', '_')}_{column}": value
+        for name, row in rows.items()
+        for column, value in row.items()
+        if column != "events"
+    }
+    if args.save_baseline:
+        save_baseline(args.save_baseline, metrics, {"lengths": args.lengths, "rounds": args.rounds})
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, metrics, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
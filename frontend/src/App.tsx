@@ -2,9 +2,9 @@ import React, { useState, useRef, useEffect } from 'react';
 import ChatHeader from './components/ChatHeader';
 import ChatMessages from './components/ChatMessages';
 import ChatInput from './components/ChatInput';
-import { rasaAPI } from './utils/rasaAPI';
+import { rasaAPI, RateLimitedError } from './utils/rasaAPI';
 import { Message, ChatState } from './types/chat';
-import { formatMessage, formatUserMessage } from './utils/messageUtils';
+import { formatMessage, formatUserMessage, generateSessionId } from './utils/messageUtils';
 import './styles/globals.css';
 import './App.css';
 
@@ -34,13 +34,15 @@ const App: React.FC<AppProps> = () => {
   }, [chatState.messages]);
 
   const initializeChat = async () => {
+    // Every new chat gets its own sender, so conversations and rate limits are not shared
+    const sessionId = generateSessionId();
     try {
-      const response = await rasaAPI.sendMessage('hello');
+      const response = await rasaAPI.sendMessage('hello', sessionId);
       
       setChatState((prev: ChatState) => ({
         ...prev,
         isConnected: true,
-        sessionId: response.sessionId || `session_${Date.now()}`,
+        sessionId: response.sessionId || sessionId,
         messages: response.messages?.map(msg => formatMessage(msg)) || []
       }));
     } catch (error) {
@@ -60,7 +62,8 @@ const App: React.FC<AppProps> = () => {
   };
 
   const sendMessage = async (text: string) => {
-    if (!text.trim()) return;
+    const sessionId = chatState.sessionId;
+    if (!text.trim() || !sessionId) return;
 
     const userMessage: Message = formatUserMessage(text.trim());
 
@@ -71,23 +74,47 @@ const App: React.FC<AppProps> = () => {
       isTyping: true
     }));
 
+    // The LLM reply being streamed, shown as a draft until the full message arrives
+    let draft: Message | null = null;
+
     try {
-      const response = await rasaAPI.sendMessage(text, chatState.sessionId || 'user');
-      
-      const botMessages = response.messages?.map(msg => formatMessage(msg)) || [];
-      
+      await rasaAPI.streamMessage(text, sessionId, {
+        onMessage: (msg) => {
+          const botMessage = formatMessage(msg);
+          const replaced = draft;
+          draft = null;
+          setChatState((prev: ChatState) => ({
+            ...prev,
+            messages: replaced
+              ? prev.messages.map(m => (m.id === replaced.id ? botMessage : m))
+              : [...prev.messages, botMessage]
+          }));
+        },
+        onToken: (token) => {
+          const previous = draft;
+          const updated: Message = previous
+            ? { ...previous, text: previous.text + token.text }
+            : formatMessage({ recipient_id: token.recipient_id, text: token.text });
+          draft = updated;
+          setChatState((prev: ChatState) => ({
+            ...prev,
+            messages: previous
+              ? prev.messages.map(m => (m.id === previous.id ? updated : m))
+              : [...prev.messages, updated]
+          }));
+        }
+      });
+
       setChatState((prev: ChatState) => ({
         ...prev,
-        messages: [...prev.messages, ...botMessages],
-        isTyping: false,
-        medicalData: response.medicalData || prev.medicalData
+        isTyping: false
       }));
     } catch (error) {
       console.error('Error sending message:', error);
       
       const errorMessage: Message = {
         id: (Date.now() + 1).toString(),
-        text: 'Sorry, I encountered an error. Please try again.',
+        text: error instanceof RateLimitedError ? error.message : 'Sorry, I encountered an error. Please try again.',
         sender: 'bot',
         timestamp: new Date(),
         type: 'error'
@@ -23,6 +23,14 @@ export interface RasaResponse {
   text: string;
 }
 
+// A piece of an LLM reply, streamed ahead of the full message
+export interface RasaStreamToken {
+  recipient_id: string;
+  event: 'token';
+  stream_id: string;
+  text: string;
+}
+
 export interface RasaAPIResponse {
   messages: RasaResponse[];
   sessionId?: string;
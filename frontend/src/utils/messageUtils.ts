@@ -36,6 +36,14 @@ export const formatTypingMessage = (): Message => {
   };
 };
 
+// The sender ID of one chat session. It keys the conversation, the per-sender
+// rate limits and the live update stream, so it is random rather than shared.
+export const generateSessionId = (): string => {
+  const bytes = new Uint8Array(16);
+  crypto.getRandomValues(bytes);
+  return 'session_' + Array.from(bytes, byte => ('0' + byte.toString(16)).slice(-2)).join('');
+};
+
 export const generateId = (): string => {
   return Date.now().toString(36) + Math.random().toString(36).substr(2);
 };
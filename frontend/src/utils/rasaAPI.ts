@@ -1,8 +1,22 @@
 import axios from 'axios';
-import { UserMessage, RasaAPIResponse } from '../types/chat';
+import { UserMessage, RasaAPIResponse, RasaResponse, RasaStreamToken } from '../types/chat';
 
 const RASA_URL = 'http://localhost:5005';
 
+// Raised when the REST channel's per-sender rate limit rejects a message
+export class RateLimitedError extends Error {
+  constructor(public retryAfter: number) {
+    super(`You're sending messages too quickly. Please wait ${retryAfter} seconds and try again.`);
+    this.name = 'RateLimitedError';
+    Object.setPrototypeOf(this, RateLimitedError.prototype);
+  }
+}
+
+export interface StreamHandlers {
+  onMessage: (message: RasaResponse) => void;
+  onToken?: (token: RasaStreamToken) => void;
+}
+
 export class RasaAPI {
   private static instance: RasaAPI;
   private baseURL: string;
@@ -18,7 +32,7 @@ export class RasaAPI {
     return RasaAPI.instance;
   }
 
-  async sendMessage(message: string, sender: string = 'user'): Promise<RasaAPIResponse> {
+  async sendMessage(message: string, sender: string): Promise<RasaAPIResponse> {
     try {
       const userMessage: UserMessage = {
         sender,
@@ -43,10 +57,72 @@ export class RasaAPI {
       };
     } catch (error) {
       console.error('Error sending message to Rasa:', error);
+      if (axios.isAxiosError(error) && error.response?.status === 429) {
+        throw new RateLimitedError(Number(error.response.headers['retry-after']) || 30);
+      }
       throw new Error('Failed to communicate with the chatbot. Please try again.');
     }
   }
 
+  // Send a message in stream mode: bot messages (and LLM reply pieces) are
+  // handed over one by one as the server writes them, instead of all at the
+  // end of the turn. Resolves once the turn is over.
+  async streamMessage(message: string, sender: string, handlers: StreamHandlers): Promise<void> {
+    const userMessage: UserMessage = {
+      sender,
+      message
+    };
+
+    let response: Response;
+    try {
+      response = await fetch(`${this.baseURL}/webhooks/rest/webhook?stream=true`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(userMessage),
+      });
+    } catch (error) {
+      console.error('Error sending message to Rasa:', error);
+      throw new Error('Failed to communicate with the chatbot. Please try again.');
+    }
+    if (response.status === 429) {
+      throw new RateLimitedError(Number(response.headers.get('retry-after')) || 30);
+    }
+    if (!response.ok) {
+      throw new Error('Failed to communicate with the chatbot. Please try again.');
+    }
+
+    const handleLine = (line: string) => {
+      if (!line.trim()) return;
+      const item = JSON.parse(line);
+      if (item.event === 'token') {
+        handlers.onToken?.(item as RasaStreamToken);
+      } else {
+        handlers.onMessage(item as RasaResponse);
+      }
+    };
+
+    // Browsers without streaming response bodies get the whole turn at once
+    if (!response.body) {
+      (await response.text()).split('\n').forEach(handleLine);
+      return;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split('\n');
+      buffered = lines.pop() || '';
+      lines.forEach(handleLine);
+    }
+    handleLine(buffered + decoder.decode());
+  }
+
   async checkHealth(): Promise<boolean> {
     try {
       await axios.get(`${this.baseURL}/`, { timeout: 5000 });
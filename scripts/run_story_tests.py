@@ -0,0 +1,285 @@
+# Parallel, incremental runner for the test stories in tests/.
+#
+# Every story is evaluated on its own (rasa.core.test) by a pool of worker
+# processes that each load the model once, so the stories are spread over the
+# workers; the slowest stories of the previous run are started first. Results
+# are cached in .rasa/story_test_cache.json under a key made of the story
+# content and the parts of the training setup it depends on:
+#   - the pipeline config, all stories and rules in data/ (the policies learn
+#     from all of them), entity synonyms, regexes and lookup tables, and the
+#     domain apart from its responses
+#   - the NLU examples of the intents the story uses
+#   - the responses of the actions the story uses
+# After a change to data/ or domain.yml only the stories whose key changed run
+# again (an edit to one intent's examples reruns the stories with that intent;
+# use --all to run everything). The model is retrained first when config,
+# domain.yml or data/ changed since it was trained, with the same fingerprint
+# start_and_test.sh keeps in models/.training_fingerprint.
+#
+# Usage:
+#   python scripts/run_story_tests.py
+#   python scripts/run_story_tests.py --workers 4 --stories tests/test_stories.yml
+#   python scripts/run_story_tests.py --all --no-train
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Set, Text, Tuple
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FINGERPRINT_FILE = os.path.join("models", ".training_fingerprint")
+DEFAULT_CACHE = os.path.join(".rasa", "story_test_cache.json")
+FAILED_STORIES_FILE = "failed_test_stories.yml"
+
+
+def _digest(value: Any) -> Text:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _data_files(data: Text) -> List[Text]:
+    paths = []
+    for root, _, files in os.walk(data):
+        paths.extend(os.path.join(root, name) for name in files)
+    return paths
+
+
+def training_fingerprint(config: Text, domain: Text, data: Text) -> Text:
+    """The fingerprint of start_and_test.sh: sha256 over the sha256sum lines of config, domain and data/."""
+    lines = []
+    for path in sorted([config, domain] + _data_files(data), key=lambda path: path.encode("utf-8")):
+        with open(path, "rb") as f:
+            lines.append(f"{hashlib.sha256(f.read()).hexdigest()}  {path}\n")
+    return hashlib.sha256("".join(lines).encode("utf-8")).hexdigest()
+
+
+class TrainingSetup:
+    """The training inputs, split up so a story can be keyed by the parts it depends on."""
+
+    def __init__(self, config: Text, domain: Text, data: Text):
+        with open(config, "rb") as f:
+            self.config = hashlib.sha256(f.read()).hexdigest()
+        with open(domain, encoding="utf-8") as f:
+            domain_content = yaml.safe_load(f) or {}
+        self.responses: Dict[Text, Any] = domain_content.pop("responses", None) or {}
+        self.domain = _digest(domain_content)
+
+        dialogue: List[Any] = []
+        nlu_shared: List[Any] = []
+        self.examples: Dict[Text, List[Text]] = {}
+        for path in sorted(_data_files(data)):
+            if not path.endswith((".yml", ".yaml")):
+                continue
+            with open(path, encoding="utf-8") as f:
+                content = yaml.safe_load(f) or {}
+            dialogue.extend(content.get("stories") or [])
+            dialogue.extend(content.get("rules") or [])
+            for item in content.get("nlu") or []:
+                if "intent" in item:
+                    self.examples.setdefault(item["intent"], []).append(item.get("examples", ""))
+                else:
+                    nlu_shared.append(item)
+        self.dialogue = _digest(dialogue)
+        self.nlu_shared = _digest(nlu_shared)
+
+    def story_key(self, story: Dict[Text, Any]) -> Text:
+        intents: Set[Text] = set()
+        actions: Set[Text] = set()
+        for step in story.get("steps") or []:
+            if "intent" in step:
+                intents.add(step["intent"])
+            if "action" in step:
+                actions.add(step["action"])
+        return _digest({
+            "story": story,
+            "config": self.config,
+            "domain": self.domain,
+            "dialogue": self.dialogue,
+            "nlu_shared": self.nlu_shared,
+            "examples": {intent: self.examples.get(intent) for intent in sorted(intents)},
+            "responses": {action: self.responses.get(action) for action in sorted(actions)},
+        })
+
+
+def load_stories(paths: List[Text]) -> Dict[Text, Dict[Text, Any]]:
+    """Test stories by name (made unique), from the given files and directories."""
+    files = []
+    for path in paths:
+        files.extend(sorted(p for p in _data_files(path) if p.endswith((".yml", ".yaml"))) if os.path.isdir(path) else [path])
+    stories: Dict[Text, Dict[Text, Any]] = {}
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            content = yaml.safe_load(f) or {}
+        for story in content.get("stories") or []:
+            name = story.get("story", "story")
+            unique, count = name, 1
+            while unique in stories:
+                count += 1
+                unique = f"{name} #{count}"
+            stories[unique] = story
+    return stories
+
+
+def latest_model(models: Text = "models") -> Optional[Text]:
+    candidates = [os.path.join(models, name) for name in os.listdir(models) if name.endswith(".tar.gz")] if os.path.isdir(models) else []
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def ensure_model(args: argparse.Namespace) -> Tuple[Optional[Text], bool]:
+    """Latest model, trained first if the training inputs changed; and whether it is current."""
+    fingerprint = training_fingerprint(args.config, args.domain, args.data)
+    model = latest_model()
+    stored = None
+    if os.path.exists(FINGERPRINT_FILE):
+        with open(FINGERPRINT_FILE) as f:
+            stored = f.read().strip()
+    if model and stored == fingerprint:
+        return model, True
+    if args.no_train:
+        print("Warning: the model is older than config, domain.yml or data/; results will not be cached")
+        return model, False
+    print(f"Training a model with {args.config} (config, domain.yml or data/ changed)...")
+    subprocess.run(["rasa", "train", "--config", args.config], check=True)
+    with open(FINGERPRINT_FILE, "w") as f:
+        f.write(fingerprint + "\n")
+    return latest_model(), True
+
+
+# Worker state: every worker process loads the model once
+_agent = None
+_loop = None
+_load_seconds = 0.0
+
+
+def _init_worker(model: Text) -> None:
+    global _agent, _loop, _load_seconds
+    from rasa.core.agent import Agent
+
+    started = time.perf_counter()
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    _agent = Agent.load(model)
+    _load_seconds = time.perf_counter() - started
+
+
+def _run_story(task: Tuple[Text, Dict[Text, Any]]) -> Dict[Text, Any]:
+    """Evaluate one story; it passes when Rasa reports no failed story for it."""
+    from rasa.core.test import test
+
+    name, story = task
+    with tempfile.TemporaryDirectory() as out:
+        path = os.path.join(out, "story.yml")
+        with open(path, "w", encoding="utf-8") as f:
+            yaml.safe_dump({"version": "3.1", "stories": [story]}, f, sort_keys=False, allow_unicode=True)
+        started = time.perf_counter()
+        _loop.run_until_complete(test(path, _agent, out_directory=out, disable_plotting=True, warnings=False))
+        seconds = time.perf_counter() - started
+        details = ""
+        failed_path = os.path.join(out, FAILED_STORIES_FILE)
+        if os.path.exists(failed_path):
+            with open(failed_path, encoding="utf-8") as f:
+                details = f.read()
+        failed = bool((yaml.safe_load(details) or {}).get("stories")) if details else False
+    return {
+        "story": name,
+        "passed": not failed,
+        "seconds": round(seconds, 4),
+        "details": details if failed else "",
+        "model_load": _load_seconds,
+    }
+
+
+def load_cache(path: Text) -> Dict[Text, Dict[Text, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_cache(path: Text, entries: Dict[Text, Dict[Text, Any]]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the test stories in parallel, skipping those whose result is cached")
+    parser.add_argument("--stories", nargs="+", default=["tests"], help="Test story files or directories")
+    parser.add_argument("--config", default=os.getenv("RASA_CONFIG", "config.yml"))
+    parser.add_argument("--domain", default="domain.yml")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, os.cpu_count() or 1)))
+    parser.add_argument("--cache", default=DEFAULT_CACHE)
+    parser.add_argument("--all", action="store_true", help="Ignore cached results")
+    parser.add_argument("--no-train", action="store_true", help="Use the latest model even if it is out of date")
+    args = parser.parse_args()
+
+    stories = load_stories(args.stories)
+    setup = TrainingSetup(args.config, args.domain, args.data)
+    keys = {name: setup.story_key(story) for name, story in stories.items()}
+    cache = load_cache(args.cache)
+    results = {} if args.all else {name: dict(cache[key], cached=True) for name, key in keys.items() if key in cache}
+    pending = [name for name in stories if name not in results]
+    # Longest first, by the last known time of a story with the same name
+    previous = {entry["story"]: entry["seconds"] for entry in cache.values()}
+    pending.sort(key=lambda name: -previous.get(name, float("inf")))
+
+    model_load = 0.0
+    current = True
+    if pending:
+        model, current = ensure_model(args)
+        if model is None:
+            sys.exit("No trained model in models/")
+    started = time.perf_counter()
+    if pending:
+        workers = max(1, min(args.workers, len(pending)))
+        print(f"Running {len(pending)} of {len(stories)} stories on {workers} workers ({len(results)} cached)...")
+        tasks = [(name, stories[name]) for name in pending]
+        if workers == 1:
+            _init_worker(model)
+            outcomes = [_run_story(task) for task in tasks]
+        else:
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(workers, initializer=_init_worker, initargs=(model,)) as pool:
+                outcomes = list(pool.imap_unordered(_run_story, tasks))
+        # The workers load the model at the same time, so count one load
+        model_load = max(outcome.pop("model_load") for outcome in outcomes)
+        for outcome in outcomes:
+            results[outcome["story"]] = dict(outcome, cached=False)
+    wall = time.perf_counter() - started
+
+    print(f"\n{'Story':<50}{'result':>10}{'ms':>12}")
+    for name in stories:
+        result = results[name]
+        status = ("passed" if result["passed"] else "FAILED") + (" (cached)" if result["cached"] else "")
+        print(f"{name[:49]:<50}{status:>10}{1000 * result['seconds']:>12.1f}")
+    for name in stories:
+        if not results[name]["passed"]:
+            print(f"\n--- {name}\n{results[name]['details']}")
+
+    ran = [results[name]["seconds"] for name in pending]
+    serial = sum(result["seconds"] for result in results.values()) + model_load
+    failed = [name for name in stories if not results[name]["passed"]]
+    print(
+        f"\n{len(stories)} stories: {len(pending)} run, {len(stories) - len(pending)} cached, {len(failed)} failed"
+        f"\nWall clock {wall:.2f}s (stories {sum(ran):.2f}s, model load {model_load:.2f}s);"
+        f" serial run of every story {serial:.2f}s, speedup {serial / wall if wall else 0.0:.1f}x"
+    )
+
+    if current:
+        save_cache(args.cache, {keys[name]: {k: v for k, v in results[name].items() if k != "cached"} for name in stories})
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
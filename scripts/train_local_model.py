@@ -0,0 +1,95 @@
+# Fit the local readmission risk model and write its JSON artifact.
+#
+# Input is a CSV with one column per field of the prediction API payload
+# (the output of PatientRecord.api_payload) plus a label column. Labels are
+# treated as positive when they are 1/true/yes or a UCI style readmission
+# value ("<30", ">30").
+#
+# Usage:
+#   python scripts/train_local_model.py training.csv
+#   python scripts/train_local_model.py training.csv --label readmitted --output actions/artifacts/local_risk_model.json
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from actions.local_model import LOCAL_MODEL_PATH, FeatureEncoder  # noqa: E402
+
+NUMERIC_FIELDS = [
+    "time_in_hospital", "num_medications", "num_lab_procedures", "num_procedures",
+    "number_diagnoses", "number_inpatient", "number_outpatient", "number_emergency",
+]
+CATEGORICAL_FIELDS = [
+    "age", "gender", "admission_type", "discharge_disposition", "admission_source",
+    "diabetesMed", "change", "A1Cresult", "max_glu_serum", "insulin", "metformin",
+]
+POSITIVE_LABELS = {"1", "true", "yes", "<30", ">30"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local readmission risk model")
+    parser.add_argument("data", help="CSV file with API payload columns and a label column")
+    parser.add_argument("--label", default="readmitted", help="Name of the label column")
+    parser.add_argument("--output", default=LOCAL_MODEL_PATH, help="Where to write the model artifact")
+    parser.add_argument("--C", type=float, default=1.0, help="Inverse regularization strength")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data, dtype={field: str for field in CATEGORICAL_FIELDS})
+    y = df[args.label].astype(str).str.strip().str.lower().isin(POSITIVE_LABELS).to_numpy(dtype=int)
+
+    numeric_features = {}
+    for field in NUMERIC_FIELDS:
+        values = pd.to_numeric(df[field], errors="coerce")
+        numeric_features[field] = {"mean": float(values.mean()), "std": float(values.std()) or 1.0}
+
+    # Missing categories are encoded as "None", the str() of a missing payload
+    # field at scoring time
+    for field in CATEGORICAL_FIELDS:
+        df[field] = df[field].fillna("None").astype(str)
+
+    # The most frequent category of every field is the reference level
+    categories = {}
+    for field in CATEGORICAL_FIELDS:
+        counts = df[field].value_counts()
+        categories[field] = list(counts.index[1:])
+
+    encoder = FeatureEncoder(numeric_features, categories)
+    X = encoder.encode_columns({field: df[field].tolist() for field in encoder.fields}, len(df))
+
+    model = LogisticRegression(C=args.C, max_iter=1000)
+    model.fit(X, y)
+    coefficients = model.coef_[0]
+
+    for field, column, _, _ in encoder._numeric:
+        numeric_features[field]["coef"] = round(float(coefficients[column]), 6)
+    categorical_features = {
+        field: {category: round(float(coefficients[column]), 6) for category, column in columns.items()}
+        for field, columns in encoder._categorical.items()
+    }
+
+    artifact = {
+        "model_type": "logistic_regression",
+        "version": datetime.now().strftime("trained-%Y.%m.%d"),
+        "trained": True,
+        "description": f"Logistic regression trained on {len(df)} rows of {os.path.basename(args.data)}",
+        "intercept": round(float(model.intercept_[0]), 6),
+        "numeric_features": numeric_features,
+        "categorical_features": categorical_features,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, indent=2)
+
+    accuracy = float(np.mean(model.predict(X) == y))
+    print(f"Wrote {args.output} ({len(encoder.feature_names)} features, training accuracy {accuracy:.3f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,10 @@ RASA_PORT=5005
 ACTIONS_PORT=5055
 FRONTEND_PORT=3000
 TIMEOUT=300  # 5 minutes timeout
+FINGERPRINT_FILE="models/.training_fingerprint"
+RASA_CONFIG="${RASA_CONFIG:-config.yml}"  # or config-low-latency.yml
+# Secret for the action server's internal routes, shared with the Rasa server for /live
+export ACTIONS_INTERNAL_TOKEN="${ACTIONS_INTERNAL_TOKEN:-$(head -c 16 /dev/urandom | od -An -tx1 | tr -d ' \n')}"
 
 # Global variables
 RASA_PID=""
@@ -90,7 +94,7 @@ check_prerequisites() {
     section "Checking Prerequisites"
     
     # Check if we're in the right directory
-    if [[ ! -f "domain.yml" ]] || [[ ! -f "config.yml" ]]; then
+    if [[ ! -f "domain.yml" ]] || [[ ! -f "$RASA_CONFIG" ]]; then
         error "Not in Rasa project directory. Please run from: /Users/gurmatsinghsour/rasa-capstone"
         exit 1
     fi
@@ -152,22 +156,30 @@ check_prerequisites() {
     success "Prerequisites check completed"
 }
 
-# Train Rasa model if needed
+# Fingerprint of everything training reads: the config, the domain and data/
+training_fingerprint() {
+    local sha256=(sha256sum)
+    command -v sha256sum &> /dev/null || sha256=(shasum -a 256)
+    find "$RASA_CONFIG" domain.yml data -type f -print0 | LC_ALL=C sort -z | xargs -0 "${sha256[@]}" | "${sha256[@]}" | cut -d' ' -f1
+}
+
+# Train Rasa model if the training data changed since the last model
 train_model() {
     section "Training Rasa Model"
     
-    if [[ -d "models" ]] && [[ -n "$(ls -A models 2>/dev/null)" ]]; then
-        LATEST_MODEL=$(ls -t models/*.tar.gz 2>/dev/null | head -n1 || echo "")
-        MODEL_AGE=$(($(date +%s) - $(stat -f %m "$LATEST_MODEL" 2>/dev/null || stat -c %Y "$LATEST_MODEL" 2>/dev/null || echo 0)))
-        
-        if [[ $MODEL_AGE -lt 3600 ]]; then  # Less than 1 hour old
-            step "Recent model found, skipping training"
-            return
-        fi
+    local fingerprint
+    fingerprint=$(training_fingerprint)
+    
+    if [[ "${FORCE_TRAIN:-false}" != "true" ]] && [[ -n "$(ls models/*.tar.gz 2>/dev/null)" ]] \
+        && [[ "$(cat "$FINGERPRINT_FILE" 2>/dev/null)" == "$fingerprint" ]]; then
+        step "$RASA_CONFIG, domain.yml and data/ unchanged since the last training, skipping (FORCE_TRAIN=true to retrain)"
+        return
     fi
     
-    step "Training new model..."
-    if rasa train --debug; then
+    # Components whose inputs did not change are reused from Rasa's training cache (.rasa/cache)
+    step "Training new model with $RASA_CONFIG..."
+    if rasa train --config "$RASA_CONFIG" --debug; then
+        echo "$fingerprint" > "$FINGERPRINT_FILE"
         success "Model training completed"
     else
         error "Model training failed"
@@ -261,6 +273,20 @@ start_rasa_server() {
         step "Waiting... (${counter}s)"
     done
     
+    # The first message builds the model's inference graphs; send a synthetic one
+    # through the whole pipeline so real users do not pay for it. The action
+    # server is started first, so the warm-up reaches it too, and Rasa is only
+    # reported ready once the warm-up is done.
+    step "Warming up the pipeline..."
+    local warm_up_started=$SECONDS
+    if curl -s -m $TIMEOUT -X POST http://localhost:$RASA_PORT/webhooks/rest/webhook \
+        -H "Content-Type: application/json" \
+        -d '{"sender":"startup-warm-up","message":"hello"}' > /dev/null; then
+        step "Pipeline warmed up in $((SECONDS - warm_up_started))s"
+    else
+        warn "Warm-up message failed, the first conversation will be slower"
+    fi
+    
     success "Rasa server is ready at http://localhost:$RASA_PORT"
 }
 
@@ -283,8 +309,13 @@ start_actions_server() {
     
     step "Starting Actions server on port $ACTIONS_PORT..."
     
-    # Start Actions server in background
-    rasa run actions --port $ACTIONS_PORT --debug > actions_server.log 2>&1 &
+    # Start Actions server in background (rasa-sdk server plus the project's extra routes).
+    # With ACTIONS_WORKERS > 1, run that many servers behind the sticky balancer instead.
+    if [[ "${ACTIONS_WORKERS:-1}" -gt 1 ]]; then
+        python -m actions.cluster --workers "$ACTIONS_WORKERS" --port $ACTIONS_PORT --debug > actions_server.log 2>&1 &
+    else
+        python -m actions.server --port $ACTIONS_PORT --debug > actions_server.log 2>&1 &
+    fi
     ACTIONS_PID=$!
     
     step "Actions server started (PID: $ACTIONS_PID)"
@@ -482,6 +513,20 @@ run_conversation_tests() {
     fi
 }
 
+# Run the test stories in tests/ (only those affected by changes since the last run)
+run_story_tests() {
+    section "Running Story Tests"
+    
+    step "Evaluating test stories with scripts/run_story_tests.py..."
+    if python scripts/run_story_tests.py --config "$RASA_CONFIG" ${STORY_TEST_WORKERS:+--workers "$STORY_TEST_WORKERS"}; then
+        TEST_RESULTS+="Test stories: PASSED\n"
+        success "All test stories passed"
+    else
+        TEST_RESULTS+="Test stories: FAILED\n"
+        warn "Some test stories failed (see the output above)"
+    fi
+}
+
 # Run frontend tests
 run_frontend_tests() {
     section "Running Frontend Tests"
@@ -623,11 +668,12 @@ interactive_mode() {
         1)
             train_model
             start_ollama_service
-            start_rasa_server
             start_actions_server
+            start_rasa_server
             start_frontend
             run_api_tests
             run_conversation_tests
+            run_story_tests
             run_frontend_tests
             generate_test_report
             ;;
@@ -641,22 +687,23 @@ interactive_mode() {
         3)
             train_model
             start_ollama_service
-            start_rasa_server
             start_actions_server
+            start_rasa_server
             run_api_tests
             generate_test_report
             ;;
         4)
             train_model
             start_ollama_service
-            start_rasa_server
             start_actions_server
+            start_rasa_server
             start_frontend
             generate_test_report
             ;;
         5)
             run_api_tests
             run_conversation_tests
+            run_story_tests
             run_frontend_tests
             generate_test_report
             ;;
@@ -703,11 +750,12 @@ EOF
             --full|--all)
                 train_model
                 start_ollama_service
-                start_rasa_server
                 start_actions_server
+                start_rasa_server
                 start_frontend
                 run_api_tests
                 run_conversation_tests
+                run_story_tests
                 run_frontend_tests
                 generate_test_report
                 ;;
@@ -721,6 +769,7 @@ EOF
             --test-only)
                 run_api_tests
                 run_conversation_tests
+                run_story_tests
                 run_frontend_tests
                 generate_test_report
                 ;;
@@ -0,0 +1,159 @@
+# Failure and cancellation paths of the prediction micro-batcher: every
+# caller of a batch that fails or is cancelled gets an error, never a hang.
+#
+# Usage:
+#   python -m unittest discover -s tests
+#   python -m pytest tests
+
+import asyncio
+import unittest
+from typing import Any, Dict, List, Text
+from unittest import mock
+
+from actions.http_client import APIConnectionError
+from actions.micro_batcher import MicroBatcher
+from actions.prediction_api import BatchEndpointUnavailable
+
+
+WAIT_TIMEOUT = 5.0  # seconds; a test that hangs this long has failed
+
+
+class FakeBackend:
+    """Stands in for prediction_api: singles wait for `release`, batches do what `batch` says."""
+
+    def __init__(self, batch=None):
+        self.release = asyncio.Event()
+        self.batch = batch
+        self.singles: List[Dict[Text, Any]] = []
+        self.batches: List[List[Dict[Text, Any]]] = []
+
+    async def request_prediction(self, payload: Dict[Text, Any]) -> Dict[Text, Any]:
+        self.singles.append(payload)
+        await self.release.wait()
+        return {"id": payload["id"], "source": "single"}
+
+    async def request_prediction_batch(self, payloads, breaker: Text = "predict_batch"):
+        self.batches.append(list(payloads))
+        return await self.batch(payloads)
+
+    def patch(self):
+        return mock.patch.multiple(
+            "actions.micro_batcher",
+            request_prediction=self.request_prediction,
+            request_prediction_batch=self.request_prediction_batch,
+            batch_endpoint_available=lambda: True,
+        )
+
+
+async def submit_batch_behind_first(batcher: MicroBatcher, backend: FakeBackend, count: int):
+    """Submit `count` + 1 payloads: the first goes out alone, the rest are batched while it is in flight."""
+    first = asyncio.ensure_future(batcher.submit({"id": 0}))
+    await asyncio.sleep(0)
+    rest = [asyncio.ensure_future(batcher.submit({"id": i})) for i in range(1, count + 1)]
+    while not backend.batches:
+        await asyncio.sleep(0.001)
+    return first, rest
+
+
+class MicroBatcherFailureTest(unittest.TestCase):
+
+    def run_async(self, coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, WAIT_TIMEOUT))
+
+    def test_lone_payload_is_sent_without_waiting_for_the_window(self):
+        async def scenario():
+            backend = FakeBackend()
+            backend.release.set()
+            batcher = MicroBatcher(window_ms=60000, max_batch_size=8)
+            with backend.patch():
+                result = await asyncio.wait_for(batcher.submit({"id": 1}), 1.0)
+            self.assertEqual(result, {"id": 1, "source": "single"})
+            self.assertEqual(backend.batches, [])
+
+        self.run_async(scenario())
+
+    def test_batch_failure_is_raised_to_every_caller(self):
+        async def failing_batch(payloads):
+            raise APIConnectionError("backend down")
+
+        async def scenario():
+            backend = FakeBackend(batch=failing_batch)
+            batcher = MicroBatcher(window_ms=1, max_batch_size=8)
+            with backend.patch():
+                first, rest = await submit_batch_behind_first(batcher, backend, 3)
+                results = await asyncio.gather(*rest, return_exceptions=True)
+                backend.release.set()
+                self.assertEqual(await first, {"id": 0, "source": "single"})
+
+            self.assertEqual(len(backend.batches[0]), 3)
+            for result in results:
+                self.assertIsInstance(result, APIConnectionError)
+                self.assertIn("backend down", str(result))
+
+        self.run_async(scenario())
+
+    def test_cancelled_batch_fails_its_callers(self):
+        async def hanging_batch(payloads):
+            await asyncio.Event().wait()
+
+        async def scenario():
+            backend = FakeBackend(batch=hanging_batch)
+            batcher = MicroBatcher(window_ms=1, max_batch_size=8)
+            with backend.patch():
+                first, rest = await submit_batch_behind_first(batcher, backend, 2)
+                # What the event loop does to pending tasks on shutdown
+                for task in list(batcher._in_flight):
+                    task.cancel()
+                results = await asyncio.gather(first, *rest, return_exceptions=True)
+
+            self.assertEqual(len(results), 3)
+            for result in results:
+                self.assertIsInstance(result, APIConnectionError)
+                self.assertIn("cancelled", str(result))
+            self.assertFalse(batcher._in_flight)
+
+        self.run_async(scenario())
+
+    def test_cancelled_caller_does_not_break_the_rest_of_its_batch(self):
+        async def scenario():
+            backend = FakeBackend()
+
+            async def slow_batch(payloads):
+                await backend.release.wait()
+                return [{"id": payload["id"], "source": "batch"} for payload in payloads]
+
+            backend.batch = slow_batch
+            batcher = MicroBatcher(window_ms=1, max_batch_size=8)
+            with backend.patch():
+                first, rest = await submit_batch_behind_first(batcher, backend, 2)
+                rest[0].cancel()
+                backend.release.set()
+                results = await asyncio.gather(first, *rest, return_exceptions=True)
+
+            self.assertEqual(results[0], {"id": 0, "source": "single"})
+            self.assertIsInstance(results[1], asyncio.CancelledError)
+            self.assertEqual(results[2], {"id": 2, "source": "batch"})
+
+        self.run_async(scenario())
+
+    def test_missing_batch_endpoint_falls_back_to_single_requests(self):
+        async def no_batch_endpoint(payloads):
+            raise BatchEndpointUnavailable("/predict_batch answered 404")
+
+        async def scenario():
+            backend = FakeBackend(batch=no_batch_endpoint)
+            batcher = MicroBatcher(window_ms=1, max_batch_size=8)
+            with backend.patch():
+                first, rest = await submit_batch_behind_first(batcher, backend, 2)
+                backend.release.set()
+                results = await asyncio.gather(first, *rest)
+
+            self.assertEqual(results, [{"id": i, "source": "single"} for i in range(3)])
+            self.assertEqual(sorted(payload["id"] for payload in backend.singles), [0, 1, 2])
+            self.assertFalse(batcher.enabled)
+
+        self.run_async(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+# Expiry and quota eviction of the report store, and the download links that
+# protect reports from eviction until they expire themselves.
+#
+# Usage:
+#   python -m unittest discover -s tests
+#   python -m pytest tests
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from typing import Text
+
+from actions.report_store import ReportStore
+
+
+TTL = 3600.0
+REPORT_SIZE = 1000
+
+
+class ReportStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="report_store_test_")
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.store = ReportStore(self.directory, ttl=TTL, max_bytes=10 * REPORT_SIZE)
+
+    def add_report(self, key: Text, age: float = 0.0, size: int = REPORT_SIZE) -> Text:
+        """Commit a report of `size` bytes that was last used `age` seconds ago."""
+        part = self.store.part_path()
+        with open(part, "wb") as file:
+            file.write(b"%" * size)
+        path = self.store.commit(part, key)
+        age_file(path, age)
+        return path
+
+    def add_link(self, link_id: Text, key: Text, age: float = 0.0) -> None:
+        self.store.save_link(link_id, key, f"{key}.pdf", stored=True)
+        age_file(os.path.join(self.directory, "links", f"{link_id}.json"), age)
+
+    def test_sweep_deletes_expired_reports_only(self):
+        expired = self.add_report("aa01", age=TTL + 1)
+        fresh = self.add_report("aa02", age=TTL - 60)
+
+        result = self.store.sweep()
+
+        self.assertEqual(result["expired"], 1)
+        self.assertEqual(result["evicted"], 0)
+        self.assertFalse(os.path.exists(expired))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertEqual(self.store.stats()["files"], 1)
+
+    def test_lookup_ignores_expired_report_and_touches_a_hit(self):
+        self.add_report("bb01", age=TTL + 1)
+        fresh = self.add_report("bb02", age=TTL - 60)
+
+        self.assertIsNone(self.store.lookup("bb01"))
+        self.assertIsNone(self.store.lookup("bb03"))
+        self.assertEqual(self.store.lookup("bb02"), fresh)
+        # Handed out again, so it is good for a full TTL from now
+        self.assertLess(time.time() - os.stat(fresh).st_mtime, 60)
+
+    def test_stale_partial_download_is_removed(self):
+        part = self.store.part_path()
+        with open(part, "wb") as file:
+            file.write(b"%")
+        age_file(part, 2 * 3600)
+
+        self.assertEqual(self.store.sweep()["expired"], 1)
+        self.assertFalse(os.path.exists(part))
+
+    def test_quota_evicts_oldest_reports_first(self):
+        for i in range(12):
+            self.add_report(f"cc{i:02d}", age=100.0 * (12 - i))
+
+        result = self.store.sweep()
+
+        self.assertEqual(result["evicted"], 2)
+        self.assertEqual(result["bytes"], 10 * REPORT_SIZE)
+        self.assertIsNone(self.store.lookup("cc00"))
+        self.assertIsNone(self.store.lookup("cc01"))
+        self.assertIsNotNone(self.store.lookup("cc02"))
+        self.assertIsNotNone(self.store.lookup("cc11"))
+
+    def test_quota_never_evicts_a_linked_report(self):
+        for i in range(12):
+            self.add_report(f"dd{i:02d}", age=100.0 * (12 - i))
+        self.add_link("job-oldest", "dd00")
+
+        result = self.store.sweep()
+
+        self.assertEqual(result["evicted"], 2)
+        self.assertIsNotNone(self.store.lookup("dd00"))
+        self.assertIsNone(self.store.lookup("dd01"))
+        self.assertIsNone(self.store.lookup("dd02"))
+
+    def test_store_stays_over_quota_rather_than_break_links(self):
+        for i in range(12):
+            key = f"ee{i:02d}"
+            self.add_report(key, age=100.0 * (12 - i))
+            self.add_link(f"job-{i}", key)
+
+        result = self.store.sweep()
+
+        self.assertEqual(result["evicted"], 0)
+        self.assertEqual(result["bytes"], 12 * REPORT_SIZE)
+        self.assertEqual(self.store.stats()["links"], 12)
+
+    def test_expired_link_is_removed_and_its_report_evictable(self):
+        for i in range(11):
+            self.add_report(f"ff{i:02d}", age=100.0 * (11 - i))
+        self.add_link("job-old", "ff00", age=TTL + 1)
+
+        self.assertIsNone(self.store.load_link("job-old"))
+        result = self.store.sweep()
+
+        self.assertEqual(result["evicted"], 1)
+        self.assertIsNone(self.store.lookup("ff00"))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "links", "job-old.json")))
+        self.assertEqual(self.store.stats()["links"], 0)
+
+    def test_link_round_trip(self):
+        self.add_report("ab01")
+        self.add_link("job-1", "ab01")
+
+        info, created = self.store.load_link("job-1")
+
+        self.assertEqual(info, {"key": "ab01", "filename": "ab01.pdf", "stored": True})
+        self.assertLess(time.time() - created, 60)
+        # The link survives a restart: a new store on the same directory
+        restarted = ReportStore(self.directory, ttl=TTL, max_bytes=10 * REPORT_SIZE)
+        self.assertEqual(restarted.load_link("job-1")[0]["key"], "ab01")
+
+    def test_invalid_link_ids_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.store.save_link("../escape", "ab01", None, stored=True)
+        self.assertIsNone(self.store.load_link("../links/job-1"))
+        self.assertIsNone(self.store.load_link(""))
+        self.assertIsNone(self.store.load_link("unknown"))
+
+
+def age_file(path: Text, age: float) -> None:
+    """Set the modification time of `path` to `age` seconds ago."""
+    then = time.time() - age
+    os.utime(path, (then, then))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# Every entity value annotated in data/nlu.yml must be accepted by the slot
+# validator of its form slot, or the form asks the question again forever.
+#
+# Usage:
+#   python -m unittest discover -s tests
+#   python -m pytest tests
+
+import os
+import re
+import unittest
+from collections import defaultdict
+from typing import Dict, Set, Text
+
+import yaml
+
+from actions.slot_validation import SLOT_SCHEMA, validate_slot
+
+
+NLU_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "nlu.yml")
+
+# [value](entity), [value](entity:synonym) and [value]{"entity": "...", "value": "..."}
+_ANNOTATION = re.compile(
+    r'\[(?P<text>[^\]]+)\]'
+    r'(?:\((?P<entity>\w+)(?::(?P<synonym>[^)]+))?\)'
+    r'|\{"entity":\s*"(?P<json_entity>\w+)"(?:,\s*"value":\s*"(?P<json_value>[^"]+)")?[^}]*\})'
+)
+
+# Answers the form deliberately does not take, so the user is asked to choose
+# one of the listed options: the prediction model only knows Male and Female,
+# and a race that does not name one of its categories is not guessed at
+ASKED_AGAIN = {
+    "gender": {"non-binary", "other", "transgender"},
+    "race": {"indian", "middle eastern", "jewish"},
+}
+
+
+def annotated_values(path: Text = NLU_PATH) -> Dict[Text, Set[Text]]:
+    """Entity values annotated in the NLU training examples, by entity."""
+    with open(path, "r", encoding="utf-8") as f:
+        nlu = yaml.safe_load(f)["nlu"]
+    values: Dict[Text, Set[Text]] = defaultdict(set)
+    for block in nlu:
+        for example in block.get("examples", "").splitlines():
+            for match in _ANNOTATION.finditer(example):
+                entity = match.group("entity") or match.group("json_entity")
+                values[entity].add(match.group("synonym") or match.group("json_value") or match.group("text"))
+    return values
+
+
+class NLUValuesTest(unittest.TestCase):
+    def test_annotated_values_are_accepted(self):
+        values = annotated_values()
+        for slot in SLOT_SCHEMA:
+            for value in sorted(values.get(slot, ())):
+                with self.subTest(slot=slot, value=value):
+                    result = validate_slot(slot, value)
+                    if value.lower() in ASKED_AGAIN.get(slot, ()):
+                        self.assertIsNone(result.value)
+                    else:
+                        self.assertIsNotNone(result.value, result.message)
+
+    def test_every_form_slot_has_examples(self):
+        values = annotated_values()
+        self.assertEqual([slot for slot in SLOT_SCHEMA if not values.get(slot)], [])
+
+
+if __name__ == "__main__":
+    unittest.main()